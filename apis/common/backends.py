@@ -0,0 +1,184 @@
+import ast
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Inference backends, picked by config. Every backend exposes the part of
+# the Ultralytics API the apps use: model.names and model.predict(...) /
+# model(...) returning results with .boxes (.cls, .xyxy, .conf), .speed (ms
+# per step, as Ultralytics reports it) and .plot().
+BACKENDS = ("pytorch", "onnx", "openvino", "openvino-int8", "onnxruntime")
+
+
+# Artifact names written by model/watchman_v3/export.py
+def default_weights(backend, stem="watchman_v3"):
+    return {
+        "pytorch": f"{stem}.pt",
+        "onnx": f"{stem}.onnx",
+        "onnxruntime": f"{stem}.onnx",
+        "openvino": f"{stem}_openvino_model",
+        "openvino-int8": f"{stem}_int8_openvino_model",
+    }[backend]
+
+
+def load_model(backend="pytorch", weights=None, stem="watchman_v3"):
+    """Load the person model for the given backend.
+
+    "pytorch", "onnx" and "openvino(-int8)" go through Ultralytics, which
+    picks the runtime from the artifact and keeps its own pre- and
+    postprocessing. "onnxruntime" runs the ONNX export directly and never
+    imports torch, which makes startup much faster on small boards.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    weights = weights or default_weights(backend, stem)
+    if backend == "onnxruntime":
+        return OnnxRuntimeDetector(weights)
+
+    from ultralytics import YOLO  # Imported here so "onnxruntime" never loads torch
+
+    model = YOLO(weights, task="detect")
+    if backend == "pytorch":
+        model.fuse()
+    return model
+
+
+class Boxes:
+    """Detections of one image, indexable like Ultralytics' Boxes."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.cls)
+
+    def __iter__(self):
+        for i in range(len(self.cls)):
+            yield Boxes(self.xyxy[i:i + 1], self.conf[i:i + 1], self.cls[i:i + 1])
+
+
+class DetectionResult:
+    def __init__(self, orig_img, boxes, names, speed=None):
+        self.orig_img = orig_img
+        self.boxes = boxes
+        self.names = names
+        self.speed = speed or {}  # {"preprocess", "inference", "postprocess"} in ms
+
+    def plot(self):
+        frame = self.orig_img.copy()
+        for (x1, y1, x2, y2), conf, cls in zip(self.boxes.xyxy.astype(int), self.boxes.conf, self.boxes.cls):
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, f"{self.names[int(cls)]} {conf:.2f}", (x1, max(0, y1 - 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+        return frame
+
+
+class OnnxRuntimeDetector:
+    """YOLOv8 ONNX export on onnxruntime, without torch or Ultralytics.
+
+    Preprocessing and postprocessing follow Ultralytics: letterbox to the
+    export size with grey (114) padding, confidence filter, per-class NMS
+    (class offset boxes), boxes scaled back to the original frame.
+    """
+
+    MAX_WH = 7680  # Class offset used for per-class NMS, as in Ultralytics
+
+    def __init__(self, path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta["names"]) if "names" in meta else {0: "person"}
+        imgsz = ast.literal_eval(meta["imgsz"]) if "imgsz" in meta else [320, 320]
+        self.imgsz = tuple(imgsz) if isinstance(imgsz, (list, tuple)) else (imgsz, imgsz)
+
+    def __call__(self, source, **kwargs):
+        return self.predict(source, **kwargs)
+
+    def predict(self, source, conf=0.25, iou=0.7, classes=None, vid_stride=1,
+                stream=False, max_det=300, **_):
+        results = (
+            self._detect(frame, conf, iou, classes, max_det)
+            for frame in self._frames(source, vid_stride)
+        )
+        return results if stream else list(results)
+
+    def _frames(self, source, vid_stride):
+        if isinstance(source, (str, os.PathLike)):
+            cap = cv2.VideoCapture(str(source))
+            index = 0
+            try:
+                while True:
+                    success, frame = cap.read()
+                    if not success:
+                        break
+                    if index % vid_stride == 0:
+                        yield frame
+                    index += 1
+            finally:
+                cap.release()
+        elif isinstance(source, (list, tuple)):
+            yield from source
+        else:
+            yield source
+
+    def _letterbox(self, frame):
+        height, width = frame.shape[:2]
+        new_h, new_w = self.imgsz
+        gain = min(new_h / height, new_w / width)
+        resized_w, resized_h = round(width * gain), round(height * gain)
+        pad_w, pad_h = (new_w - resized_w) / 2, (new_h - resized_h) / 2
+
+        if (resized_w, resized_h) != (width, height):
+            frame = cv2.resize(frame, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+        top, bottom = round(pad_h - 0.1), round(pad_h + 0.1)
+        left, right = round(pad_w - 0.1), round(pad_w + 0.1)
+        frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                   value=(114, 114, 114))
+        blob = frame[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return np.ascontiguousarray(blob), gain, (left, top)
+
+    def _detect(self, frame, conf, iou, classes, max_det):
+        started = time.perf_counter()
+        blob, gain, (pad_x, pad_y) = self._letterbox(frame)
+        preprocessed = time.perf_counter()
+        output = self.session.run(None, {self.input_name: blob})[0][0].T  # (anchors, 4 + classes)
+        inferred = time.perf_counter()
+
+        scores = output[:, 4:]
+        cls = scores.argmax(axis=1)
+        confidence = scores[np.arange(len(cls)), cls]
+        keep = confidence > conf
+        if classes is not None:
+            keep &= np.isin(cls, classes)
+        boxes, confidence, cls = output[keep, :4], confidence[keep], cls[keep]
+
+        xyxy = np.empty_like(boxes)
+        xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+        xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+
+        if len(xyxy):
+            offset = xyxy + (cls[:, None] * self.MAX_WH)
+            rects = np.concatenate([offset[:, :2], offset[:, 2:] - offset[:, :2]], axis=1)
+            kept = cv2.dnn.NMSBoxes(rects.tolist(), confidence.tolist(), conf, iou, top_k=max_det)
+            kept = np.array(kept, dtype=int).reshape(-1)[:max_det]
+            xyxy, confidence, cls = xyxy[kept], confidence[kept], cls[kept]
+
+        # Back to original frame coordinates
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad_x) / gain).clip(0, frame.shape[1])
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad_y) / gain).clip(0, frame.shape[0])
+        speed = {
+            "preprocess": (preprocessed - started) * 1000,
+            "inference": (inferred - preprocessed) * 1000,
+            "postprocess": (time.perf_counter() - inferred) * 1000,
+        }
+        return DetectionResult(frame, Boxes(xyxy, confidence, cls.astype(float)), self.names, speed)
@@ -0,0 +1,63 @@
+import shutil
+import subprocess
+
+import numpy as np
+
+from common.metrics import FFMPEG_SECONDS
+
+FRAGMENTED_MP4 = "+frag_keyframe+empty_moov+default_base_moof"
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+class FFmpegPipeWriter:
+    """Pipes raw BGR frames into an ffmpeg process that writes H.264 MP4.
+
+    By default the output is fragmented MP4 (empty moov + one fragment per
+    keyframe), so the file is playable while it is still being written and
+    nothing has to be re-encoded once it is closed. Pass
+    ``movflags="+faststart"`` for a regular MP4 with the index up front.
+    """
+
+    def __init__(self, path, fps, frame_size, crf=23, preset="veryfast",
+                 movflags=FRAGMENTED_MP4, preexec_fn=None):
+        self.path = path
+        self.frame_size = frame_size
+        width, height = frame_size
+        self.proc = subprocess.Popen([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24",
+            "-s", f"{width}x{height}", "-r", str(fps),
+            "-i", "pipe:0",
+            "-an", "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            "-pix_fmt", "yuv420p",
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",  # x264 needs even dimensions
+            "-g", str(max(1, int(fps))),  # One fragment per second
+            "-movflags", movflags,
+            path
+        ],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        preexec_fn=preexec_fn)
+
+    def write(self, frame):
+        if self.proc.stdin is None or self.proc.stdin.closed:
+            return
+        try:
+            self.proc.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, ValueError) as e:
+            print(f"[ERROR] FFmpeg writer for {self.path} died: {e}")
+            self.proc.stdin.close()
+
+    def release(self):
+        """Finish the file and return ffmpeg's exit code."""
+        with FFMPEG_SECONDS.labels("finish").time():
+            try:
+                if self.proc.stdin and not self.proc.stdin.closed:
+                    self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+            return self.proc.wait()
@@ -0,0 +1,115 @@
+import itertools
+import os
+import queue
+import threading
+import time
+
+# Job priorities, lower runs first
+PRIORITY_LIVE = 0
+PRIORITY_UPLOAD = 10
+
+
+class JobQueueFull(Exception):
+    """Raised by JobExecutor.submit when the queue is at capacity."""
+
+
+# preexec_fn for ffmpeg children: lower their priority and pin them to some cores
+def child_limits(nice=0, cpus=None):
+    if os.name != "posix" or (not nice and not cpus):
+        return None
+
+    def apply():
+        if nice:
+            os.nice(nice)
+        if cpus and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cpus)
+
+    return apply
+
+
+class JobExecutor:
+    """Fixed pool of worker threads fed from a bounded priority queue.
+
+    Replaces starting one thread per clip or upload: at most ``max_workers``
+    jobs run at once, live jobs are picked before uploads, and ``submit``
+    raises JobQueueFull once ``max_queue`` jobs are waiting so callers can
+    push back instead of piling up work.
+    """
+
+    def __init__(self, max_workers=2, max_queue=32, name="jobs"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.name = name
+        self._queue = queue.PriorityQueue(maxsize=max_queue)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._threads = []
+
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.max_workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, fn, *args, priority=PRIORITY_UPLOAD, block=False, timeout=None, **kwargs):
+        self.start()
+        item = (priority, next(self._seq), time.monotonic(), fn, args, kwargs)
+        try:
+            self._queue.put(item, block=block, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise JobQueueFull(f"{self.name} queue is full ({self.max_queue} jobs waiting)")
+        with self._lock:
+            self.submitted += 1
+
+    def snapshot(self):
+        with self._lock:
+            started = self.completed + self.failed + self.running
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "wait_ms": {
+                    "last": round(self.last_wait * 1000, 1),
+                    "avg": round(self.total_wait / started * 1000, 1) if started else 0.0,
+                    "max": round(self.max_wait * 1000, 1),
+                },
+            }
+
+    def _worker(self):
+        while True:
+            _, _, enqueued_at, fn, args, kwargs = self._queue.get()
+            waited = time.monotonic() - enqueued_at
+            with self._lock:
+                self.running += 1
+                self.last_wait = waited
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            try:
+                fn(*args, **kwargs)
+                outcome = "completed"
+            except Exception as e:
+                print(f"[ERROR] Job {getattr(fn, '__name__', fn)} failed: {e}")
+                outcome = "failed"
+            with self._lock:
+                self.running -= 1
+                setattr(self, outcome, getattr(self, outcome) + 1)
+            self._queue.task_done()
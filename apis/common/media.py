@@ -0,0 +1,128 @@
+import functools
+import math
+import os
+import subprocess
+
+from flask import Response, current_app, request
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+from common.metrics import FFMPEG_SECONDS
+
+READ_BLOCK_SIZE = 1024 * 1024  # Werkzeug's default of 8KB costs a lot of syscalls on multi-GB files
+HLS_SEGMENT_SECONDS = 6.0  # Target segment length, segments start on keyframes
+
+
+def media_path(directory, filename):
+    """Path of filename inside directory, None when it escapes the directory or does not exist"""
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+def file_etag(stat):
+    # Changes whenever the file is replaced or grows (clips being recorded)
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
+
+def send_media(path, mimetype="video/mp4", as_attachment=False, download_name=None, max_age=3600):
+    """Serve a file with Range/206, a strong ETag and If-None-Match / If-Range / If-Modified-Since.
+
+    max_age=0 makes clients revalidate every time, for files that are still
+    being written.
+    """
+    stat = os.stat(path)
+    response = current_app.response_class(
+        wrap_file(request.environ, open(path, "rb"), READ_BLOCK_SIZE),
+        mimetype=mimetype,
+        direct_passthrough=True,
+    )
+    response.content_length = stat.st_size
+    response.last_modified = int(stat.st_mtime)
+    response.set_etag(file_etag(stat))
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if max_age == 0:
+        response.cache_control.no_cache = True
+    if as_attachment or download_name:
+        response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline",
+                             filename=download_name or os.path.basename(path))
+    return response.make_conditional(request, accept_ranges=True, complete_length=stat.st_size)
+
+
+@functools.lru_cache(maxsize=64)
+def _keyframes(path, size, mtime_ns):
+    with FFMPEG_SECONDS.labels("keyframes").time():
+        out = subprocess.run([
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,duration_time,flags", "-of", "csv=p=0", path
+        ], check=True, capture_output=True, text=True).stdout
+    keyframes, end = [], 0.0
+    for line in out.splitlines():
+        fields = line.split(",")
+        if len(fields) < 3 or fields[0] in ("", "N/A"):
+            continue
+        pts = float(fields[0])
+        end = max(end, pts + (float(fields[1]) if fields[1] not in ("", "N/A") else 0.0))
+        if "K" in fields[2]:
+            keyframes.append(pts)
+    return tuple(keyframes), end
+
+
+def hls_segments(path, target=HLS_SEGMENT_SECONDS):
+    """(start, duration) of each segment: consecutive keyframe groups of at least target seconds.
+
+    The packet list is read without decoding and cached per file version.
+    None when ffprobe cannot read the file (truncated, not a video) or is missing.
+    """
+    stat = os.stat(path)
+    try:
+        keyframes, end = _keyframes(path, stat.st_size, stat.st_mtime_ns)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"[ERROR] Cannot read keyframes of {path}: {e}")
+        return None
+    starts = []
+    for pts in keyframes:
+        if not starts or pts - starts[-1] >= target:
+            starts.append(pts)
+    bounds = starts + [end]
+    return [(start, bounds[i + 1] - start) for i, start in enumerate(starts) if bounds[i + 1] > start]
+
+
+def hls_playlist(segments, segment_uri, complete=True):
+    """Media playlist; an incomplete file (still recording) is an EVENT playlist without its last segment"""
+    if not complete:
+        segments = segments[:-1]
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{max([math.ceil(d) for _, d in segments] or [1])}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        f"#EXT-X-PLAYLIST-TYPE:{'VOD' if complete else 'EVENT'}",
+    ]
+    for index, (_, duration) in enumerate(segments):
+        lines += [f"#EXTINF:{duration:.3f},", segment_uri(index)]
+    if complete:
+        lines.append("#EXT-X-ENDLIST")
+    return Response("\n".join(lines) + "\n", mimetype="application/vnd.apple.mpegurl",
+                    headers={"Cache-Control": "public, max-age=3600" if complete else "no-cache"})
+
+
+def hls_segment(path, start, duration, preexec_fn=None, max_age=3600):
+    """One MPEG-TS segment cut from the MP4 with stream copy, streamed while ffmpeg writes it"""
+    proc = subprocess.Popen([
+        "ffmpeg", "-loglevel", "error", "-ss", f"{start:.6f}", "-i", path, "-t", f"{duration:.6f}",
+        "-map", "0:v:0", "-c", "copy", "-output_ts_offset", f"{start:.6f}", "-f", "mpegts", "pipe:1"
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, preexec_fn=preexec_fn)
+
+    def stream():
+        try:
+            for block in iter(lambda: proc.stdout.read(64 * 1024), b""):
+                yield block
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
+    return Response(stream(), mimetype="video/mp2t", headers={"Cache-Control": f"public, max-age={max_age}"})
@@ -0,0 +1,191 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from a cheap stage (0.5ms) to a slow inference on a small board (30s)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FFMPEG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Bucket counts, sum and count of observed values; observe() is one bisect and a lock."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def state(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+class HistogramFamily:
+    """One histogram per combination of label values, created on first use."""
+
+    def __init__(self, name, description, labels, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, Histogram(self.buckets))
+        return child
+
+    def snapshot(self):
+        with self._lock:
+            children = list(self._children.items())
+        return {
+            "help": self.description,
+            "labels": list(self.label_names),
+            "buckets": list(self.buckets),
+            "series": [[list(values), *child.state()] for values, child in children],
+        }
+
+
+class Metrics:
+    """Process-wide metrics, rendered in the Prometheus text format.
+
+    Histograms are updated on the hot path. Everything the apps already
+    count (FPS, drops, queue depth, recorder state) is read from their
+    snapshots by collectors at scrape time, so it costs nothing between
+    scrapes. A collector returns [(name, type, help, [(labels, value)])].
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def histogram(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = HistogramFamily(name, description, labels, buckets)
+            return family
+
+    def collector(self, fn):
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def snapshot(self):
+        """Histograms as plain data, e.g. for a worker heartbeat"""
+        with self._lock:
+            families = list(self._families.values())
+        return {family.name: family.snapshot() for family in families}
+
+    def collect(self):
+        samples = []
+        for collector in list(self._collectors):
+            try:
+                samples += collector()
+            except Exception as e:
+                print(f"[ERROR] Metrics collector failed: {e}")
+        return samples
+
+    def render(self):
+        return format_histograms(self.snapshot()) + format_samples(self.collect())
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_number(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_histograms(snapshot):
+    lines = []
+    for name, family in sorted(snapshot.items()):
+        lines += [f"# HELP {name} {family['help']}", f"# TYPE {name} histogram"]
+        for values, counts, total, count in family["series"]:
+            labels = dict(zip(family["labels"], values))
+            cumulative = 0
+            for bound, bucket in zip(family["buckets"] + [float("inf")], counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{format_labels({**labels, 'le': format_number(float(bound))})} "
+                             f"{cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_number(float(total))}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def format_samples(samples):
+    """Gauges and counters: [(name, type, help, [(labels, value)])], one HELP/TYPE per name"""
+    families = {}
+    for name, kind, description, series in samples:
+        families.setdefault(name, (kind, description, []))[2].extend(series)
+    lines = []
+    for name, (kind, description, series) in families.items():
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{format_labels(labels)} {format_number(value)}" for labels, value in series
+                  if value is not None]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def merge_snapshots(snapshots, label):
+    """One histogram snapshot from several processes', each series tagged with label=<key>.
+
+    snapshots is {key: snapshot}, e.g. the worker id with the metrics of its heartbeat.
+    """
+    merged = {}
+    for key, snapshot in snapshots.items():
+        for name, family in snapshot.items():
+            target = merged.setdefault(name, {
+                "help": family["help"],
+                "labels": [label] + family["labels"],
+                "buckets": family["buckets"],
+                "series": [],
+            })
+            if target["buckets"] != family["buckets"]:
+                continue  # A worker of another version, its buckets do not add up
+            target["series"] += [[[key] + values, counts, total, count]
+                                 for values, counts, total, count in family["series"]]
+    return merged
+
+
+# The registry of this process, shared by every module that records metrics
+REGISTRY = Metrics()
+
+# Every ffmpeg/ffprobe run the apps wait for, by what it does
+FFMPEG_SECONDS = REGISTRY.histogram("watchman_ffmpeg_seconds", "Wall time of ffmpeg runs", ("task",),
+                                    FFMPEG_BUCKETS)
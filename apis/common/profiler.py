@@ -0,0 +1,87 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Wall clock sampling profiler for every thread of this process, off until started.
+
+    While running, a daemon thread records the stack of each thread every
+    ``interval`` seconds (sys._current_frames), and stops by itself after
+    ``duration`` seconds so a forgotten profile never keeps costing CPU.
+    collapsed() returns the stacks in the folded format ("thread;module:
+    function;... count" per line) that speedscope and flamegraph.pl load.
+    Threads waiting on a lock or a socket are sampled too, which is what
+    shows where a frame spends its time, not only where the CPU is busy.
+    """
+
+    def __init__(self, max_depth=64):
+        self.max_depth = max_depth
+        self.interval = None
+        self.started_at = None
+        self.stops_at = None
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.005, duration=30.0):
+        """Start a new profile, dropping the previous one; False when one is running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = interval
+            self.started_at = time.time()
+            self.stops_at = self.started_at + duration
+            self.samples = 0
+            self._stacks = Counter()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval, duration), name="profiler",
+                                            daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def _run(self, interval, duration):
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration
+        while not self._stop.wait(interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join([names.get(ident, str(ident))] + stack[::-1]))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+        self.stops_at = min(self.stops_at, time.time())
+
+    def collapsed(self):
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "running": self.running,
+                "interval_ms": self.interval * 1000 if self.interval else None,
+                "started_at": self.started_at,
+                "stops_at": self.stops_at,
+                "samples": self.samples,
+                "stacks": len(self._stacks),
+            }
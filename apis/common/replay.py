@@ -0,0 +1,267 @@
+import bisect
+import json
+import os
+import resource
+import subprocess
+import threading
+import time
+
+import cv2
+
+# Offline replay of recorded or synthetic footage through the pipelines, for
+# the benchmarks in live_api/benchmarks and video_api/benchmarks: no camera,
+# no network. Labels are [{"start": s, "end": s}, ...] person events in
+# seconds of the video, as in the other benchmarks.
+
+# Metrics compared with a baseline, and whether a higher value is better
+BASELINE_METRICS = {
+    "fps": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+    "cpu_s": False,
+    "disk_mb": False,
+    "recall": True,
+}
+
+
+class ReplayCapture:
+    """A video file behind the cv2.VideoCapture interface, delivered like a camera.
+
+    With ``speed`` > 0 frames become available at the file's frame rate
+    (times speed) from the first read() on; a reader that falls behind gets
+    the newest due frame and the ones it missed are counted in ``dropped``,
+    as a camera's driver would drop them. With ``speed`` 0 every frame is
+    returned as fast as it is read. ``loops`` replays the file that many
+    times. At the end read() waits ``linger`` seconds before it fails, so
+    a pipeline that stops on a failed read finishes the frames in flight.
+
+    video_time(t) maps a time.monotonic() taken after a read() to the
+    position of that frame in the file, in seconds, so labels of the file
+    apply to every loop.
+    """
+
+    def __init__(self, path, speed=1.0, loops=1, linger=0.0):
+        self.path = path
+        self.speed = speed
+        self.loops = loops
+        self.linger = linger
+        self.cap = cv2.VideoCapture(path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.frames = 0  # Frames returned by read()
+        self.dropped = 0
+        self.index = 0  # Frames taken from the file, over all loops
+        self.started = None
+        self.ended = None  # time.monotonic() of the end of the file
+        self._loop = 1
+        self._reads = []  # (monotonic after read, video seconds)
+        self._lock = threading.Lock()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.frame_count * self.loops
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return False  # A file has no driver buffer or resolution to set
+
+    def _next(self):
+        success, frame = self.cap.read()
+        if not success and self._loop < self.loops:
+            self._loop += 1
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.cap.read()
+        if success:
+            self.index += 1
+        return success, frame
+
+    def read(self):
+        if self.started is None:
+            self.started = time.monotonic()
+        if self.speed > 0:
+            due = self.started + self.index / (self.fps * self.speed)
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            # Frames that became due while the reader was busy are gone
+            behind = int((time.monotonic() - self.started) * self.fps * self.speed) - self.index
+            for _ in range(max(0, behind)):
+                if not self.cap.grab():
+                    break
+                self.index += 1
+                self.dropped += 1
+        success, frame = self._next()
+        if success:
+            self.frames += 1
+            with self._lock:
+                position = self.cap.get(cv2.CAP_PROP_POS_FRAMES) - 1
+                self._reads.append((time.monotonic(), position / self.fps))
+        elif self.ended is None:
+            self.ended = time.monotonic()
+            time.sleep(self.linger)
+        return success, frame
+
+    def grab(self):
+        success, _ = self.read()
+        return success
+
+    def release(self):
+        self.cap.release()
+
+    def video_time(self, monotonic):
+        with self._lock:
+            position = bisect.bisect_right(self._reads, (monotonic, float("inf"))) - 1
+            return self._reads[max(0, position)][1] if self._reads else 0.0
+
+
+def synthetic_video(path, seconds, size="1280x720", fps=25):
+    """Moving test pattern encoded like a camera clip; for throughput only, it contains no persons"""
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", str(fps * 2), "-pix_fmt", "yuv420p", path
+    ], check=True)
+    return path
+
+
+class Usage:
+    """CPU seconds, peak RSS and bytes written by this process and its waited-for children.
+
+    Peak RSS is the high-water mark of the process (ru_maxrss), so it
+    includes everything loaded before start(); run one replay per process
+    to compare it. Written bytes are what the kernel accounted to the
+    processes (ru_oublock), so files deleted before the end still count.
+    """
+
+    def __init__(self):
+        self.started = None
+        self._start = None
+
+    @staticmethod
+    def _sample():
+        own, children = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+        return {
+            "cpu_s": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+            "written": (own.ru_oublock + children.ru_oublock) * 512,
+            "peak_rss_mb": own.ru_maxrss / 1024,  # KiB on Linux
+            "children_peak_rss_mb": children.ru_maxrss / 1024,
+        }
+
+    def start(self):
+        self.started = time.monotonic()
+        self._start = self._sample()
+        return self
+
+    def stop(self):
+        end = self._sample()
+        return {
+            "wall_s": time.monotonic() - self.started,
+            "cpu_s": end["cpu_s"] - self._start["cpu_s"],
+            "peak_rss_mb": end["peak_rss_mb"],
+            "children_peak_rss_mb": end["children_peak_rss_mb"],
+            "disk_mb": (end["written"] - self._start["written"]) / 1e6,
+        }
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else None
+
+
+def latency_stats(latencies):
+    """p50/p99/max in ms of per-frame latencies in seconds"""
+    return {
+        "p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "max_ms": max(latencies) * 1000 if latencies else None,
+    }
+
+
+def load_events(path):
+    with open(path) as f:
+        return [{"start": float(e["start"]), "end": float(e["end"])} for e in json.load(f)]
+
+
+def event_recall(events, ranges):
+    """Share of the labelled events some detected (start, end) range overlaps, the missed
+    events, and the ranges that overlap no event (false alarms)"""
+    if not events:
+        return None, [], list(ranges)
+    missed = [e for e in events if not any(start <= e["end"] and end >= e["start"] for start, end in ranges)]
+    false = [(start, end) for start, end in ranges
+             if not any(start <= e["end"] and end >= e["start"] for e in events)]
+    return 1 - len(missed) / len(events), missed, false
+
+
+def to_ranges(times, merge_gap):
+    """Detection timestamps closer than merge_gap form one (start, end) range"""
+    ranges = []
+    for t in sorted(times):
+        if ranges and t - ranges[-1][1] <= merge_gap:
+            ranges[-1][1] = t
+        else:
+            ranges.append([t, t])
+    return [tuple(r) for r in ranges]
+
+
+def compare(result, baseline, tolerance=0.1):
+    """Regressions of result against a baseline result: [(metric, baseline, current)].
+
+    A metric regresses when it is worse than the baseline by more than
+    ``tolerance`` (a share, 0.1 = 10%); missing metrics are skipped.
+    """
+    regressions = []
+    for metric, higher_is_better in BASELINE_METRICS.items():
+        old, new = baseline.get(metric), result.get(metric)
+        if old is None or new is None:
+            continue
+        if higher_is_better:
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance) and new - old > 1e-3  # Ignore noise around 0
+        if worse:
+            regressions.append((metric, old, new))
+    return regressions
+
+
+def check_baseline(name, result, path, tolerance=0.1, save=False):
+    """Compare result with the baseline stored under name in path (JSON), or store it.
+
+    Prints the regressions and returns how many there are.
+    """
+    baselines = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            baselines = json.load(f)
+
+    if save:
+        baselines[name] = {metric: result[metric] for metric in BASELINE_METRICS if result.get(metric) is not None}
+        with open(path, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"baseline {name!r} saved to {path}")
+        return 0
+
+    if name not in baselines:
+        print(f"no baseline {name!r} in {path}, run with --save-baseline first")
+        return 0
+    regressions = compare(result, baselines[name], tolerance)
+    for metric, old, new in regressions:
+        print(f"REGRESSION {metric:<12} {old:>10.2f} -> {new:.2f}")
+    if not regressions:
+        print(f"no regressions against baseline {name!r} (tolerance {tolerance:.0%})")
+    return len(regressions)
+
+
+def print_result(result):
+    for key, value in result.items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        elif value is None:
+            value = "-"
+        print(f"{key:<22}{value}")
@@ -0,0 +1,80 @@
+import math
+import threading
+
+
+class StrideController:
+    """Adapts the inference stride (run on every Nth frame) to load and detections.
+
+    While a person has been seen in the last ``idle_after`` seconds the
+    stride drops to the lowest value the load allows. When nothing has been
+    detected for a while it grows one step per ``step_interval`` up to
+    ``max_stride``. Load is bounded two ways, both set per deployment:
+
+    * ``target_utilization`` - share of one core the inference of this
+      source may use: stride >= latency * input_fps / target_utilization
+    * ``latency_budget`` - per-frame inference time in seconds; while the
+      measured latency is above it the stride is raised one step at a time
+    """
+
+    def __init__(self, initial=2, min_stride=1, max_stride=8, target_utilization=None,
+                 latency_budget=None, idle_after=10.0, step_interval=1.0, smoothing=0.2):
+        self.min_stride = min_stride
+        self.max_stride = max_stride
+        self.target_utilization = target_utilization
+        self.latency_budget = latency_budget
+        self.idle_after = idle_after
+        self.step_interval = step_interval
+        self.smoothing = smoothing
+
+        self.stride = max(min_stride, min(max_stride, initial))
+        self.latency = 0.0
+        self.last_detection = None
+        self.last_change = None
+        self.changes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def fixed(cls, stride):
+        return cls(initial=stride, min_stride=stride, max_stride=stride)
+
+    def update(self, now, latency=None, person_detected=False, input_fps=None):
+        """Feed one inference result and return the stride to use from now on."""
+        with self._lock:
+            if latency is not None:
+                self.latency = latency if not self.latency else (
+                    self.smoothing * latency + (1 - self.smoothing) * self.latency
+                )
+            if person_detected:
+                self.last_detection = now
+            if self.last_change is None:
+                self.last_change = now
+            if now - self.last_change < self.step_interval:
+                return self.stride
+
+            floor = self.min_stride
+            if self.target_utilization and input_fps and self.latency:
+                floor = max(floor, math.ceil(round(self.latency * input_fps / self.target_utilization, 6)))
+            if self.latency_budget and self.latency > self.latency_budget:
+                floor = max(floor, self.stride + 1)
+
+            active = self.last_detection is not None and now - self.last_detection < self.idle_after
+            target = floor if active else max(floor, self.stride + 1)
+            target = max(self.min_stride, min(self.max_stride, target))
+
+            if target != self.stride:
+                self.stride = target
+                self.changes += 1
+            self.last_change = now
+            return self.stride
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "stride": self.stride,
+                "min_stride": self.min_stride,
+                "max_stride": self.max_stride,
+                "inference_latency_ms": round(self.latency * 1000, 1),
+                "latency_budget_ms": round(self.latency_budget * 1000, 1) if self.latency_budget else None,
+                "target_utilization": self.target_utilization,
+                "changes": self.changes,
+            }
@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def process_age():
+    """Seconds since this process was started (Linux), None elsewhere"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupClock:
+    """Seconds from process start to named milestones, each recorded once.
+
+    The process start includes interpreter startup and imports (torch), so
+    the marks are what a container restart actually costs.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic() - (process_age() or 0.0)
+        self.marks = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name):
+        with self._lock:
+            if name not in self.marks:
+                self.marks[name] = round(time.monotonic() - self.started, 3)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.marks)
+
+
+class LazyModel:
+    """Loads the model on first use, exactly once, from whichever thread gets there first.
+
+    Everything else (predict, names, ...) is forwarded to the loaded model,
+    so it stands in wherever a model object is expected. ``warm_up`` runs
+    one inference on a blank frame so the first real frame does not pay for
+    lazy runtime setup; the model counts as ready only after it, or right
+    after loading when ``warmup`` is off. Predictions issued while the
+    warm-up runs wait for it instead of running next to it.
+    """
+
+    def __init__(self, loader, warmup=True, clock=None, imgsz=320, **predict_kwargs):
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self.warmup = warmup
+        self.clock = clock
+        self.imgsz = imgsz
+        self.predict_kwargs = predict_kwargs
+
+        self.state = "cold"  # cold -> loading -> loaded -> warming -> ready, or failed
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def _mark(self, name):
+        if self.clock is not None:
+            self.clock.mark(name)
+
+    def get(self):
+        model = self._model
+        if model is not None:
+            return model
+        with self._lock:
+            if self._model is None:
+                self.state = "loading"
+                started = time.monotonic()
+                try:
+                    self._model = self._loader()
+                except Exception as e:
+                    self.state = "failed"
+                    self.error = str(e)
+                    raise
+                self.load_seconds = time.monotonic() - started
+                self.state = "loaded" if self.warmup else "ready"
+                self._mark("model_loaded")
+                if not self.warmup:
+                    self._mark("model_ready")
+        return self._model
+
+    def warm_up(self):
+        model = self.get()
+        with self._warm_lock:
+            if self.state != "loaded":
+                return model
+            self.state = "warming"
+            started = time.monotonic()
+            try:
+                frame = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+                model.predict(source=frame, imgsz=self.imgsz, verbose=False, **self.predict_kwargs)
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                raise
+            self.warmup_seconds = time.monotonic() - started
+            self.state = "ready"
+            self._mark("model_ready")
+        return model
+
+    def warm_up_in_background(self, then=None):
+        """Load and warm the model on a daemon thread, then call ``then``"""
+        def run():
+            try:
+                self.warm_up()
+            except Exception as e:
+                print(f"[ERROR] Model warm-up failed: {e}")
+                return
+            if then is not None:
+                then()
+
+        thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def predict(self, *args, **kwargs):
+        model = self._model if self.ready else self.warm_up()
+        return model.predict(*args, **kwargs)
+
+    def __call__(self, *args, **kwargs):
+        model = self._model if self.ready else self.warm_up()
+        return model(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Only reached for attributes LazyModel itself does not have
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "error": self.error,
+            "load_s": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "warmup_s": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+        }
@@ -0,0 +1,150 @@
+import math
+import threading
+
+import cv2
+import numpy as np
+
+from common.backends import Boxes, DetectionResult
+
+
+def as_array(values):
+    # Ultralytics returns torch tensors, the onnxruntime backend numpy arrays
+    if hasattr(values, "cpu"):
+        values = values.cpu().numpy()
+    return np.asarray(values, dtype=float)
+
+
+def tile_starts(start, end, size, overlap):
+    """Start offsets of windows of `size` covering [start, end), neighbours overlapping by `overlap`"""
+    length = end - start
+    if length <= size:
+        return [start]
+    count = math.ceil((length - size) / (size * (1 - overlap))) + 1
+    step = (length - size) / (count - 1)
+    return [start + round(i * step) for i in range(count)]
+
+
+def parse_zones(value):
+    """Polygons from a config or request value: [[[x, y], ...], ...] in fractions of the frame.
+
+    Raises ValueError when a polygon has fewer than 3 points or a point lies outside 0.0 - 1.0.
+    """
+    polygons = [np.asarray(polygon, dtype=float) for polygon in value]
+    for polygon in polygons:
+        if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+            raise ValueError("Every zone needs at least 3 [x, y] points")
+        if polygon.min() < 0.0 or polygon.max() > 1.0:
+            raise ValueError("Zone points are fractions of the frame, 0.0 - 1.0")
+    if not polygons:
+        raise ValueError("At least one zone is needed")
+    return polygons
+
+
+class ZoneMask:
+    """Polygon zones of one camera or upload; inference only looks inside them.
+
+    Points are fractions of the frame width and height, so one config fits
+    every resolution of a source. The model only gets the bounding crop of
+    all zones (plus ``padding``), so distant persons cover more of its input
+    and the rest of the scene costs nothing. With ``tile_size`` a crop wider
+    or taller than that many source pixels is also cut into overlapping
+    tiles, each inferred at the model's size; the boxes of the tiles and
+    the whole crop are merged with NMS. A detection only counts when its
+    foot point (bottom centre) is inside a zone, so a person in the street
+    behind the fence is ignored even when their box overlaps the zone.
+
+    crops(frame) returns the images to infer, merge(frame, results, names)
+    turns their results into one result for the whole frame.
+    """
+
+    def __init__(self, polygons, padding=0.02, tile_size=None, tile_overlap=0.2, nms_iou=0.5):
+        self.polygons = parse_zones(polygons)
+        self.padding = padding
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.nms_iou = nms_iou
+        self._layouts = {}  # (height, width) -> (mask, pixel polygons, windows)
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Sent to chunk processes as its settings, the layouts are rebuilt there
+        return ZoneMask, (self.polygons, self.padding, self.tile_size, self.tile_overlap, self.nms_iou)
+
+    def _layout(self, shape):
+        key = tuple(shape[:2])
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is None:
+                layout = self._layouts[key] = self._build(*key)
+            return layout
+
+    def _build(self, height, width):
+        points = [np.round(polygon * [width - 1, height - 1]).astype(np.int32) for polygon in self.polygons]
+        mask = np.zeros((height, width), np.uint8)
+        cv2.fillPoly(mask, points, 255)
+
+        corners = np.concatenate(points)
+        pad_x, pad_y = round(self.padding * width), round(self.padding * height)
+        x1, y1 = max(0, corners[:, 0].min() - pad_x), max(0, corners[:, 1].min() - pad_y)
+        x2, y2 = min(width, corners[:, 0].max() + 1 + pad_x), min(height, corners[:, 1].max() + 1 + pad_y)
+        windows = [(int(x1), int(y1), int(x2), int(y2))]
+        if self.tile_size and max(x2 - x1, y2 - y1) > self.tile_size:
+            windows += [
+                (x, y, min(x + self.tile_size, int(x2)), min(y + self.tile_size, int(y2)))
+                for y in tile_starts(int(y1), int(y2), self.tile_size, self.tile_overlap)
+                for x in tile_starts(int(x1), int(x2), self.tile_size, self.tile_overlap)
+            ]
+        return mask, points, windows
+
+    def region(self, frame):
+        """The bounding crop of the zones, e.g. for the motion gate"""
+        x1, y1, x2, y2 = self._layout(frame.shape)[2][0]
+        return frame[y1:y2, x1:x2]
+
+    def crops(self, frame):
+        """Images to infer for one frame: the zones' bounding crop, then its tiles"""
+        return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in self._layout(frame.shape)[2]]
+
+    def merge(self, frame, results, names):
+        """One result for the whole frame from the results of crops(frame), boxes outside the zones dropped"""
+        windows = self._layout(frame.shape)[2]
+        xyxy, conf, cls = [np.zeros((0, 4))], [np.zeros(0)], [np.zeros(0)]
+        for (x1, y1, _, _), result in zip(windows, results):
+            if len(result.boxes):
+                xyxy.append(as_array(result.boxes.xyxy).reshape(-1, 4) + [x1, y1, x1, y1])
+                conf.append(as_array(result.boxes.conf).reshape(-1))
+                cls.append(as_array(result.boxes.cls).reshape(-1))
+        xyxy, conf, cls = np.concatenate(xyxy), np.concatenate(conf), np.concatenate(cls)
+
+        if len(windows) > 1 and len(xyxy) > 1:
+            # Persons seen by the whole crop and by one or two tiles, per class
+            offset = xyxy + cls[:, None] * (frame.shape[0] + frame.shape[1])
+            rects = np.concatenate([offset[:, :2], offset[:, 2:] - offset[:, :2]], axis=1)
+            kept = cv2.dnn.NMSBoxes(rects.tolist(), conf.tolist(), 0.0, self.nms_iou)
+            kept = np.array(kept, dtype=int).reshape(-1)
+            xyxy, conf, cls = xyxy[kept], conf[kept], cls[kept]
+
+        inside = self.inside(frame, xyxy)
+        return DetectionResult(frame, Boxes(xyxy[inside], conf[inside], cls[inside]), names)
+
+    def inside(self, frame, xyxy):
+        """Which boxes (xyxy, frame pixels) have their foot point in a zone"""
+        mask = self._layout(frame.shape)[0]
+        feet_x = ((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(int).clip(0, frame.shape[1] - 1)
+        feet_y = (xyxy[:, 3] - 1).astype(int).clip(0, frame.shape[0] - 1)
+        return mask[feet_y, feet_x] > 0
+
+    def predict(self, model, frame, **predict_kwargs):
+        """model.predict on the zones of one frame, as a single batch"""
+        return self.merge(frame, model.predict(source=self.crops(frame), **predict_kwargs), model.names)
+
+    def draw(self, frame, color=(255, 200, 0)):
+        cv2.polylines(frame, self._layout(frame.shape)[1], True, color, 1)
+        return frame
+
+    def snapshot(self):
+        return {
+            "zones": [polygon.round(4).tolist() for polygon in self.polygons],
+            "tile_size": self.tile_size,
+            "windows": {f"{width}x{height}": len(layout[2]) for (height, width), layout in self._layouts.items()},
+        }
@@ -1,157 +1,709 @@
-from flask import Flask, Response, jsonify, send_from_directory
-import cv2
-from ultralytics import YOLO
-from datetime import datetime
+from flask import Blueprint, Flask, Response, jsonify, request, url_for
+import functools
 import os
-import subprocess
+import sys
 import threading
+from datetime import datetime
 from flask_cors import CORS
 
+# Modules shared with video_api live in apis/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from common.backends import load_model
+from common.jobs import PRIORITY_LIVE, JobExecutor, JobQueueFull, child_limits
+from common.media import hls_playlist, hls_segment, hls_segments, media_path, send_media
+from common.metrics import CONTENT_TYPE, REGISTRY
+from common.profiler import SamplingProfiler
+from common.stride import StrideController
+from common.warmup import LazyModel, StartupClock
+from common.zones import ZoneMask
+from cameras import CameraRegistry, load_camera_config, open_capture, source_kind
+from footage_index import SORT_ORDERS, FootageIndex, extract_thumbnail, thumbnail_path
+from ingest import IngestRegistry
+from motion import MotionGate
+from pipeline import CameraPipeline
+from recorder import SegmentRecorder
+from retention import DAY, RetentionJanitor
+from tracker import PersonTracker
+from writers import convert_to_mp4, open_clip_writer
+from scheduler import BatchScheduler
+
+# Startup milestones (model loaded/ready, first frame served), in seconds since process start
+startup = StartupClock()
+
+# Routes, registered on the app by create_app()
+api = Blueprint("api", __name__)
 
-app = Flask(__name__)
-CORS(app)
+# Inference backend: "pytorch" (watchman_v3.pt), "onnx", "openvino",
+# "openvino-int8" or "onnxruntime" (ONNX without torch), see
+# model/watchman_v3/export.py for the artifacts
+MODEL_BACKEND = os.environ.get("WATCHMAN_BACKEND", "pytorch")
+MODEL_WEIGHTS = os.environ.get("WATCHMAN_WEIGHTS")  # Default name of the backend when unset
 
-# Load YOLOv8n model
-model = YOLO("watchman_v3.pt")
-model.fuse()
+# Startup: nothing heavy happens at import, the module level app only has
+# the routes. With AUTOSTART, running app.py or create_app() (the WSGI
+# entry point, gunicorn "app:create_app()") opens the cameras and loads +
+# warms the model in the background; otherwise the first stream request does.
+AUTOSTART = os.environ.get("WATCHMAN_AUTOSTART", "1") == "1"
+WARMUP = True  # Run one blank inference before serving, /api/v1/ready waits for it
 
-# Create footage directory if it doesn't exist
-os.makedirs("footages", exist_ok=True)
+# The person model, shared by every camera, loaded on first use
+model = LazyModel(lambda: load_model(MODEL_BACKEND, MODEL_WEIGHTS), warmup=WARMUP, clock=startup,
+                  imgsz=320, device='cpu')
 
-# Webcam capture
-cap = cv2.VideoCapture(0)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+# Footage root, each camera records into its own sub directory
+FOOTAGE_FOLDER = "footages"
+FOOTAGE_INDEX = os.environ.get("WATCHMAN_FOOTAGE_INDEX", os.path.join(FOOTAGE_FOLDER, "index.db"))
+THUMBNAIL_WIDTH = 320
+CLIPS_PAGE_SIZE = 50  # Default and maximum page size of the clip list
+CLIPS_MAX_PAGE_SIZE = 500
+
+# Retention, per camera in cameras.json: max_bytes, max_age_days, compact_after_days
+RETENTION_INTERVAL = 60.0  # Seconds between sweeps, a closed clip triggers one early
+RETENTION_MAX_BYTES = None  # Footage bytes per camera, oldest clips are removed beyond it
+RETENTION_MAX_AGE_DAYS = None
+# Free-space floor, off by default: while less is free on the footage disk,
+# for any reason (other data included), the oldest clips of every camera are
+# deleted, e.g. 1024 * 1024 * 1024 to keep 1GB free
+RETENTION_MIN_FREE_BYTES = None
+COMPACT_AFTER_DAYS = None  # Re-encode clips older than this to reclaim space, None disables
+COMPACT_CRF = 30
+COMPACT_HEIGHT = 360  # Lines of re-encoded clips, None keeps the resolution
+FOOTAGE_MAX_AGE = 3600  # Seconds clients may cache a closed clip, the clip being recorded is always revalidated
+HLS_SEGMENT_SECONDS = 6.0
+
+# Camera sources, see cameras.example.json
+CAMERA_CONFIG = os.environ.get("WATCHMAN_CAMERAS", "cameras.json")
+
+# Network cameras (RTSP/HTTP): one connection per source URL, shared by the
+# cameras using it, reconnected with a backoff when it drops
+INGEST_MODE = "opencv"  # "mjpeg" parses HTTP MJPEG (ESP32-CAM) directly, without FFmpeg
+INGEST_LOW_LATENCY = True  # Keep only the newest frame, False buffers INGEST_BUFFER_FRAMES in order
+INGEST_BUFFER_FRAMES = 30
+INGEST_HW_DECODE = False  # Ask FFmpeg for hardware decoding (opencv mode)
+RECONNECT_MIN_DELAY = 0.5  # Seconds, doubled per failed attempt
+RECONNECT_MAX_DELAY = 30.0
+INGEST_STALL_TIMEOUT = 10.0  # Seconds without data before reconnecting
 
 # Frame processing settings
-frame_count = 0
-vid_stride = 2  # Process every 2nd frame for performance
-recording = False
-out = None
-no_person_frames = 0
-max_no_person_frames = 10  # Number of frames to wait before stopping recording
-
-# Paths for video files
-avi_path = None
-mp4_path = None
-
-# Flag to control saving
-is_saving_enabled = {"enabled": False}
-
-# Convert .avi to .mp4 in background
-def convert_to_mp4(avi_file, mp4_file):
+vid_stride = 2  # Process every 2nd frame for performance (starting value when adaptive)
+
+# Adaptive stride: run inference more often while a person is tracked,
+# less often when idle or when inference is too slow for this box
+ADAPTIVE_STRIDE = True
+MIN_STRIDE = 1
+MAX_STRIDE = 8
+STRIDE_TARGET_UTILIZATION = 0.5  # Share of a core one camera's inference may use
+INFERENCE_LATENCY_BUDGET = 0.25  # Seconds per inference call before backing off
+STRIDE_IDLE_AFTER = 10.0  # Seconds without detections before slowing down
+
+# Motion gate: skip inference while the scene is static, can be overridden per camera
+MOTION_GATE = True
+MOTION_METHOD = "diff"  # "diff" (frame differencing) or "mog2" (background subtraction)
+MOTION_THRESHOLD = 0.005  # Share of changed pixels that counts as motion
+MOTION_COOLDOWN = 3.0  # Seconds of full-rate detection after motion or a detection
+MOTION_HEARTBEAT = 5.0  # Run inference at least this often on a static scene
+
+# Person tracking: persistent ids, detection only every TRACK_DETECT_INTERVAL
+# seconds while persons are tracked, recording follows the track lifetimes
+TRACKING = False  # Can be turned on per camera with "tracking" in cameras.json
+DETECT_CONF = 0.5  # Confidence of a detection without tracking, and of a new track
+TRACK_LOW_CONF = 0.1  # Model confidence when tracking, low detections only extend existing tracks
+TRACK_MIN_HITS = 2  # Detections before a track counts, a single false positive never records
+TRACK_MAX_AGE = 1.5  # Seconds a track survives without a matching detection
+TRACK_DETECT_INTERVAL = 0.5
+
+# Zones: per camera "zones" in cameras.json, polygons in fractions of the
+# frame. Only their bounding crop is inferred, persons outside are ignored
+ZONE_PADDING = 0.02  # Share of the frame added around the zones' crop
+ZONE_TILE_SIZE = 640  # Source pixels per tile of a camera with "zone_tiles", for small distant persons
+
+# Recording settings, can be overridden per camera in cameras.json
+RECORD_FPS = 10.0
+PRE_ROLL_SECONDS = 5.0  # Kept in memory and prepended to every clip
+POST_ROLL_SECONDS = 3.0  # Keep recording after the last detection
+MERGE_GAP_SECONDS = 5.0  # Events closer than this end up in the same clip
+MAX_SEGMENT_SECONDS = 300.0  # Split longer events into several clips
+PRE_ROLL_MAX_BYTES = 16 * 1024 * 1024  # Memory cap of the pre-roll per camera
+PRE_ROLL_QUALITY = 85  # JPEG quality of the pre-roll frames, independent of the streams
+DIRECT_MP4 = True  # Pipe frames straight into ffmpeg/H.264, falls back to AVI + convert
+RECORD_CRF = 23
+
+# Background jobs (AVI fallback conversion) and ffmpeg child limits
+MAX_JOB_WORKERS = 1
+MAX_JOB_QUEUE = 32
+FFMPEG_NICE = 5  # Keep ffmpeg below inference
+FFMPEG_CPUS = None  # e.g. {2, 3} to pin ffmpeg away from the inference cores
+
+# Batched inference settings
+MAX_BATCH = 8  # Frames stacked into one model.predict call
+MAX_BATCH_WAIT = 0.03  # Seconds a frame may wait for a fuller batch
+
+# MJPEG stream profiles, picked with ?profile= (and ?fps= to lower max_fps).
+# A profile is encoded once per frame for all its viewers, and not at all
+# while nobody watches it; width None keeps the camera's resolution.
+STREAM_PROFILES = {
+    "full": {"width": None, "quality": 80, "max_fps": None},
+    "medium": {"width": 480, "quality": 70, "max_fps": 10},
+    "low": {"width": 320, "quality": 50, "max_fps": 5},
+}
+DEFAULT_STREAM_PROFILE = "full"
+
+# Sampling profiler, off until POST /api/v1/profiler/start
+PROFILER_INTERVAL = 0.005  # Seconds between stack samples
+PROFILER_SECONDS = 30.0  # Default length of a profile, it stops by itself
+PROFILER_MAX_SECONDS = 300.0
+
+jobs = JobExecutor(max_workers=MAX_JOB_WORKERS, max_queue=MAX_JOB_QUEUE, name="live-jobs")
+ffmpeg_limits = child_limits(nice=FFMPEG_NICE, cpus=FFMPEG_CPUS)
+
+# Metadata of every stored clip, filled as clips close and by a background scan
+footage_index = FootageIndex(FOOTAGE_INDEX)
+
+# Background job: convert AVI clips, then add the clip to the footage index
+def index_clip(camera_id, clip_path, info):
+    if clip_path.endswith(".avi"):
+        mp4_path = clip_path[:-len(".avi")] + ".mp4"
+        convert_to_mp4(clip_path, mp4_path, preexec_fn=ffmpeg_limits)
+        if not os.path.exists(mp4_path):
+            return
+        clip_path = mp4_path
+    footage_index.add_clip(camera_id, clip_path, info, THUMBNAIL_WIDTH)
+    retention.wake()
+
+# Called once the recorder closes a clip
+def on_clip_closed(camera_id, clip_path, info):
     try:
-        subprocess.run([
-            "ffmpeg", "-y", "-i", avi_file,
-            "-vcodec", "libx264", "-crf", "23", mp4_file
-        ],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        check=True)
-        
-        os.remove(avi_file)
-        print(f"[INFO] Converted and saved: {mp4_file}")
-    except Exception as e:
-        print(f"[ERROR] FFmpeg conversion failed: {e}")
-
-# Live detection & video stream
-def generate_frames():
-    global frame_count, out, recording, no_person_frames, avi_path, mp4_path
-
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-
-        frame_count += 1
-        if frame_count % vid_stride != 0:
-            continue
-
-        # Run inference
-        results = model.predict(
-            source=frame,
-            imgsz=320,
-            conf=0.5,
-            iou=0.45,
-            device='cpu',
-            verbose=False
-        )[0]
-
-        # Detect person
-        person_detected = False
-        for box in results.boxes:
-            cls_id = int(box.cls[0])
-            if model.names[cls_id] == "person":
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, "person", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                person_detected = True
-
-        # Start recording
-        if is_saving_enabled["enabled"] and person_detected:
-            no_person_frames = 0
-            if not recording:
-                timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-                avi_path = f"footages/{timestamp}.avi"
-                mp4_path = f"footages/{timestamp}.mp4"
-                fourcc = cv2.VideoWriter_fourcc(*'MJPG')  # AVI format (fast)
-                out = cv2.VideoWriter(avi_path, fourcc, 10.0, (640, 480))
-                print(f"[INFO] Started recording: {avi_path}")
-                recording = True
-        else:
-            if recording:
-                no_person_frames += 1
-                if no_person_frames >= max_no_person_frames:
-                    recording = False
-                    if out:
-                        out.release()
-                        out = None
-                        print(f"[INFO] Stopped recording. Converting to MP4...")
-                        # Convert in background
-                        threading.Thread(target=convert_to_mp4, args=(avi_path, mp4_path)).start()
-
-        # Write frame to video if recording
-        if recording and out:
-            out.write(frame)
-
-        # Stream to browser
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
-
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+        jobs.submit(index_clip, camera_id, clip_path, info, priority=PRIORITY_LIVE)
+    except JobQueueFull as e:
+        print(f"[ERROR] {e}, {clip_path} is indexed by the next scan")
+
+def open_writer(base_path, fps, frame_size):
+    return open_clip_writer(base_path, fps, frame_size, use_ffmpeg=DIRECT_MP4,
+                            crf=RECORD_CRF, preexec_fn=ffmpeg_limits)
+
+camera_config = load_camera_config(CAMERA_CONFIG)
+tracking = any(settings.get("tracking", TRACKING) for settings in camera_config.values())
+
+# One scheduler batches the frames of all cameras into a single model
+scheduler = BatchScheduler(
+    model,
+    max_batch=MAX_BATCH,
+    max_wait=MAX_BATCH_WAIT,
+    imgsz=320,
+    conf=TRACK_LOW_CONF if tracking else DETECT_CONF,
+    iou=0.45,
+    device='cpu',
+    verbose=False
+)
+
+def days(value):
+    return value * DAY if value is not None else None
+
+# Capture and record/publish run in their own threads per camera
+cameras = CameraRegistry()
+sources = IngestRegistry(reconnect_min=RECONNECT_MIN_DELAY, reconnect_max=RECONNECT_MAX_DELAY,
+                         stall_timeout=INGEST_STALL_TIMEOUT)
+retention_policies = {}
+for camera_id, settings in camera_config.items():
+    footage_dir = os.path.join(FOOTAGE_FOLDER, camera_id)
+    source = settings["source"]
+    retention_policies[camera_id] = {
+        "footage_dir": footage_dir,
+        "max_bytes": settings.get("max_bytes", RETENTION_MAX_BYTES),
+        "max_age": days(settings.get("max_age_days", RETENTION_MAX_AGE_DAYS)),
+        "compact_after": days(settings.get("compact_after_days", COMPACT_AFTER_DAYS)),
+    }
+    recorder = SegmentRecorder(
+        footage_dir,
+        functools.partial(on_clip_closed, camera_id),
+        pre_roll=settings.get("pre_roll", PRE_ROLL_SECONDS),
+        post_roll=settings.get("post_roll", POST_ROLL_SECONDS),
+        merge_gap=settings.get("merge_gap", MERGE_GAP_SECONDS),
+        max_segment=settings.get("max_segment", MAX_SEGMENT_SECONDS),
+        fps=settings.get("record_fps", RECORD_FPS),
+        max_pre_roll_bytes=settings.get("pre_roll_max_bytes", PRE_ROLL_MAX_BYTES),
+        open_writer=open_writer,
+        jpeg_quality=settings.get("pre_roll_quality", PRE_ROLL_QUALITY),
+    )
+    motion_gate = None
+    if settings.get("motion_gate", MOTION_GATE):
+        motion_gate = MotionGate(
+            method=settings.get("motion_method", MOTION_METHOD),
+            threshold=settings.get("motion_threshold", MOTION_THRESHOLD),
+            cooldown=settings.get("motion_cooldown", MOTION_COOLDOWN),
+            heartbeat=settings.get("motion_heartbeat", MOTION_HEARTBEAT),
+        )
+    if settings.get("adaptive_stride", ADAPTIVE_STRIDE):
+        stride = StrideController(
+            initial=settings.get("vid_stride", vid_stride),
+            min_stride=settings.get("min_stride", MIN_STRIDE),
+            max_stride=settings.get("max_stride", MAX_STRIDE),
+            target_utilization=settings.get("target_utilization", STRIDE_TARGET_UTILIZATION),
+            latency_budget=settings.get("latency_budget", INFERENCE_LATENCY_BUDGET),
+            idle_after=settings.get("stride_idle_after", STRIDE_IDLE_AFTER),
+        )
+    else:
+        stride = StrideController.fixed(settings.get("vid_stride", vid_stride))
+    tracker = None
+    if settings.get("tracking", TRACKING):
+        tracker = PersonTracker(
+            high_conf=DETECT_CONF,
+            min_hits=settings.get("track_min_hits", TRACK_MIN_HITS),
+            max_age=settings.get("track_max_age", TRACK_MAX_AGE),
+            detect_interval=settings.get("track_detect_interval", TRACK_DETECT_INTERVAL),
+        )
+    zones = None
+    if settings.get("zones"):
+        zones = ZoneMask(
+            settings["zones"],
+            padding=settings.get("zone_padding", ZONE_PADDING),
+            tile_size=settings.get("zone_tile_size", ZONE_TILE_SIZE) if settings.get("zone_tiles") else None,
+        )
+    if source_kind(source) == "stream":
+        capture = functools.partial(
+            sources.reader,
+            source,
+            mode=settings.get("ingest", INGEST_MODE),
+            low_latency=settings.get("low_latency", INGEST_LOW_LATENCY),
+            buffer_frames=settings.get("buffer_frames", INGEST_BUFFER_FRAMES),
+            hw_decode=settings.get("hw_decode", INGEST_HW_DECODE),
+        )
+    else:
+        capture = functools.partial(open_capture, source)
+    cameras.add(camera_id, CameraPipeline(
+        camera_id,
+        capture,  # Opened on the capture thread
+        scheduler,
+        recorder,
+        stride,
+        motion_gate=motion_gate,
+        realtime=source_kind(source) == "file",
+        tracker=tracker,
+        min_conf=DETECT_CONF,
+        zones=zones,
+        stream_profiles=STREAM_PROFILES,
+    ), source)
+
+def is_recording(path):
+    return any(recording_clip(pipeline, path) for _, pipeline in cameras.items())
+
+# One janitor keeps every camera's footage within its quota, re-encodes run as background jobs
+retention = RetentionJanitor(
+    footage_index,
+    retention_policies,
+    is_recording,
+    interval=RETENTION_INTERVAL,
+    min_free_bytes=RETENTION_MIN_FREE_BYTES,
+    compact_crf=COMPACT_CRF,
+    compact_height=COMPACT_HEIGHT,
+    submit=jobs.submit,
+    preexec_fn=ffmpeg_limits,
+)
+
+profiler = SamplingProfiler()
+
+# Gauges and counters for /metrics, read from the snapshots at scrape time
+@REGISTRY.collector
+def collect_metrics():
+    stages, recorders, streams, profiles = [], [], [], []
+    for camera_id, pipeline in cameras.items():
+        for stage, meter in pipeline.stats.items():
+            stages.append(({"camera": camera_id, "stage": stage}, meter.snapshot()))
+        recorders.append(({"camera": camera_id}, pipeline.recorder.snapshot()))
+        streams.append(({"camera": camera_id}, pipeline))
+        for name, stats in pipeline.hub.snapshot()["profiles"].items():
+            profiles.append(({"camera": camera_id, "profile": name}, stats))
+    ingest = [({"source": stats["source"]}, stats) for stats in sources.snapshot()]
+    job_stats = jobs.snapshot()
+    scheduler_stats = scheduler.snapshot()
+    disk = retention.disk_usage()
+    return [
+        ("watchman_stage_fps", "gauge", "Frames per second through a pipeline stage",
+         [(labels, stats["fps"]) for labels, stats in stages]),
+        ("watchman_stage_frames_total", "counter", "Frames through a pipeline stage",
+         [(labels, stats["processed"]) for labels, stats in stages]),
+        ("watchman_stage_dropped_total", "counter", "Frames a pipeline stage dropped or replaced",
+         [(labels, stats["dropped"]) for labels, stats in stages]),
+        ("watchman_recorder_recording", "gauge", "1 while the camera writes a clip (recording or merge wait)",
+         [(labels, stats["state"] != "idle") for labels, stats in recorders]),
+        ("watchman_recorder_clips_total", "counter", "Clips the camera recorded",
+         [(labels, stats["clips"]) for labels, stats in recorders]),
+        ("watchman_preroll_bytes", "gauge", "Memory held by the pre-roll buffer",
+         [(labels, stats["pre_roll"]["bytes"]) for labels, stats in recorders]),
+        ("watchman_stream_viewers", "gauge", "Clients watching the MJPEG stream, by profile",
+         [(labels, stats["subscribers"]) for labels, stats in profiles]),
+        ("watchman_stream_encoded_total", "counter", "Frames JPEG-encoded for a stream profile",
+         [(labels, stats["encoded"]) for labels, stats in profiles]),
+        ("watchman_stride", "gauge", "Current inference stride (every Nth frame)",
+         [(labels, pipeline.stride.stride) for labels, pipeline in streams]),
+        ("watchman_persons", "gauge", "Persons in the last annotated frame",
+         [(labels, pipeline.persons) for labels, pipeline in streams]),
+        ("watchman_ingest_connected", "gauge", "1 while the network camera is connected",
+         [(labels, stats["connected"]) for labels, stats in ingest]),
+        ("watchman_ingest_frames_total", "counter", "Frames decoded from the network camera",
+         [(labels, stats["frames"]) for labels, stats in ingest]),
+        ("watchman_ingest_skipped_total", "counter", "Frames received but not decoded, newer ones had arrived",
+         [(labels, stats["skipped"]) for labels, stats in ingest]),
+        ("watchman_ingest_reconnects_total", "counter", "Reconnects to the network camera",
+         [(labels, stats["reconnects"]) for labels, stats in ingest]),
+        ("watchman_scheduler_frames_total", "counter", "Frames inferred by the batch scheduler",
+         [({}, scheduler_stats["frames_inferred"])]),
+        ("watchman_scheduler_images_total", "counter", "Images inferred, zone crops and tiles included",
+         [({}, scheduler_stats["images_inferred"])]),
+        ("watchman_jobs_queue_depth", "gauge", "Background jobs waiting", [({}, job_stats["queue_depth"])]),
+        ("watchman_jobs_running", "gauge", "Background jobs running", [({}, job_stats["running"])]),
+        ("watchman_jobs_total", "counter", "Background jobs by outcome",
+         [({"outcome": outcome}, job_stats[outcome]) for outcome in ("completed", "failed", "rejected")]),
+        ("watchman_model_ready", "gauge", "1 once the model is loaded and warm", [({}, model.ready)]),
+        ("watchman_disk_free_bytes", "gauge", "Free space on the footage disk", [({}, disk["free"])]),
+    ]
 
+_start_lock = threading.Lock()
+pipelines_started = False
+
+# One background detection loop per camera, independent of viewers. The
+# cameras open right away, inference starts once the model is warm.
+def start_pipelines():
+    global pipelines_started
+    with _start_lock:
+        if pipelines_started:
+            return
+        pipelines_started = True
+    cameras.start_all()
+    rebuild_footage_index()
+    retention.start()
+    if WARMUP:
+        model.warm_up_in_background(then=scheduler.start)
+    else:
+        scheduler.start()
+
+# Sync the footage index with the folders in the background, e.g. after clips were copied or deleted by hand
+def rebuild_footage_index():
+    return footage_index.rebuild_in_background(
+        {camera_id: pipeline.recorder.footage_dir for camera_id, pipeline in cameras.items()},
+        skip=is_recording,
+    )
+
+def camera_not_found():
+    return jsonify({"error": "Camera not found"}), 404
+
+# Live detection & video stream, fanned out from the shared hub; the parts come ready-made
+def generate_frames(pipeline, profile=DEFAULT_STREAM_PROFILE, max_fps=None):
+    start_pipelines()
+    for part in pipeline.hub.subscribe(profile, max_fps):
+        startup.mark("first_frame")
+        yield part
+
+
+@api.route("/api/v1/cameras")
+def list_cameras():
+    return jsonify(cameras.snapshot()), 200
 
 # Route to video stream
-@app.route('/api/v1/video')
-def video():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@api.route('/api/v1/cameras/<camera_id>/video')
+def camera_video(camera_id):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    profile = request.args.get("profile", DEFAULT_STREAM_PROFILE)
+    if profile not in STREAM_PROFILES:
+        return jsonify({"error": f"Unknown profile, expected one of {sorted(STREAM_PROFILES)}"}), 400
+    max_fps = request.args.get("fps", type=float)
+    if "fps" in request.args and not (max_fps and max_fps > 0):
+        return jsonify({"error": "fps must be a positive number"}), 400
+    return Response(generate_frames(pipeline, profile, max_fps),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route("/api/v1/footages")
-def list_footages():
-    files = os.listdir("footages")
+@api.route("/api/v1/cameras/<camera_id>/footages")
+def camera_footages(camera_id):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    # From the index once it is in sync with the folder, names newest first as before
+    if footage_index.scanned(camera_id):
+        clips, _ = footage_index.query(camera_id, limit=None)
+        return jsonify([clip["filename"] for clip in clips])
+    files = os.listdir(pipeline.recorder.footage_dir)
     mp4_files = sorted([f for f in files if f.endswith(".mp4")], reverse=True)
     return jsonify(mp4_files)
 
-@app.route("/api/v1/footages/<path:filename>")
+def parse_time(value):
+    """Unix seconds or an ISO 8601 date/time from a query parameter, None when absent"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def clip_json(clip):
+    return {
+        "camera": clip["camera"],
+        "filename": clip["filename"],
+        "started_at": datetime.fromtimestamp(clip["started_at"]).isoformat(timespec="seconds"),
+        "ended_at": datetime.fromtimestamp(clip["ended_at"]).isoformat(timespec="seconds"),
+        "duration": round(clip["duration"], 2),
+        "size": clip["size"],
+        "peak_persons": clip["peak_persons"],
+        "unique_persons": clip["unique_persons"],
+        "max_dwell": round(clip["max_dwell"], 1) if clip["max_dwell"] is not None else None,
+        "url": url_for("api.camera_download_footage", camera_id=clip["camera"], filename=clip["filename"]),
+        "thumbnail": url_for("api.camera_clip_thumbnail", camera_id=clip["camera"], filename=clip["filename"]),
+    }
+
+# API endpoint with one page of clip metadata: ?since=&until=&sort=&limit=&offset= (and camera= for all cameras)
+@api.route("/api/v1/clips")
+def list_clips(camera_id=None):
+    camera_id = camera_id or request.args.get("camera")
+    sort = request.args.get("sort", "newest")
+    if sort not in SORT_ORDERS:
+        return jsonify({"error": f"sort must be one of {', '.join(SORT_ORDERS)}"}), 400
+    try:
+        since = parse_time(request.args.get("since"))
+        until = parse_time(request.args.get("until"))
+        limit = min(int(request.args.get("limit", CLIPS_PAGE_SIZE)), CLIPS_MAX_PAGE_SIZE)
+        offset = max(0, int(request.args.get("offset", 0)))
+    except ValueError:
+        return jsonify({"error": "Invalid since, until, limit or offset"}), 400
+
+    clips, total = footage_index.query(camera_id, since, until, sort, max(1, limit), offset)
+    next_offset = offset + len(clips)
+    return jsonify({
+        "clips": [clip_json(clip) for clip in clips],
+        "total": total,
+        "offset": offset,
+        "next_offset": next_offset if next_offset < total else None,
+    }), 200
+
+@api.route("/api/v1/cameras/<camera_id>/clips")
+def camera_clips(camera_id):
+    if cameras.get(camera_id) is None:
+        return camera_not_found()
+    return list_clips(camera_id)
+
+# Thumbnail of a clip: the frame with the most persons, or a frame from the middle for scanned clips
+@api.route("/api/v1/cameras/<camera_id>/clips/<filename>/thumbnail")
+def camera_clip_thumbnail(camera_id, filename):
+    pipeline, path = footage_mp4(camera_id, filename)
+    clip = footage_index.get(camera_id, filename) if path else None
+    if clip is None:
+        return jsonify({"error": "Clip not found"}), 404
+    thumbnail = clip["thumbnail"]
+    if not thumbnail or not os.path.exists(thumbnail):
+        thumbnail = thumbnail_path(path)
+        if not extract_thumbnail(path, thumbnail, clip["duration"] / 2, THUMBNAIL_WIDTH, preexec_fn=ffmpeg_limits):
+            return jsonify({"error": "Thumbnail not available"}), 404
+        footage_index.set_thumbnail(camera_id, filename, thumbnail)
+    return send_media(thumbnail, mimetype="image/jpeg", max_age=FOOTAGE_MAX_AGE)
+
+# Re-sync the footage index with the folders, runs in the background
+@api.route("/api/v1/clips/rebuild", methods=["POST"])
+def rebuild_clips():
+    started = rebuild_footage_index()
+    return jsonify({"started": started, **footage_index.snapshot()}), 202 if started else 409
+
+@api.route("/api/v1/cameras/<camera_id>/footages/<path:filename>")
+def camera_download_footage(camera_id, filename):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    path = media_path(pipeline.recorder.footage_dir, filename)
+    if path is None:
+        return jsonify({"error": "Footage not found"}), 404
+    # Range requests let the player seek without downloading the whole clip
+    return send_media(path, max_age=0 if recording_clip(pipeline, path) else FOOTAGE_MAX_AGE)
+
+def recording_clip(pipeline, path):
+    current = pipeline.recorder.current_path
+    return current is not None and os.path.abspath(current) == os.path.abspath(path)
+
+def footage_mp4(camera_id, filename):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None or not filename.endswith(".mp4"):
+        return None, None
+    return pipeline, media_path(pipeline.recorder.footage_dir, filename)
+
+def footage_unreadable():
+    return jsonify({"error": "Footage could not be read"}), 500
+
+# HLS playlist of a stored clip, segmented on the fly (stream copy) so long clips play without a full download
+@api.route("/api/v1/cameras/<camera_id>/hls/<filename>/index.m3u8")
+def camera_footage_playlist(camera_id, filename):
+    pipeline, path = footage_mp4(camera_id, filename)
+    if path is None:
+        return jsonify({"error": "Footage not found"}), 404
+    segments = hls_segments(path, HLS_SEGMENT_SECONDS)
+    if segments is None:
+        return footage_unreadable()
+    return hls_playlist(
+        segments,
+        lambda index: url_for("api.camera_footage_segment", camera_id=camera_id, filename=filename, index=index),
+        complete=not recording_clip(pipeline, path),
+    )
+
+@api.route("/api/v1/cameras/<camera_id>/hls/<filename>/<int:index>.ts")
+def camera_footage_segment(camera_id, filename, index):
+    pipeline, path = footage_mp4(camera_id, filename)
+    segments = hls_segments(path, HLS_SEGMENT_SECONDS) if path else []
+    if segments is None:
+        return footage_unreadable()
+    if index >= len(segments):
+        return jsonify({"error": "Segment not found"}), 404
+    start, duration = segments[index]
+    return hls_segment(path, start, duration, preexec_fn=ffmpeg_limits,
+                       max_age=0 if recording_clip(pipeline, path) else FOOTAGE_MAX_AGE)
+
+@api.route("/api/v1/cameras/<camera_id>/start-saving", methods=["POST"])
+def camera_start_saving(camera_id):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    pipeline.saving_enabled = True
+    return jsonify({"message": "Saving started"}), 200
+
+@api.route("/api/v1/cameras/<camera_id>/stop-saving", methods=["POST"])
+def camera_stop_saving(camera_id):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    pipeline.saving_enabled = False
+    return jsonify({"message": "Saving stopped"}), 200
+
+@api.route("/api/v1/cameras/<camera_id>/is-saving", methods=["GET"])
+def camera_saving_status(camera_id):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    return jsonify({"saving": pipeline.saving_enabled}), 200
+
+# Current inference stride and measured latency of a camera
+@api.route("/api/v1/cameras/<camera_id>/stride", methods=["GET"])
+def camera_stride(camera_id):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    return jsonify(pipeline.stride.snapshot()), 200
+
+# Recorder state and pre-roll memory use of a camera
+@api.route("/api/v1/cameras/<camera_id>/recorder", methods=["GET"])
+def camera_recorder(camera_id):
+    pipeline = cameras.get(camera_id)
+    if pipeline is None:
+        return camera_not_found()
+    return jsonify(pipeline.recorder.snapshot()), 200
+
+# Single camera routes, kept for the local frontend; they act on the first camera
+@api.route('/api/v1/video')
+def video():
+    return camera_video(cameras.default_id())
+
+@api.route("/api/v1/footages")
+def list_footages():
+    return camera_footages(cameras.default_id())
+
+@api.route("/api/v1/footages/<path:filename>")
 def download_footage(filename):
-    return send_from_directory("footages", filename)
+    return camera_download_footage(cameras.default_id(), filename)
 
-@app.route("/api/v1/start-saving", methods=["POST"])
+@api.route("/api/v1/hls/<filename>/index.m3u8")
+def footage_playlist(filename):
+    return camera_footage_playlist(cameras.default_id(), filename)
+
+@api.route("/api/v1/start-saving", methods=["POST"])
 def start_saving():
-    is_saving_enabled["enabled"] = True
-    return jsonify({"message": "Saving started"}), 200
+    return camera_start_saving(cameras.default_id())
 
-@app.route("/api/v1/stop-saving", methods=["POST"])
+@api.route("/api/v1/stop-saving", methods=["POST"])
 def stop_saving():
-    is_saving_enabled["enabled"] = False
-    return jsonify({"message": "Saving stopped"}), 200
+    return camera_stop_saving(cameras.default_id())
 
-@app.route("/api/v1/is-saving", methods=["GET"])
+@api.route("/api/v1/is-saving", methods=["GET"])
 def check_saving_status():
-    return jsonify({"saving": is_saving_enabled["enabled"]}), 200
+    return camera_saving_status(cameras.default_id())
+
+# Per-stage FPS, drop counters and latency of every camera and the scheduler
+@api.route("/api/v1/stats", methods=["GET"])
+def pipeline_stats():
+    return jsonify({
+        "scheduler": scheduler.snapshot(),
+        "cameras": cameras.snapshot(),
+        "sources": sources.snapshot(),
+        "footage_index": footage_index.snapshot(),
+        "startup": startup.snapshot(),
+    }), 200
+
+# Readiness: 200 once the model is warm and the cameras are running, 503 before
+@api.route("/api/v1/ready", methods=["GET"])
+def readiness():
+    ready = model.ready and pipelines_started
+    return jsonify({
+        "ready": ready,
+        "model": model.snapshot(),
+        "cameras_started": pipelines_started,
+        "startup": startup.snapshot(),
+    }), 200 if ready else 503
+
+# Disk usage, per-camera footage bytes and what retention removed or re-encoded
+@api.route("/api/v1/storage", methods=["GET"])
+def storage_stats():
+    return jsonify(retention.snapshot()), 200
+
+# Queue depth and wait time of the background jobs
+@api.route("/api/v1/jobs", methods=["GET"])
+def job_stats():
+    return jsonify(jobs.snapshot()), 200
+
+# Prometheus metrics: stage histograms, FPS, drops, recorder and job state, ffmpeg run times
+@api.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+# Start sampling the stacks of every thread, e.g. {"interval_ms": 5, "seconds": 30}
+@api.route("/api/v1/profiler/start", methods=["POST"])
+def profiler_start():
+    data = request.get_json(silent=True) or {}
+    try:
+        interval = float(data.get("interval_ms", PROFILER_INTERVAL * 1000)) / 1000
+        seconds = float(data.get("seconds", PROFILER_SECONDS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "interval_ms and seconds must be numbers"}), 400
+    if not 0.001 <= interval <= 1.0 or not 0 < seconds <= PROFILER_MAX_SECONDS:
+        return jsonify({"error": f"interval_ms must be 1 - 1000, seconds 0 - {PROFILER_MAX_SECONDS:g}"}), 400
+    if not profiler.start(interval, seconds):
+        return jsonify({"error": "A profile is already running"}), 409
+    return jsonify(profiler.snapshot()), 200
+
+@api.route("/api/v1/profiler/stop", methods=["POST"])
+def profiler_stop():
+    profiler.stop()
+    return jsonify(profiler.snapshot()), 200
+
+# The last profile as folded stacks, for speedscope or flamegraph.pl
+@api.route("/api/v1/profiler", methods=["GET"])
+def profiler_stacks():
+    if request.args.get("format") == "json":
+        return jsonify(profiler.snapshot()), 200
+    return Response(profiler.collapsed(), mimetype="text/plain")
+
+# Application factory, cheap: folders and routes only, the heavy parts start in the background
+def create_app(autostart=AUTOSTART):
+    app = Flask(__name__)
+    CORS(app, expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "ETag"])
+    app.register_blueprint(api)
+    for _, pipeline in cameras.items():
+        os.makedirs(pipeline.recorder.footage_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(os.path.abspath(FOOTAGE_INDEX)), exist_ok=True)
+    startup.mark("app_created")
+    if autostart:
+        start_pipelines()
+    return app
+
+# Routes only, for imports and tests; serving starts the cameras
+app = create_app(autostart=False)
 
 # Run the Flask server
 if __name__ == '__main__':
+    if AUTOSTART:
+        start_pipelines()
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,122 @@
+# Download performance of a stored clip on a running API:
+#   full        - time to first byte and throughput of a complete GET
+#   range       - random 1MB Range requests, as a seeking player makes them
+#   revalidate  - conditional GET with the ETag, should be a 304 without a body
+#   hls         - playlist and first segment time to first byte (--hls)
+#
+# python benchmarks/bench_downloads.py --make footages/cam0/big.mp4 --seconds 3600 --bitrate 8M
+# python benchmarks/bench_downloads.py http://127.0.0.1:5000/api/v1/cameras/cam0/footages/big.mp4 \
+#     --hls http://127.0.0.1:5000/api/v1/cameras/cam0/hls/big.mp4/index.m3u8
+# python benchmarks/bench_downloads.py http://127.0.0.1:5001/api/v1/result/<job_id>
+import argparse
+import http.client
+import random
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+
+BLOCK = 1024 * 1024
+
+
+def make_clip(path, seconds, bitrate):
+    # Fragmented like the recorder's clips, at a fixed bitrate to reach a given size
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=25:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-b:v", bitrate, "-g", "25", "-pix_fmt", "yuv420p",
+        "-movflags", "+frag_keyframe+empty_moov+default_base_moof", path
+    ], check=True)
+
+
+def request(url, headers=None):
+    """(status, headers, time to first byte, total time, body bytes)"""
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    started = time.perf_counter()
+    conn.request("GET", parts.path + (f"?{parts.query}" if parts.query else ""), headers=headers or {})
+    response = conn.getresponse()
+    first = response.read(1)
+    ttfb = time.perf_counter() - started
+    size = len(first)
+    while True:
+        data = response.read(BLOCK)
+        if not data:
+            break
+        size += len(data)
+    total = time.perf_counter() - started
+    conn.close()
+    return response.status, dict(response.getheaders()), ttfb, total, size
+
+
+def ms(values):
+    values = sorted(values)
+    return (f"p50 {statistics.median(values) * 1000:7.1f} ms  "
+            f"p95 {values[int(len(values) * 0.95) - 1 if len(values) > 1 else 0] * 1000:7.1f} ms")
+
+
+def bench_file(url, ranges, range_size):
+    status, headers, ttfb, total, size = request(url)
+    print(f"full        HTTP {status}  ttfb {ttfb * 1000:7.1f} ms  {size / 1e6:9.1f} MB in {total:6.2f} s"
+          f"  {size / 1e6 / total:7.1f} MB/s")
+
+    ttfbs, statuses = [], set()
+    for _ in range(ranges):
+        start = random.randrange(0, max(1, size - range_size))
+        status, _, ttfb, _, _ = request(url, {"Range": f"bytes={start}-{start + range_size - 1}"})
+        statuses.add(status)
+        ttfbs.append(ttfb)
+    print(f"range       HTTP {sorted(statuses)}  {ranges} x {range_size // 1024} KB  ttfb {ms(ttfbs)}")
+
+    etag = headers.get("ETag")
+    if etag:
+        status, _, ttfb, _, body = request(url, {"If-None-Match": etag})
+        print(f"revalidate  HTTP {status}  ttfb {ttfb * 1000:7.1f} ms  body {body} bytes")
+    else:
+        print("revalidate  no ETag")
+
+
+def bench_hls(url):
+    status, _, ttfb, _, _ = request(url)
+    print(f"playlist    HTTP {status}  ttfb {ttfb * 1000:7.1f} ms")
+    parts = urllib.parse.urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    conn.request("GET", parts.path)
+    playlist = conn.getresponse().read().decode()
+    conn.close()
+    segments = [line for line in playlist.splitlines() if line and not line.startswith("#")]
+    if not segments:
+        print("segment     playlist is empty")
+        return
+    base = f"{parts.scheme}://{parts.netloc}"
+    ttfbs = []
+    for segment in [segments[0], segments[len(segments) // 2], segments[-1]]:
+        status, _, ttfb, total, size = request(urllib.parse.urljoin(base + parts.path, segment))
+        ttfbs.append(ttfb)
+    print(f"segment     HTTP {status}  {len(segments)} segments  first/middle/last ttfb {ms(ttfbs)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url", nargs="?")
+    parser.add_argument("--hls", help="Playlist URL of the same clip")
+    parser.add_argument("--ranges", type=int, default=50)
+    parser.add_argument("--range-size", type=int, default=BLOCK)
+    parser.add_argument("--make", help="Create a test clip at this path first")
+    parser.add_argument("--seconds", type=float, default=3600)
+    parser.add_argument("--bitrate", default="8M", help="8M for an hour is about 3.6GB")
+    args = parser.parse_args()
+
+    if args.make:
+        make_clip(args.make, args.seconds, args.bitrate)
+        print(f"created {args.make}")
+    if args.url:
+        bench_file(args.url, args.ranges, args.range_size)
+    if args.hls:
+        bench_hls(args.hls)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
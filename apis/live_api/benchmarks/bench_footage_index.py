@@ -0,0 +1,88 @@
+# Query latency of the footage index with many clips, next to the old
+# os.listdir + sort listing of the same number of files.
+#
+# The index is filled with synthetic clips (5 minutes apart, spread over
+# the cameras), so nothing has to be recorded first.
+# python benchmarks/bench_footage_index.py [--clips 100000] [--cameras 4] [--listdir]
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+from footage_index import FootageIndex
+
+
+def fill(index, clips, cameras):
+    started = time.perf_counter()
+    conn = index._conn()
+    conn.execute("BEGIN")
+    base = time.time() - clips * 300
+    for i in range(clips):
+        start = base + i * 300 + random.uniform(0, 60)
+        duration = random.uniform(10, 300)
+        name = time.strftime("%Y-%m-%d_%H-%M-%S", time.localtime(start)) + f"_{i}.mp4"
+        index.add(f"cam{i % cameras}", name, start, start + duration, int(duration * 250_000), start,
+                  peak_persons=random.randint(1, 6))
+    conn.execute("COMMIT")
+    return time.perf_counter() - started
+
+
+def measure(fn, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return statistics.median(times) * 1000, times[int(len(times) * 0.95) - 1 if runs > 1 else 0] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clips", type=int, default=100_000)
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--listdir", action="store_true", help="Also time os.listdir + sort on as many empty files")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="watchman_index_")
+    index = FootageIndex(os.path.join(workdir, "index.db"))
+    print(f"filled {args.clips} clips in {fill(index, args.clips, args.cameras):.1f} s")
+
+    clips, total = index.query(limit=None, sort="oldest")
+    middle = clips[len(clips) // 2]["started_at"]
+    day = 24 * 3600
+    queries = {
+        "newest page (all cameras)": lambda: index.query(limit=50),
+        "newest page (one camera)": lambda: index.query("cam0", limit=50),
+        "deep page (offset 90%)": lambda: index.query(limit=50, offset=int(total * 0.9)),
+        "one day, one camera": lambda: index.query("cam1", since=middle, until=middle + day, limit=50),
+        "one day, by persons": lambda: index.query(since=middle, until=middle + day, sort="persons", limit=50),
+        "largest page (all cameras)": lambda: index.query(sort="largest", limit=50),
+    }
+    print(f"{'query':<30}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, query in queries.items():
+        p50, p95 = measure(query, args.runs)
+        print(f"{name:<30}{p50:>10.2f}{p95:>10.2f}")
+
+    if args.listdir:
+        folder = os.path.join(workdir, "cam0")
+        os.makedirs(folder)
+        for clip in clips:
+            open(os.path.join(folder, clip["filename"]), "w").close()
+        p50, p95 = measure(
+            lambda: sorted([f for f in os.listdir(folder) if f.endswith(".mp4")], reverse=True),
+            max(1, args.runs // 5),
+        )
+        print(f"{'listdir + sort (old)':<30}{p50:>10.2f}{p95:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
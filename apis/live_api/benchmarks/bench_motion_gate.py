@@ -0,0 +1,118 @@
+# Replay recorded footage through the motion gate and measure what it costs:
+# how many inference calls it saves and how many person events it misses.
+#
+# Ground truth is either a labels file ([{"start": s, "end": s}, ...] in
+# seconds) or, without one, YOLO run on every strided frame.
+#
+# python benchmarks/bench_motion_gate.py night_corridor.mp4 [--labels events.json]
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+from ultralytics import YOLO
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, API_DIR)
+from motion import MotionGate  # noqa: E402
+
+
+def detect(model, frame):
+    started = time.monotonic()
+    results = model.predict(source=frame, imgsz=320, conf=0.5, iou=0.45,
+                            device="cpu", verbose=False)[0]
+    found = any(model.names[int(box.cls[0])] == "person" for box in results.boxes)
+    return found, time.monotonic() - started
+
+
+# Detection timestamps closer than merge_gap form one event
+def to_events(times, merge_gap):
+    events = []
+    for t in times:
+        if events and t - events[-1]["end"] <= merge_gap:
+            events[-1]["end"] = t
+        else:
+            events.append({"start": t, "end": t})
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--labels", help="JSON list of {start, end} person events in seconds")
+    parser.add_argument("--model", default=os.path.join(API_DIR, "watchman_v3.pt"))
+    parser.add_argument("--vid-stride", type=int, default=2)
+    parser.add_argument("--method", default="diff", choices=["diff", "mog2"])
+    parser.add_argument("--threshold", type=float, default=0.005)
+    parser.add_argument("--cooldown", type=float, default=3.0)
+    parser.add_argument("--heartbeat", type=float, default=5.0)
+    parser.add_argument("--merge-gap", type=float, default=2.0)
+    args = parser.parse_args()
+
+    model = YOLO(args.model)
+    gate = MotionGate(method=args.method, threshold=args.threshold,
+                      cooldown=args.cooldown, heartbeat=args.heartbeat)
+    cap = cv2.VideoCapture(args.video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    truth_times, gated_times = [], []
+    frames = inferred = 0
+    inference_time = 0.0
+    index = 0
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        index += 1
+        if index % args.vid_stride:
+            continue
+        frames += 1
+        timestamp = index / fps
+
+        # Without labels every frame is inferred once for the ground truth
+        found = None
+        if not args.labels:
+            found, latency = detect(model, frame)
+            inference_time += latency
+            if found:
+                truth_times.append(timestamp)
+
+        if gate.check(frame, timestamp):
+            inferred += 1
+            if found is None:
+                found, latency = detect(model, frame)
+                inference_time += latency
+            if found:
+                gated_times.append(timestamp)
+                gate.hold(timestamp)
+    cap.release()
+
+    if args.labels:
+        with open(args.labels) as f:
+            events = json.load(f)
+    else:
+        events = to_events(truth_times, args.merge_gap)
+
+    missed = [e for e in events
+              if not any(e["start"] <= t <= e["end"] for t in gated_times)]
+    calls = inferred if args.labels else frames
+    latency = inference_time / calls if calls else 0.0
+    stats = gate.snapshot(latency)
+
+    print(f"frames processed     {frames}")
+    print(f"inference calls      {inferred} ({inferred / frames:.1%} of frames)" if frames else "no frames")
+    print(f"gate cost            {stats['gate_ms_per_frame']} ms/frame")
+    print(f"inference latency    {latency * 1000:.1f} ms")
+    print(f"cpu seconds saved    {stats['cpu_seconds_saved']}")
+    print(f"person events        {len(events)}")
+    print(f"missed events        {len(missed)}")
+    for event in missed:
+        print(f"  {event['start']:.1f}s - {event['end']:.1f}s")
+    if events:
+        print(f"event recall         {1 - len(missed) / len(events):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Replay a video file through the live pipeline as if it were a camera, with
+# no camera, server or network: app.py builds the camera exactly as in
+# production (cameras.json settings, motion gate, stride, tracker, zones,
+# batch scheduler, recorder, clip indexing jobs), only its capture is a
+# ReplayCapture of the file and its footage goes to a temporary folder.
+#
+# Reports frames per second through the pipeline, p50/p99 latency from
+# capture to the recorder, frames the "camera" dropped, peak RSS, CPU seconds
+# (ffmpeg children included), bytes written, the clips recorded and, with
+# --labels ([{"start": s, "end": s}, ...] person events in seconds), event
+# recall: an event counts as found when the pipeline saw a person during it.
+#
+# --speed 1 delivers frames at the file's frame rate like a camera (frames
+# the pipeline is too slow for are dropped), --speed 0 as fast as the
+# pipeline takes them, which measures throughput. --baseline compares with
+# the results stored by --save-baseline and exits with 1 on a regression.
+#
+# python benchmarks/bench_replay.py lobby.mp4 --labels lobby.json --baseline baselines.json
+# python benchmarks/bench_replay.py --synthetic 60 --speed 0 --settings '{"motion_gate": false}'
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.join(API_DIR, ".."))
+from common.backends import default_weights  # noqa: E402
+from common.replay import (ReplayCapture, Usage, check_baseline, event_recall, latency_stats,  # noqa: E402
+                           load_events, print_result, synthetic_video, to_ranges)
+
+CAMERA_ID = "replay"
+
+
+def load_settings(value):
+    if not value:
+        return {}
+    if os.path.exists(value):
+        with open(value) as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video", nargs="?")
+    parser.add_argument("--synthetic", type=float, help="Seconds of a generated test pattern instead of a file")
+    parser.add_argument("--settings", help="cameras.json settings of the camera, JSON or a file with them")
+    parser.add_argument("--labels", help="JSON list of {start, end} person events in seconds")
+    parser.add_argument("--speed", type=float, default=1.0, help="Multiple of the file's frame rate, 0 = unpaced")
+    parser.add_argument("--loops", type=int, default=1)
+    parser.add_argument("--no-saving", action="store_true", help="Leave clip saving off")
+    parser.add_argument("--baseline", help="JSON file with baseline results")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--name", help="Baseline entry, default live:<video name>")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+    if not args.video and not args.synthetic:
+        parser.error("a video or --synthetic is needed")
+
+    labels = os.path.abspath(args.labels) if args.labels else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+    workdir = tempfile.mkdtemp(prefix="watchman_replay_")
+    video = os.path.abspath(args.video) if args.video else synthetic_video(
+        os.path.join(workdir, "synthetic.mp4"), args.synthetic)
+
+    # app.py reads its cameras, folders and weights at import, relative to the working directory
+    with open(os.path.join(workdir, "cameras.json"), "w") as f:
+        json.dump({CAMERA_ID: {**load_settings(args.settings), "source": video}}, f)
+    backend = os.environ.get("WATCHMAN_BACKEND", "pytorch")
+    os.environ.setdefault("WATCHMAN_WEIGHTS", os.path.join(API_DIR, default_weights(backend)))
+    os.environ["WATCHMAN_CAMERAS"] = os.path.join(workdir, "cameras.json")
+    os.environ["WATCHMAN_AUTOSTART"] = "0"
+    os.chdir(workdir)
+    import app
+
+    pipeline = app.cameras.get(CAMERA_ID)
+    replay = ReplayCapture(video, speed=args.speed, loops=args.loops, linger=2.0)
+    pipeline.cap = replay
+    pipeline.realtime = False  # The replay paces itself
+    pipeline.saving_enabled = not args.no_saving
+
+    # Per frame: capture to recorder latency and whether the pipeline saw a person
+    latencies, person_times = [], []
+    push = pipeline.recorder.push
+
+    def timed_push(captured_at, frame, event_active, persons=0, track_ids=None):
+        push(captured_at, frame, event_active, persons, track_ids)
+        latencies.append(time.monotonic() - captured_at)
+        if persons:
+            person_times.append(replay.video_time(captured_at))
+
+    pipeline.recorder.push = timed_push
+    app.model.warm_up()
+
+    usage = Usage().start()
+    app.scheduler.start()
+    pipeline.start()
+    while pipeline.running:
+        time.sleep(0.1)
+    pipeline.stop()  # Closes the open clip
+    while app.jobs.snapshot()["queue_depth"] or app.jobs.snapshot()["running"]:
+        time.sleep(0.1)  # Clip conversion and indexing
+    app.scheduler.stop()
+    measured = usage.stop()
+    measured["wall_s"] -= replay.linger
+
+    snapshot = pipeline.snapshot()
+    frames = snapshot["stages"]["record"]["processed"]
+    result = {
+        "video": os.path.basename(video),
+        "frames_read": replay.frames,
+        "camera_dropped": replay.dropped,
+        "frames": frames,
+        "fps": frames / measured["wall_s"] if measured["wall_s"] > 0 else None,
+        "inferred": snapshot["stages"]["inference"]["processed"],
+        **latency_stats(latencies),
+        **measured,
+        "clips": snapshot["recorder"]["clips"],
+        "footage_mb": sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, names in os.walk(pipeline.recorder.footage_dir) for name in names) / 1e6,
+        "recall": None,
+    }
+    if labels:
+        ranges = to_ranges(person_times, pipeline.recorder.merge_gap)
+        result["recall"], missed, false = event_recall(load_events(labels), ranges)
+        result["missed_events"] = len(missed)
+        result["false_events"] = len(false)
+    print_result(result)
+
+    if baseline:
+        name = args.name or f"live:{result['video']}"
+        return 1 if check_baseline(name, result, baseline, args.tolerance, args.save_baseline) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
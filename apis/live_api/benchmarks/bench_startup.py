@@ -0,0 +1,96 @@
+# Cold start of the API: spawn app.py and measure, from the spawn, when
+#   listening   - the first HTTP answer (routes up, model still loading)
+#   ready       - /api/v1/ready returns 200 (model warm)
+#   first frame - the first JPEG arrives on /api/v1/video (live_api only)
+# next to the milestones the app records itself (seconds since process start).
+#
+# python benchmarks/bench_startup.py [--runs 3]
+# python benchmarks/bench_startup.py --app ../video_api/app.py --port 5001 --no-frame
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def get(url, timeout=1.0):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def first_frame(url, timeout):
+    # Reads the multipart stream until the first part's JPEG start marker
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = b""
+        while b"\xff\xd8" not in data:
+            chunk = response.read1(4096)
+            if not chunk:
+                return False
+            data += chunk
+    return True
+
+
+def run_once(args):
+    app_path = os.path.abspath(args.app)
+    base = f"http://127.0.0.1:{args.port}"
+    spawned = time.monotonic()
+    proc = subprocess.Popen([sys.executable, app_path], cwd=os.path.dirname(app_path),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {}
+    try:
+        deadline = spawned + args.timeout
+        while time.monotonic() < deadline:
+            try:
+                status, body = get(f"{base}/api/v1/ready")
+            except (urllib.error.URLError, ConnectionError, OSError):
+                time.sleep(0.05)
+                continue
+            result.setdefault("listening_s", round(time.monotonic() - spawned, 3))
+            if status == 200:
+                result["ready_s"] = round(time.monotonic() - spawned, 3)
+                result["marks"] = json.loads(body)["startup"]
+                break
+            time.sleep(0.05)
+
+        if "ready_s" in result and args.frame:
+            if first_frame(f"{base}/api/v1/video", args.timeout):
+                result["first_frame_s"] = round(time.monotonic() - spawned, 3)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default=os.path.join(API_DIR, "app.py"))
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-frame", dest="frame", action="store_false",
+                        help="Skip the first frame, for video_api")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        result = run_once(args)
+        print(f"run {i + 1}: {json.dumps(result)}")
+        runs.append(result)
+
+    for key in ("listening_s", "ready_s", "first_frame_s"):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            print(f"{key:<15} median {statistics.median(values):.2f}s  max {max(values):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Replay recorded footage with and without the person tracker and compare
+# what each costs per frame:
+#   detect  - YOLO on every strided frame, a person is present when it finds one
+#   track   - YOLO only when the tracker asks for it (every --detect-interval
+#             seconds while persons are tracked), predicted boxes in between
+#
+# Besides CPU ms per frame and inference calls it counts how often the
+# "person present" state flips, each flip starts or stops a recording, and
+# the distinct track ids the tracker gave out.
+#
+# python benchmarks/bench_tracker.py corridor.mp4 [--vid-stride 2] [--detect-interval 0.5]
+import argparse
+import os
+import sys
+import time
+
+import cv2
+from ultralytics import YOLO
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.join(API_DIR, ".."))
+from pipeline import person_boxes  # noqa: E402
+from tracker import PersonTracker  # noqa: E402
+
+
+def read_frames(path, vid_stride, limit):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frames = []
+    index = 0
+    while len(frames) < limit:
+        success, frame = cap.read()
+        if not success:
+            break
+        index += 1
+        if index % vid_stride == 0:
+            frames.append((index / fps, frame))
+    cap.release()
+    return frames
+
+
+def run(model, frames, conf, tracker=None, high_conf=0.5):
+    calls = toggles = 0
+    present = False
+    track_ids = set()
+    tracker_time = 0.0
+    started = time.process_time()
+    for timestamp, frame in frames:
+        results = None
+        if tracker is None or tracker.needs_detection(timestamp):
+            results = model.predict(source=frame, imgsz=320, conf=conf, iou=0.45, device="cpu", verbose=False)[0]
+            calls += 1
+        if tracker is None:
+            _, scores = person_boxes(results, model.names)
+            found = any(score >= high_conf for score in scores)
+        else:
+            tracked = time.process_time()
+            if results is not None:
+                tracks = tracker.update(*person_boxes(results, model.names), timestamp)
+            else:
+                tracks = tracker.predict(timestamp)
+            tracker_time += time.process_time() - tracked
+            track_ids.update(track.id for track in tracks)
+            found = bool(tracks)
+        if found != present:
+            toggles += 1
+            present = found
+    cpu = time.process_time() - started
+    return {
+        "cpu_ms_per_frame": cpu / len(frames) * 1000,
+        "calls": calls,
+        "toggles": toggles,
+        "tracker_ms_per_frame": tracker_time / len(frames) * 1000,
+        "track_ids": len(track_ids),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--model", default=os.path.join(API_DIR, "watchman_v3.pt"))
+    parser.add_argument("--vid-stride", type=int, default=2)
+    parser.add_argument("--frames", type=int, default=3000, help="Strided frames to replay at most")
+    parser.add_argument("--detect-interval", type=float, default=0.5)
+    parser.add_argument("--max-age", type=float, default=1.5)
+    parser.add_argument("--min-hits", type=int, default=2)
+    parser.add_argument("--low-conf", type=float, default=0.1)
+    args = parser.parse_args()
+
+    model = YOLO(args.model)
+    frames = read_frames(args.video, args.vid_stride, args.frames)
+    if not frames:
+        print("no frames")
+        return 1
+    model.predict(source=frames[0][1], imgsz=320, device="cpu", verbose=False)  # Warm up
+
+    detect = run(model, frames, conf=0.5)
+    tracker = PersonTracker(min_hits=args.min_hits, max_age=args.max_age, detect_interval=args.detect_interval)
+    track = run(model, frames, conf=args.low_conf, tracker=tracker)
+
+    print(f"frames replayed      {len(frames)} (every {args.vid_stride}. frame)")
+    print(f"{'':<21}{'detect':>10}{'track':>10}")
+    print(f"{'cpu ms/frame':<21}{detect['cpu_ms_per_frame']:>10.1f}{track['cpu_ms_per_frame']:>10.1f}")
+    print(f"{'inference calls':<21}{detect['calls']:>10}{track['calls']:>10}")
+    print(f"{'recording toggles':<21}{detect['toggles']:>10}{track['toggles']:>10}")
+    print(f"tracker cost         {track['tracker_ms_per_frame']:.3f} ms/frame")
+    print(f"confirmed track ids  {track['track_ids']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# Compare disk bytes and CPU per recorded minute of the two clip writers:
+#   avi   - MJPG AVI via cv2.VideoWriter, then ffmpeg re-encode to MP4 (old flow)
+#   pipe  - raw frames piped into ffmpeg writing fragmented H.264 MP4
+#
+# python benchmarks/bench_writers.py [--input sample.mp4] [--seconds 60]
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.join(API_DIR, ".."))
+from writers import AviWriter, FFmpegPipeWriter, convert_to_mp4, ffmpeg_available  # noqa: E402
+
+
+# Frames from a sample video (looped) or a synthetic scene with a moving box
+def frame_source(path, count, size):
+    if path:
+        cap = cv2.VideoCapture(path)
+        produced = 0
+        while produced < count:
+            success, frame = cap.read()
+            if not success:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                continue
+            yield cv2.resize(frame, size)
+            produced += 1
+        cap.release()
+        return
+
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+    for i in range(count):
+        frame = background.copy()
+        x = (i * 7) % (width - 80)
+        cv2.rectangle(frame, (x, 150), (x + 80, 330), (40, 160, 220), -1)
+        cv2.putText(frame, str(i), (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        yield frame
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def self_cpu():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(name, frames, write_clip):
+    cpu_before = self_cpu() + children_cpu()
+    started = time.monotonic()
+    bytes_written = write_clip(frames)
+    wall = time.monotonic() - started
+    cpu = self_cpu() + children_cpu() - cpu_before
+    return {"writer": name, "bytes": bytes_written, "wall": wall, "cpu": cpu}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", help="Video file to replay, synthetic frames if omitted")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--fps", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if not ffmpeg_available():
+        print("[ERROR] ffmpeg is required for this benchmark")
+        return 1
+
+    size = (640, 480)
+    count = int(args.seconds * args.fps)
+    frames = list(frame_source(args.input, count, size))
+    workdir = tempfile.mkdtemp(prefix="watchman_writers_")
+
+    def avi_flow(frames):
+        avi_path = os.path.join(workdir, "clip.avi")
+        mp4_path = os.path.join(workdir, "clip_avi.mp4")
+        writer = AviWriter(avi_path, args.fps, size)
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        avi_bytes = os.path.getsize(avi_path)
+        convert_to_mp4(avi_path, mp4_path)
+        # The AVI is written (and read back) before the MP4 is written
+        return avi_bytes + os.path.getsize(mp4_path)
+
+    def pipe_flow(frames):
+        mp4_path = os.path.join(workdir, "clip_pipe.mp4")
+        writer = FFmpegPipeWriter(mp4_path, args.fps, size)
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        return os.path.getsize(mp4_path)
+
+    minutes = args.seconds / 60.0
+    print(f"{'writer':<8}{'MB/min':>10}{'wall s':>10}{'cpu s':>10}")
+    for result in (run("avi", frames, avi_flow), run("pipe", frames, pipe_flow)):
+        print(f"{result['writer']:<8}"
+              f"{result['bytes'] / minutes / 1e6:>10.2f}"
+              f"{result['wall']:>10.2f}"
+              f"{result['cpu']:>10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# Replay recorded footage with and without zones and compare latency and
+# recall of the person detector:
+#   full   - the whole frame resized to imgsz, persons outside the zones dropped afterwards
+#   roi    - only the bounding crop of the zones
+#   tiles  - the crop and its overlapping tiles (--tile-size source pixels)
+#
+# A strided frame counts as a person frame when a mode finds a person whose
+# feet are inside a zone. Ground truth is a labels file ([{"start": s,
+# "end": s}, ...] in seconds) or, without one, the frames any mode found a
+# person in, so recall compares the modes with each other.
+#
+# python benchmarks/bench_zones.py yard_1080p.mp4 --zones '[[[0.05, 0.45], [0.6, 0.4], [0.95, 0.95], [0.05, 0.95]]]'
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+from ultralytics import YOLO
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(API_DIR, ".."))
+from common.zones import ZoneMask, as_array  # noqa: E402
+
+PREDICT = {"classes": [0], "imgsz": 320, "conf": 0.5, "iou": 0.45, "device": "cpu", "verbose": False}
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--zones", required=True, help="JSON polygons in fractions of the frame, or a file with them")
+    parser.add_argument("--labels", help="JSON list of {start, end} person events in seconds")
+    parser.add_argument("--model", default=os.path.join(API_DIR, "watchman_v3.pt"))
+    parser.add_argument("--vid-stride", type=int, default=5)
+    parser.add_argument("--frames", type=int, default=1000, help="Strided frames to replay at most")
+    parser.add_argument("--tile-size", type=int, default=640)
+    args = parser.parse_args()
+
+    if os.path.exists(args.zones):
+        with open(args.zones) as f:
+            polygons = json.load(f)
+    else:
+        polygons = json.loads(args.zones)
+    roi = ZoneMask(polygons)
+    modes = {"full": None, "roi": roi, "tiles": ZoneMask(polygons, tile_size=args.tile_size)}
+
+    model = YOLO(args.model)
+    cap = cv2.VideoCapture(args.video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    latencies = {name: [] for name in modes}
+    found = {name: set() for name in modes}
+    images = {name: 0 for name in modes}
+    index = frames = 0
+    while frames < args.frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        index += 1
+        if index % args.vid_stride:
+            continue
+        if frames == 0:
+            model.predict(source=frame, **PREDICT)  # Warm up
+        frames += 1
+        timestamp = index / fps
+
+        for name, zones in modes.items():
+            crops = zones.crops(frame) if zones else [frame]
+            started = time.perf_counter()
+            results = model.predict(source=crops, **PREDICT)
+            if zones:
+                boxes = zones.merge(frame, results, model.names).boxes.xyxy
+            else:
+                boxes = as_array(results[0].boxes.xyxy).reshape(-1, 4)
+            latencies[name].append(time.perf_counter() - started)
+            images[name] += len(crops)
+            # The whole frame's detections get the zone filter here, outside the timing
+            if roi.inside(frame, boxes).any():
+                found[name].add(timestamp)
+    cap.release()
+    if not frames:
+        print("no frames")
+        return 1
+
+    if args.labels:
+        with open(args.labels) as f:
+            events = json.load(f)
+        sampled = [(i + 1) * args.vid_stride / fps for i in range(frames)]
+        truth = {t for t in sampled if any(e["start"] <= t <= e["end"] for e in events)}
+    else:
+        truth = set().union(*found.values())
+
+    height, width = frame.shape[:2]
+    print(f"frames replayed      {frames} ({width}x{height}, every {args.vid_stride}. frame)")
+    print(f"person frames        {len(truth)}")
+    print(f"{'mode':<8}{'images':>8}{'p50 ms':>10}{'p99 ms':>10}{'found':>8}{'recall':>9}{'false':>7}")
+    for name in modes:
+        p50 = statistics.median(latencies[name]) * 1000
+        p99 = percentile(latencies[name], 0.99) * 1000
+        hits = len(found[name] & truth)
+        recall = f"{hits / len(truth):.1%}" if truth else "-"
+        print(f"{name:<8}{images[name] / frames:>8.1f}{p50:>10.1f}{p99:>10.1f}{len(found[name]):>8}{recall:>9}"
+              f"{len(found[name] - truth):>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
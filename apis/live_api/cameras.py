@@ -0,0 +1,79 @@
+import json
+import os
+import threading
+
+import cv2
+
+# Used when no camera config file exists: the local webcam only
+DEFAULT_CAMERAS = {"0": {"source": 0}}
+
+
+# Read {camera_id: {"source": ..., ...}} from a JSON file
+def load_camera_config(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return DEFAULT_CAMERAS
+
+
+# Webcam index, network stream (RTSP/HTTP MJPEG) or video file
+def source_kind(source):
+    if isinstance(source, int) or str(source).isdigit():
+        return "webcam"
+    if "://" in str(source):
+        return "stream"
+    return "file"
+
+
+def open_capture(source, width=640, height=480):
+    kind = source_kind(source)
+    if kind == "webcam":
+        cap = cv2.VideoCapture(int(source))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    else:
+        cap = cv2.VideoCapture(source)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep the driver queue short, capture thread drains it
+    return cap
+
+
+class CameraRegistry:
+    """Camera id -> CameraPipeline, in configuration order."""
+
+    def __init__(self):
+        self._cameras = {}
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def add(self, camera_id, pipeline, source):
+        with self._lock:
+            self._cameras[camera_id] = pipeline
+            self._sources[camera_id] = source
+
+    def get(self, camera_id):
+        return self._cameras.get(camera_id)
+
+    def default_id(self):
+        return next(iter(self._cameras), None)
+
+    def items(self):
+        with self._lock:
+            return list(self._cameras.items())
+
+    def start_all(self):
+        for _, pipeline in self.items():
+            pipeline.start()
+
+    def stop_all(self):
+        for _, pipeline in self.items():
+            pipeline.stop()
+
+    def snapshot(self):
+        return {
+            camera_id: {
+                "source": str(self._sources[camera_id]),
+                "kind": source_kind(self._sources[camera_id]),
+                **pipeline.snapshot(),
+            }
+            for camera_id, pipeline in self.items()
+        }
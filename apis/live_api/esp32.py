@@ -1,83 +1,172 @@
-from flask import Flask, Response
+from flask import Flask, Response, jsonify, request
 import cv2
 from ultralytics import YOLO
 import datetime
 import os
+import sys
+import threading
+
+# Modules shared with video_api live in apis/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from common.zones import ZoneMask
+from hub import FrameHub
+from ingest import CameraSource
+from motion import MotionGate
 
 app = Flask(__name__)
 ESP32_STREAM_URL = 'http://192.168.1.2:80'  # Replace with your ESP32 IP
+ESP32_INGEST_MODE = "mjpeg"  # Parse the ESP32's MJPEG directly, "opencv" reads it through FFmpeg
 model = YOLO('yolov8n.pt')
 
+# Only detect inside these polygons (fractions of the frame), e.g. [[[0.1, 0.4], [0.9, 0.4], [0.9, 1.0], [0.1, 1.0]]]
+ESP32_ZONES = None
+zones = ZoneMask(ESP32_ZONES) if ESP32_ZONES else None
+
+# Stream profiles, picked with ?profile= (and ?fps= to lower max_fps) as on the main API
+ESP32_STREAM_PROFILES = {
+    "full": {"width": None, "quality": 80, "max_fps": None},
+    "medium": {"width": 480, "quality": 70, "max_fps": 10},
+    "low": {"width": 320, "quality": 50, "max_fps": 5},
+}
+
+# One connection to the ESP32 for every viewer, reconnected when it drops
+source = CameraSource(ESP32_STREAM_URL, mode=ESP32_INGEST_MODE)
+live_hub = FrameHub(ESP32_STREAM_PROFILES)
+detect_hub = FrameHub(ESP32_STREAM_PROFILES)
+_feed_lock = threading.Lock()
+_feed_thread = None
+_detect_thread = None
+
 output_dir = "footages"
 os.makedirs(output_dir, exist_ok=True)
 
 saving = False
 writer = None
 
-# --- Raw Live Stream (no detection) ---
-def raw_stream():
-    cap = cv2.VideoCapture(ESP32_STREAM_URL)
+# Profile name and client frame rate of a stream request, or an error response
+def stream_options():
+    profile = request.args.get("profile", "full")
+    if profile not in ESP32_STREAM_PROFILES:
+        return None, (jsonify({"error": f"Unknown profile, expected one of {sorted(ESP32_STREAM_PROFILES)}"}), 400)
+    max_fps = request.args.get("fps", type=float)
+    if "fps" in request.args and not (max_fps and max_fps > 0):
+        return None, (jsonify({"error": "fps must be a positive number"}), 400)
+    return (profile, max_fps), None
+
+# Feed the raw frames to the live hub, started by the first viewer
+def feed_live_hub():
+    reader = source.reader()
     while True:
-        success, frame = cap.read()
+        success, frame = reader.read()
         if not success:
+            live_hub.close()
             break
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+        live_hub.publish(frame)
+
+def start_live_feed():
+    global _feed_thread
+    with _feed_lock:
+        if _feed_thread is None:
+            _feed_thread = threading.Thread(target=feed_live_hub, daemon=True)
+            _feed_thread.start()
+
+# --- Raw Live Stream (no detection) ---
+# Viewers of a profile share its encode of each frame
+def raw_stream(profile, max_fps):
+    start_live_feed()
+    yield from live_hub.subscribe(profile, max_fps)
 
 @app.route('/live')
 def live():
-    return Response(raw_stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    options, error = stream_options()
+    if error:
+        return error
+    return Response(raw_stream(*options), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
 # --- Detection Stream with YOLOv8n ---
-def detect_stream():
+# One detection loop for every viewer: it infers and records each frame once
+# and publishes the annotated frames to the detect hub, started by the first viewer
+def detect_frames():
     global saving, writer
 
-    cap = cv2.VideoCapture(ESP32_STREAM_URL)
-
-    while True:
-        success, frame = cap.read()
-        if not success:
-            break
-
-        results = model(frame, stream=True)
-        person_detected = any(
-            model.names[int(cls)] == "person"
-            for r in results for cls in r.boxes.cls
-        )
-
-        annotated_frame = results[0].plot()
-
-        if person_detected and not saving:
-            saving = True
-            filename = datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + ".avi"
-            filepath = os.path.join(output_dir, filename)
-            fourcc = cv2.VideoWriter_fourcc(*'XVID')
-            writer = cv2.VideoWriter(filepath, fourcc, 10.0, (frame.shape[1], frame.shape[0]))
-            print(f"[INFO] Started recording: {filename}")
-
-        if not person_detected and saving:
-            saving = False
+    reader = source.reader()
+    gate = MotionGate()  # Skip YOLO while the scene is static
+    person_detected = False
+
+    try:
+        while True:
+            success, frame = reader.read()
+            if not success:
+                detect_hub.close()
+                break
+
+            # Gated frames keep the last detection state so recording is not cut short
+            annotated_frame = frame
+            if gate.check(zones.region(frame) if zones else frame):
+                # With zones only their crop is inferred and persons outside are dropped
+                result = zones.predict(model, frame, verbose=False) if zones else model(frame, verbose=False)[0]
+                person_detected = any(model.names[int(cls)] == "person" for cls in result.boxes.cls)
+                annotated_frame = result.plot()
+                if person_detected:
+                    gate.hold()
+
+            if person_detected and not saving:
+                saving = True
+                filename = datetime.datetime.now().strftime("%Y%m%d_%H%M%S") + ".avi"
+                filepath = os.path.join(output_dir, filename)
+                fourcc = cv2.VideoWriter_fourcc(*'XVID')
+                writer = cv2.VideoWriter(filepath, fourcc, 10.0, (frame.shape[1], frame.shape[0]))
+                print(f"[INFO] Started recording: {filename}")
+
+            if not person_detected and saving:
+                saving = False
+                writer.release()
+                writer = None
+                print("[INFO] Stopped recording")
+
+            if saving and writer is not None:
+                writer.write(frame)
+
+            detect_hub.publish(annotated_frame)
+    finally:
+        reader.release()
+        if writer is not None:
             writer.release()
             writer = None
-            print("[INFO] Stopped recording")
+            saving = False
 
-        if saving and writer is not None:
-            writer.write(frame)
+def start_detection():
+    global _detect_thread
+    with _feed_lock:
+        if _detect_thread is None:
+            _detect_thread = threading.Thread(target=detect_frames, daemon=True)
+            _detect_thread.start()
 
-        _, buffer = cv2.imencode('.jpg', annotated_frame)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+# Viewers of a profile share its encode of each annotated frame
+def detect_stream(profile, max_fps):
+    start_detection()
+    yield from detect_hub.subscribe(profile, max_fps)
 
 @app.route('/detect')
 def detect():
-    return Response(detect_stream(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    options, error = stream_options()
+    if error:
+        return error
+    return Response(detect_stream(*options), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+# Connection state, reconnects and frame counts of the ESP32 stream and both hubs
+@app.route('/stats')
+def stats():
+    return jsonify({"source": source.snapshot(), "live": live_hub.snapshot(), "detect": detect_hub.snapshot()})
 
 
 @app.route('/')
 def index():
-    return 'Endpoints: /live (raw stream), /detect (YOLO detection stream)'
+    return ('Endpoints: /live (raw stream), /detect (YOLO detection stream), both take ?profile=full|medium|low&fps=N; '
+            '/stats (ingest stats)')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,289 @@
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from common.metrics import FFMPEG_SECONDS
+from recorder import CLIP_NAME_FORMAT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    camera TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    peak_persons INTEGER,
+    thumbnail TEXT,
+    compacted INTEGER NOT NULL DEFAULT 0,
+    unique_persons INTEGER,
+    max_dwell REAL,
+    PRIMARY KEY (camera, filename)
+);
+CREATE INDEX IF NOT EXISTS clips_camera_started ON clips (camera, started_at);
+CREATE INDEX IF NOT EXISTS clips_started ON clips (started_at);
+CREATE INDEX IF NOT EXISTS clips_duration ON clips (duration);
+"""
+
+# Columns added after the first release, created on older index files
+ADDED_COLUMNS = {
+    "compacted": "INTEGER NOT NULL DEFAULT 0",
+    "unique_persons": "INTEGER",
+    "max_dwell": "REAL",
+}
+
+# Sort orders of the clip list, newest first by default
+SORT_ORDERS = {
+    "newest": "started_at DESC",
+    "oldest": "started_at ASC",
+    "longest": "duration DESC, started_at DESC",
+    "largest": "size DESC, started_at DESC",
+    "persons": "peak_persons DESC, started_at DESC",
+    "dwell": "max_dwell DESC, started_at DESC",
+}
+
+THUMBNAIL_DIR = ".thumbs"  # Inside each camera's footage directory
+
+
+def probe_duration(path):
+    """Container duration in seconds, 0.0 when ffprobe cannot read it"""
+    try:
+        with FFMPEG_SECONDS.labels("probe").time():
+            out = subprocess.run([
+                "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path
+            ], check=True, capture_output=True, text=True).stdout
+        return float(out.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return 0.0
+
+
+def thumbnail_path(clip_path):
+    directory, filename = os.path.split(clip_path)
+    return os.path.join(directory, THUMBNAIL_DIR, os.path.splitext(filename)[0] + ".jpg")
+
+
+def write_thumbnail(jpeg, path, width):
+    """Downscale a JPEG frame of the clip (the one with the most persons) to width pixels"""
+    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        return False
+    height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return cv2.imwrite(path, cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+
+
+def extract_thumbnail(clip_path, path, at, width, preexec_fn=None):
+    """Thumbnail of a clip without a recorded one (indexed by a scan), decoded at `at` seconds"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with FFMPEG_SECONDS.labels("thumbnail").time():
+        result = subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error", "-ss", f"{at:.3f}", "-i", clip_path,
+            "-frames:v", "1", "-vf", f"scale={width}:-2", path
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=preexec_fn)
+    return result.returncode == 0 and os.path.exists(path)
+
+
+def clip_start_time(filename, fallback):
+    # Recorder clips are named after the wall clock time of their first frame
+    try:
+        return datetime.strptime(os.path.splitext(filename)[0], CLIP_NAME_FORMAT).timestamp()
+    except ValueError:
+        return fallback
+
+
+class FootageIndex:
+    """Metadata of every stored clip in a SQLite file, so listing never walks the footage folders.
+
+    Clips are added when the recorder closes them (with their peak person
+    count, a thumbnail and, on cameras with tracking, the distinct persons
+    and their longest dwell time); a background scan adds clips it finds on disk
+    that are missing or changed and drops rows of deleted files. Connections
+    are per thread and the database runs in WAL mode, like the video_api
+    job store.
+    """
+
+    def __init__(self, path, busy_timeout=10.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.scan_state = {"running": False, "scanned": [], "added": 0, "removed": 0, "finished_at": None}
+        self._scanned = set()
+        self._scan_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(clips)")}
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE clips ADD COLUMN {column} {definition}")
+            self._local.conn = conn
+        return conn
+
+    def add(self, camera, filename, started_at, ended_at, size, mtime, peak_persons=None, thumbnail=None,
+            unique_persons=None, max_dwell=None):
+        # A rescan of a changed file keeps what only the recorder knows
+        self._conn().execute(
+            "INSERT INTO clips (camera, filename, started_at, ended_at, duration, size, mtime, peak_persons, "
+            "thumbnail, unique_persons, max_dwell) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(camera, filename) DO UPDATE SET "
+            "started_at = excluded.started_at, ended_at = excluded.ended_at, duration = excluded.duration, "
+            "size = excluded.size, mtime = excluded.mtime, "
+            "peak_persons = COALESCE(excluded.peak_persons, clips.peak_persons), "
+            "thumbnail = COALESCE(excluded.thumbnail, clips.thumbnail), "
+            "unique_persons = COALESCE(excluded.unique_persons, clips.unique_persons), "
+            "max_dwell = COALESCE(excluded.max_dwell, clips.max_dwell)",
+            (camera, filename, started_at, ended_at, max(0.0, ended_at - started_at), size, mtime,
+             peak_persons, thumbnail, unique_persons, max_dwell),
+        )
+
+    def add_clip(self, camera, clip_path, info, thumbnail_width=320):
+        """Index a clip the recorder just closed, info as passed to its on_clip_closed callback"""
+        stat = os.stat(clip_path)
+        thumbnail = None
+        if info.get("thumbnail"):
+            thumbnail = thumbnail_path(clip_path)
+            if not write_thumbnail(info["thumbnail"], thumbnail, thumbnail_width):
+                thumbnail = None
+        self.add(camera, os.path.basename(clip_path), info["started_at"], info["ended_at"], stat.st_size,
+                 stat.st_mtime, info.get("peak_persons"), thumbnail, info.get("unique_persons"),
+                 info.get("max_dwell"))
+
+    def set_thumbnail(self, camera, filename, thumbnail):
+        self._conn().execute(
+            "UPDATE clips SET thumbnail = ? WHERE camera = ? AND filename = ?", (thumbnail, camera, filename)
+        )
+
+    def remove(self, camera, filename):
+        self._conn().execute("DELETE FROM clips WHERE camera = ? AND filename = ?", (camera, filename))
+
+    def get(self, camera, filename):
+        row = self._conn().execute(
+            "SELECT * FROM clips WHERE camera = ? AND filename = ?", (camera, filename)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def query(self, camera=None, since=None, until=None, sort="newest", limit=50, offset=0):
+        """One page of clips overlapping [since, until] (unix seconds), returns (clips, total)"""
+        conn = self._conn()
+        where, args = [], []
+        if camera is not None:
+            where.append("camera = ?")
+            args.append(camera)
+        if since is not None:
+            # No clip is longer than the longest one, which bounds the started_at range the index scans
+            longest = conn.execute("SELECT MAX(duration) FROM clips").fetchone()[0] or 0.0
+            where.append("started_at >= ? AND ended_at >= ?")
+            args += [since - longest, since]
+        if until is not None:
+            where.append("started_at <= ?")
+            args.append(until)
+        condition = f" WHERE {' AND '.join(where)}" if where else ""
+
+        total = conn.execute(f"SELECT COUNT(*) FROM clips{condition}", args).fetchone()[0]
+        page = "" if limit is None else " LIMIT ? OFFSET ?"
+        rows = conn.execute(
+            f"SELECT * FROM clips{condition} ORDER BY {SORT_ORDERS[sort]}{page}",
+            args + ([] if limit is None else [limit, offset]),
+        ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def usage(self):
+        """{camera: (clips, bytes)}"""
+        rows = self._conn().execute("SELECT camera, COUNT(*), SUM(size) FROM clips GROUP BY camera")
+        return {row[0]: (row[1], row[2] or 0) for row in rows}
+
+    def uncompacted(self, camera, before, limit):
+        """Oldest clips of a camera that ended before `before` and were not re-encoded yet"""
+        rows = self._conn().execute(
+            "SELECT * FROM clips WHERE camera = ? AND compacted = 0 AND ended_at < ? ORDER BY started_at LIMIT ?",
+            (camera, before, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def mark_compacted(self, camera, filename, size, mtime):
+        self._conn().execute(
+            "UPDATE clips SET compacted = 1, size = ?, mtime = ? WHERE camera = ? AND filename = ?",
+            (size, mtime, camera, filename),
+        )
+
+    def files(self, camera):
+        rows = self._conn().execute("SELECT filename, size, mtime FROM clips WHERE camera = ?", (camera,))
+        return {row["filename"]: (row["size"], row["mtime"]) for row in rows}
+
+    def scanned(self, camera):
+        """True once this process has synced the camera with the disk, the index is complete from then on"""
+        return camera in self._scanned
+
+    def scan(self, camera, footage_dir, skip=None):
+        """Sync one camera with its folder: index new or changed MP4s, drop rows of deleted files.
+
+        skip(path) excludes files, e.g. the clip being recorded. Returns (added, removed).
+        """
+        known = self.files(camera)
+        on_disk = {}
+        if os.path.isdir(footage_dir):
+            with os.scandir(footage_dir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".mp4") and entry.is_file():
+                        on_disk[entry.name] = entry.stat()
+
+        added = 0
+        for filename, stat in on_disk.items():
+            path = os.path.join(footage_dir, filename)
+            if known.get(filename) == (stat.st_size, stat.st_mtime) or (skip and skip(path)):
+                continue
+            duration = probe_duration(path)
+            started_at = clip_start_time(filename, stat.st_mtime - duration)
+            self.add(camera, filename, started_at, started_at + duration, stat.st_size, stat.st_mtime)
+            added += 1
+
+        removed = 0
+        for filename in known.keys() - on_disk.keys():
+            self.remove(camera, filename)
+            removed += 1
+        self._scanned.add(camera)
+        return added, removed
+
+    def rebuild_in_background(self, footage_dirs, skip=None):
+        """Scan {camera: footage_dir} in a daemon thread; False when a scan is already running"""
+        with self._scan_lock:
+            if self.scan_state["running"]:
+                return False
+            self.scan_state = {"running": True, "scanned": [], "added": 0, "removed": 0, "finished_at": None}
+
+        def run():
+            try:
+                for camera, footage_dir in footage_dirs.items():
+                    added, removed = self.scan(camera, footage_dir, skip)
+                    self.scan_state["added"] += added
+                    self.scan_state["removed"] += removed
+                    self.scan_state["scanned"].append(camera)
+                print(f"[INFO] Footage index: {self.scan_state['added']} clips added, "
+                      f"{self.scan_state['removed']} removed")
+            except Exception as e:
+                print(f"[ERROR] Footage index scan failed: {e}")
+            finally:
+                self.scan_state["running"] = False
+                self.scan_state["finished_at"] = time.time()
+
+        threading.Thread(target=run, name="footage-scan", daemon=True).start()
+        return True
+
+    def snapshot(self):
+        return {
+            "clips": self._conn().execute("SELECT COUNT(*) FROM clips").fetchone()[0],
+            "scan": dict(self.scan_state, scanned=list(self.scan_state["scanned"])),
+        }
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import cv2
+
+PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+
+# The full frame at the encoder's usual quality, for hubs built without profiles
+DEFAULT_PROFILES = {"full": {"width": None, "quality": 80, "max_fps": None}}
+
+
+# One multipart part: the frame scaled down to width (aspect kept) and JPEG-encoded
+def encode_part(frame, width=None, quality=80):
+    if width and frame.shape[1] > width:
+        height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        return None
+    # The encoder's buffer is copied once, straight into the part
+    return b"".join((PART_HEADER, str(len(buffer)).encode(), b"\r\n\r\n", buffer.data, b"\r\n"))
+
+
+class StreamChannel:
+    """The newest part of one stream profile, encoded at most once per frame.
+
+    The first subscriber of the profile to reach a new frame encodes it,
+    the others wait on the lock and reuse the part.
+    """
+
+    def __init__(self, width=None, quality=80, timing=None):
+        self.width = width
+        self.quality = quality
+        self.timing = timing
+        self.subscribers = 0
+        self.encoded = 0
+        self._seq = 0
+        self._part = None
+        self._lock = threading.Lock()
+
+    def part(self, seq, frame):
+        with self._lock:
+            if self._seq < seq:
+                started = time.perf_counter()
+                part = encode_part(frame, self.width, self.quality)
+                if part is None:
+                    return None
+                if self.timing is not None:
+                    self.timing.observe(time.perf_counter() - started)
+                self._seq, self._part = seq, part
+                self.encoded += 1
+            return self._part  # A slower subscriber gets the newer frame
+
+
+class FrameHub:
+    """Broadcasts the latest annotated frame of one camera to any number of viewers.
+
+    The detection loop publishes each raw frame once, which costs nothing.
+    Viewers pick a profile (width, JPEG quality, max fps) and the frame is
+    encoded for a profile only when one of its viewers reaches it, once for
+    all of them, so a camera nobody watches encodes nothing. Every
+    subscriber keeps its own cursor into the hub and always jumps to the
+    newest frame, so a slow or rate-limited client skips frames instead of
+    building up a backlog and never costs extra inference or encoding work.
+    """
+
+    def __init__(self, profiles=None, encode_timing=None):
+        self.profiles = profiles or DEFAULT_PROFILES
+        self.channels = {name: StreamChannel(profile.get("width"), profile.get("quality", 80), encode_timing)
+                         for name, profile in self.profiles.items()}
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self.subscribers = 0
+        self.published = 0
+        self.skipped = 0
+        self.closed = False
+
+    def publish(self, frame):
+        """Hand over an annotated frame; it must not be modified afterwards."""
+        with self._cond:
+            self._frame = frame
+            self._seq += 1
+            self.published += 1
+            self._cond.notify_all()
+
+    def subscribe(self, profile, max_fps=None, timeout=1.0):
+        """Yield multipart parts of the profile until the hub is closed or the client leaves.
+
+        max_fps (the client's) can only lower the profile's own limit.
+        """
+        channel = self.channels[profile]
+        limits = [fps for fps in (self.profiles[profile].get("max_fps"), max_fps) if fps]
+        interval = 1.0 / min(limits) if limits else 0.0
+        with self._cond:
+            self.subscribers += 1
+            channel.subscribers += 1
+        last_seq = 0
+        next_due = 0.0
+        try:
+            while True:
+                wait = next_due - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq != last_seq or self.closed, timeout)
+                    if self.closed:
+                        return
+                    if self._seq == last_seq:
+                        continue
+                    if last_seq:
+                        self.skipped += self._seq - last_seq - 1
+                    last_seq, frame = self._seq, self._frame
+                part = channel.part(last_seq, frame)
+                if part is None:
+                    continue
+                next_due = time.monotonic() + interval
+                yield part
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+                channel.subscribers -= 1
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "subscribers": self.subscribers,
+                "published": self.published,
+                "skipped": self.skipped,
+                "profiles": {name: {"subscribers": channel.subscribers, "encoded": channel.encoded}
+                             for name, channel in self.channels.items()},
+            }
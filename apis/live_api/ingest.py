@@ -0,0 +1,341 @@
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit
+
+import cv2
+import numpy as np
+
+from common.metrics import REGISTRY
+
+# Per source: decode time of a frame (cv2.imdecode of an MJPEG part, or the
+# retrieve() of an OpenCV capture) and the age of a frame when a consumer
+# takes it, which is what buffering adds to the camera's own latency
+DECODE_SECONDS = REGISTRY.histogram("watchman_ingest_decode_seconds", "Decode time of one camera frame", ("source",))
+FRAME_AGE = REGISTRY.histogram("watchman_ingest_frame_age_seconds", "Decoded to taken by a consumer", ("source",))
+
+# Demuxer flags of OpenCV's FFmpeg backend for low latency sources, unless OPENCV_FFMPEG_CAPTURE_OPTIONS is set
+FFMPEG_LOW_LATENCY_OPTIONS = "fflags;nobuffer|flags;low_delay"
+MJPEG_CHUNK = 64 * 1024
+MJPEG_MAX_PART = 8 * 1024 * 1024  # A part bigger than this is garbage, reconnect
+
+_open_lock = threading.Lock()
+
+
+# Source URL without credentials, for logs and metric labels
+def display_name(url):
+    parts = urlsplit(str(url))
+    if not parts.netloc or "@" not in parts.netloc:
+        return str(url)
+    return urlunsplit(parts._replace(netloc=parts.netloc.rsplit("@", 1)[1]))
+
+
+class MjpegParser:
+    """Splits a multipart/x-mixed-replace byte stream into the bytes of its parts.
+
+    Uses a part's Content-Length when it has one and the next boundary
+    otherwise; anything before the first boundary is skipped.
+    """
+
+    def __init__(self, boundary):
+        self.delimiter = b"--" + boundary.lstrip("-").encode()
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """The parts completed by data, in order"""
+        buffer = self._buffer
+        buffer += data
+        parts = []
+        while True:
+            start = buffer.find(self.delimiter)
+            if start < 0:
+                # Keep what could be the start of a delimiter
+                del buffer[:max(0, len(buffer) - len(self.delimiter))]
+                break
+            del buffer[:start]
+            headers_end = buffer.find(b"\r\n\r\n")
+            if headers_end < 0:
+                break
+            body_start = headers_end + 4
+            length = None
+            for line in bytes(buffer[len(self.delimiter):headers_end]).split(b"\r\n"):
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length" and value.strip().isdigit():
+                    length = int(value)
+            if length is not None:
+                if len(buffer) < body_start + length:
+                    break
+                parts.append(bytes(buffer[body_start:body_start + length]))
+                del buffer[:body_start + length]
+            else:
+                end = buffer.find(self.delimiter, body_start)
+                if end < 0:
+                    break
+                parts.append(bytes(buffer[body_start:end]).rstrip(b"\r\n"))  # A JPEG ends with FF D9
+                del buffer[:end]
+        if len(buffer) > MJPEG_MAX_PART:
+            raise IOError("MJPEG part too large")
+        return parts
+
+
+class CameraSource:
+    """One connection to a network camera, shared by every consumer of it.
+
+    A daemon thread reads the source and keeps the decoded frames in a
+    small buffer; consumers get their own SourceReader with the
+    cv2.VideoCapture read() interface. With ``low_latency`` the buffer
+    holds only the newest frame, so a consumer always gets the latest one
+    and with ``mode`` "mjpeg" only the newest JPEG of what arrived is even
+    decoded; otherwise up to ``buffer_frames`` are kept in order.
+
+    ``mode`` "opencv" reads through cv2.VideoCapture (RTSP, HTTP, anything
+    FFmpeg opens, with ``hw_decode`` asking it for hardware decoding);
+    "mjpeg" reads an HTTP multipart MJPEG stream (e.g. an ESP32-CAM)
+    directly and decodes its JPEGs with cv2.imdecode, without the
+    FFmpeg demuxer. A failed open or read, or no frame for
+    ``stall_timeout`` seconds, reconnects after a delay that doubles from
+    ``reconnect_min`` up to ``reconnect_max`` and resets once frames flow.
+    """
+
+    def __init__(self, url, mode="opencv", low_latency=True, buffer_frames=30, hw_decode=False,
+                 reconnect_min=0.5, reconnect_max=30.0, stall_timeout=10.0):
+        if mode not in ("opencv", "mjpeg"):
+            raise ValueError(f"Unknown ingest mode: {mode}")
+        self.url = url
+        self.name = display_name(url)
+        self.mode = mode
+        self.low_latency = low_latency
+        self.hw_decode = hw_decode
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.stall_timeout = stall_timeout
+        self.decode_timing = DECODE_SECONDS.labels(self.name)
+        self.age_timing = FRAME_AGE.labels(self.name)
+
+        self.connected = False
+        self.frames = 0  # Decoded
+        self.skipped = 0  # Received but never decoded, newer ones had arrived
+        self.reconnects = 0
+        self.errors = 0
+        self.last_error = None
+        self.readers = 0
+        self.closed = False
+        self._frames = deque(maxlen=1 if low_latency else buffer_frames)  # (seq, decoded at, frame)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"ingest {self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def reader(self):
+        return SourceReader(self.start())
+
+    def _run(self):
+        delay = self.reconnect_min
+        while not self._stop.is_set():
+            frames_before = self.frames
+            try:
+                if self.mode == "mjpeg":
+                    self._read_mjpeg()
+                else:
+                    self._read_opencv()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print(f"[ERROR] Source {self.name}: {e}")
+            self.connected = False
+            # Back off while the source stays down, retry quickly after it dropped a working connection
+            if self.frames > frames_before:
+                delay = self.reconnect_min
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.reconnect_max)
+            self.reconnects += 1
+            print(f"[INFO] Reconnecting to {self.name}")
+
+    def _publish(self, frame):
+        with self._cond:
+            self._seq += 1
+            self.frames += 1
+            self._frames.append((self._seq, time.monotonic(), frame))
+            self._cond.notify_all()
+
+    def _open_capture(self):
+        params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(self.stall_timeout * 1000),
+                  cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(self.stall_timeout * 1000)]
+        if self.hw_decode:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        # The FFmpeg options are read from the environment when a capture opens
+        with _open_lock:
+            if not self.low_latency or "OPENCV_FFMPEG_CAPTURE_OPTIONS" in os.environ:
+                return cv2.VideoCapture(self.url, cv2.CAP_FFMPEG, params)
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = FFMPEG_LOW_LATENCY_OPTIONS
+            try:
+                return cv2.VideoCapture(self.url, cv2.CAP_FFMPEG, params)
+            finally:
+                del os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"]
+
+    def _read_opencv(self):
+        cap = self._open_capture()
+        try:
+            if not cap.isOpened():
+                raise IOError("could not open the stream")
+            self.connected = True
+            while not self._stop.is_set():
+                if not cap.grab():
+                    raise IOError("read failed")
+                started = time.perf_counter()
+                success, frame = cap.retrieve()
+                if not success:
+                    raise IOError("decode failed")
+                self.decode_timing.observe(time.perf_counter() - started)
+                self._publish(frame)
+        finally:
+            cap.release()
+
+    def _read_mjpeg(self):
+        response = urllib.request.urlopen(self.url, timeout=self.stall_timeout)
+        try:
+            boundary = response.headers.get_param("boundary")
+            if not boundary:
+                raise IOError(f"not a multipart MJPEG stream ({response.headers.get_content_type()})")
+            parser = MjpegParser(boundary)
+            self.connected = True
+            while not self._stop.is_set():
+                data = response.read1(MJPEG_CHUNK)
+                if not data:
+                    raise IOError("stream ended")
+                parts = parser.feed(data)
+                if self.low_latency and len(parts) > 1:
+                    self.skipped += len(parts) - 1
+                    parts = parts[-1:]
+                for jpeg in parts:
+                    started = time.perf_counter()
+                    frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                    if frame is None:
+                        self.skipped += 1  # Truncated or corrupt part
+                        continue
+                    self.decode_timing.observe(time.perf_counter() - started)
+                    self._publish(frame)
+        finally:
+            response.close()
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "source": self.name,
+                "mode": self.mode,
+                "low_latency": self.low_latency,
+                "connected": self.connected,
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "reconnects": self.reconnects,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "readers": self.readers,
+            }
+
+
+class SourceReader:
+    """One consumer's cursor into a CameraSource, with the cv2.VideoCapture read interface.
+
+    read() waits for the next frame this reader has not seen, across
+    reconnects, and only fails once the source or the reader is closed.
+    Frames that left the source's buffer before it got to them are
+    counted in ``dropped``. Consumers draw on their frames, so a source
+    with several readers hands each one a copy.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.dropped = 0
+        self.released = False
+        self._seq = 0
+        with source._cond:
+            source.readers += 1
+
+    def read(self, timeout=1.0):
+        source = self.source
+        with source._cond:
+            while True:
+                if source.closed or self.released:
+                    return False, None
+                unseen = [item for item in source._frames if item[0] > self._seq]
+                if unseen:
+                    break
+                source._cond.wait(timeout)
+            seq, decoded_at, frame = unseen[0]
+            if self._seq:
+                self.dropped += seq - self._seq - 1
+            self._seq = seq
+            shared = source.readers > 1
+        source.age_timing.observe(time.monotonic() - decoded_at)
+        return True, frame.copy() if shared else frame
+
+    def grab(self):
+        success, _ = self.read()
+        return success
+
+    def isOpened(self):
+        return not (self.source.closed or self.released)
+
+    def get(self, prop):
+        return 0.0  # Unknown for a network source, as with cv2.VideoCapture
+
+    def set(self, prop, value):
+        return False  # Buffering is the source's
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        with self.source._cond:
+            self.source.readers -= 1
+            self.source._cond.notify_all()
+
+
+class IngestRegistry:
+    """One CameraSource per source URL, shared by every camera that uses it.
+
+    The first reader of a URL decides its options; ``defaults`` apply to
+    anything a reader leaves out.
+    """
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def reader(self, url, **options):
+        with self._lock:
+            source = self._sources.get(str(url))
+            if source is None:
+                source = self._sources[str(url)] = CameraSource(url, **{**self.defaults, **options})
+        return source.reader()
+
+    def items(self):
+        with self._lock:
+            return list(self._sources.values())
+
+    def stop_all(self):
+        for source in self.items():
+            source.stop()
+
+    def snapshot(self):
+        return [source.snapshot() for source in self.items()]
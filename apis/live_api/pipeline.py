@@ -0,0 +1,286 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from common.metrics import REGISTRY
+from hub import FrameHub
+
+# Wall time per frame of each stage: capture (cap.read), motion, preprocess,
+# inference and postprocess (from the scheduler), annotate, encode (one stream
+# profile's JPEG, in the viewer's thread) and write (recorder, pre-roll JPEG included)
+STAGE_SECONDS = REGISTRY.histogram("watchman_stage_seconds", "Wall time of a pipeline stage for one frame",
+                                   ("camera", "stage"))
+FRAME_LATENCY = REGISTRY.histogram("watchman_frame_latency_seconds",
+                                   "Capture to the frame handed to viewers and recorder", ("camera",))
+
+
+class RateMeter:
+    """Per-stage counters: processed items, dropped items and sliding-window FPS."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.processed = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self._stamps = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._stamps and now - self._stamps[0] > self.window:
+            self._stamps.popleft()
+
+    def tick(self, latency=None):
+        now = time.monotonic()
+        with self._lock:
+            self.processed += 1
+            self._stamps.append(now)
+            self._trim(now)
+            if latency is not None:
+                self.last_latency = latency
+
+    def fps(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            return len(self._stamps) / self.window
+
+    def drop(self, count=1):
+        if count <= 0:
+            return
+        with self._lock:
+            self.dropped += count
+
+    def snapshot(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            return {
+                "fps": round(len(self._stamps) / self.window, 2),
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "last_latency_ms": round(self.last_latency * 1000, 1),
+            }
+
+
+# Draw "person" boxes on the frame and return how many persons were found
+def annotate_persons(frame, results, names, min_conf=0.0):
+    persons = 0
+    for box in results.boxes:
+        cls_id = int(box.cls[0])
+        if names[cls_id] == "person" and float(box.conf[0]) >= min_conf:
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(frame, "person", (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+            persons += 1
+    return persons
+
+
+# Person boxes (xyxy) and their confidences, the tracker's input
+def person_boxes(results, names):
+    boxes, scores = [], []
+    for box in results.boxes:
+        if names[int(box.cls[0])] == "person":
+            boxes.append([float(v) for v in box.xyxy[0]])
+            scores.append(float(box.conf[0]))
+    return boxes, scores
+
+
+# Draw tracked persons with their track id and return how many there are
+def annotate_tracks(frame, tracks):
+    for track in tracks:
+        x1, y1, x2, y2 = map(int, track.box)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(frame, f"person #{track.id}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    return len(tracks)
+
+
+class CameraPipeline:
+    """Capture -> inference -> record/publish pipeline for a single camera.
+
+    Capture and output run in their own threads, inference is delegated to
+    the BatchScheduler shared by every camera. Capture hands only the newest
+    strided frame to the scheduler, replacing any frame still waiting, and
+    the output stage annotates and records the results and publishes them
+    to a FrameHub shared by every viewer, which JPEG-encodes each stream
+    profile once per frame, and only while someone watches it. A slow model
+    therefore never stalls camera reads and end-to-end latency stays bounded
+    by one batched inference call.
+
+    With a PersonTracker the detector only runs when the tracker asks for
+    it; the frames in between get the tracks' predicted boxes, and
+    recording follows the confirmed tracks instead of single detections.
+    ``min_conf`` filters the detections drawn without a tracker, for when
+    the scheduler runs at the tracker's lower confidence. With a ZoneMask
+    only the zones are inferred and watched for motion, and the zone
+    outlines are drawn on the stream.
+    """
+
+    def __init__(self, camera_id, cap, scheduler, recorder, stride, motion_gate=None,
+                 record_queue_size=32, realtime=False, tracker=None, min_conf=0.0, zones=None,
+                 stream_profiles=None):
+        self.camera_id = camera_id
+        self.cap = cap  # Open capture, or a callable that opens it on the capture thread
+        self.scheduler = scheduler
+        self.recorder = recorder
+        self.motion_gate = motion_gate
+        self.stride = stride  # StrideController, decides how many frames to skip
+        self.realtime = realtime  # Pace file sources to their native frame rate
+        self.tracker = tracker
+        self.min_conf = min_conf
+        self.zones = zones
+
+        self.saving_enabled = False
+        self.person_detected = False  # Last inference result, reused for gated frames
+        self.persons = 0
+        self.last_latency = 0.0
+        self.results = queue.Queue(maxsize=record_queue_size)
+        self.hub = FrameHub(stream_profiles, encode_timing=STAGE_SECONDS.labels(camera_id, "encode"))
+        self.stats = {
+            "capture": RateMeter(),
+            "inference": RateMeter(),
+            "record": RateMeter(),
+            "publish": RateMeter(),  # Capture to the frame handed to viewers and recorder
+        }
+        self.timings = {stage: STAGE_SECONDS.labels(camera_id, stage)
+                        for stage in ("capture", "motion", "annotate", "write")}
+        self.latency = FRAME_LATENCY.labels(camera_id)
+
+        self.running = False
+        self._threads = []
+        self._lock = threading.Lock()
+        scheduler.register(camera_id, self._on_inference, zones)
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            for target in (self._capture_loop, self._output_loop):
+                thread = threading.Thread(target=target, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        self.hub.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self.recorder.close()
+
+    def snapshot(self):
+        return {
+            "running": self.running,
+            "saving": self.saving_enabled,
+            "recorder": self.recorder.snapshot(),
+            "stages": {name: meter.snapshot() for name, meter in self.stats.items()},
+            "stream": self.hub.snapshot(),
+            "stride": self.stride.snapshot(),
+            "motion": self.motion_gate.snapshot(self.stats["inference"].last_latency)
+            if self.motion_gate else None,
+            "tracker": self.tracker.snapshot() if self.tracker else None,
+            "zones": self.zones.snapshot() if self.zones else None,
+        }
+
+    # Stage 1: read frames as fast as the camera delivers them
+    def _capture_loop(self):
+        if callable(self.cap):
+            self.cap = self.cap()
+        frames_since_inference = 0
+        frame_interval = 0.0
+        if self.realtime:
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or 25.0
+            frame_interval = 1.0 / fps
+
+        while self.running:
+            started = time.monotonic()
+            success, frame = self.cap.read()
+            if not success:
+                print(f"[ERROR] Camera {self.camera_id} read failed, stopping pipeline")
+                self.running = False
+                self.hub.close()
+                break
+
+            frames_since_inference += 1
+            self.stats["capture"].tick()
+            self.timings["capture"].observe(time.monotonic() - started)
+            if frames_since_inference >= self.stride.stride:
+                frames_since_inference = 0
+                captured_at = time.monotonic()
+                watched = self.zones.region(frame) if self.zones else frame
+                moving = self.motion_gate is None or self.motion_gate.check(watched, captured_at)
+                if self.motion_gate is not None:
+                    self.timings["motion"].observe(time.monotonic() - captured_at)
+                if moving and (self.tracker is None or self.tracker.needs_detection(captured_at)):
+                    # A frame still waiting for inference is stale now, replace it
+                    if self.scheduler.submit(self.camera_id, (captured_at, frame)):
+                        self.stats["inference"].drop()
+                else:
+                    # Static scene or tracked persons: skip inference, still stream and record the frame
+                    self._enqueue(captured_at, frame, None)
+
+            if frame_interval:
+                time.sleep(max(0.0, frame_interval - (time.monotonic() - started)))
+
+    # Stage 2 runs on the scheduler thread, keep it short; latency is this camera's share of the batch
+    def _on_inference(self, item, results, latency):
+        self.stats["inference"].tick(latency)
+        self.last_latency = latency
+        self._enqueue(item[0], item[1], results)
+
+    def _enqueue(self, captured_at, frame, results):
+        try:
+            self.results.put_nowait((captured_at, frame, results))
+        except queue.Full:
+            self.stats["record"].drop()
+
+    # Stage 3: annotate, publish the frame for streaming and feed the recorder
+    def _output_loop(self):
+        names = None  # Read once inference returned results, the model is loaded by then
+        while self.running:
+            try:
+                captured_at, frame, results = self.results.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if results is not None and names is None:
+                names = self.scheduler.model.names
+
+            started = time.monotonic()
+            track_ids = None
+            if self.tracker is not None:
+                # Between detections the tracks move along their predicted path
+                if results is not None:
+                    tracks = self.tracker.update(*person_boxes(results, names), captured_at)
+                else:
+                    tracks = self.tracker.predict(captured_at)
+                self.persons = annotate_tracks(frame, tracks)
+                self.person_detected = self.persons > 0
+                track_ids = [track.id for track in tracks]
+            elif results is not None:
+                self.persons = annotate_persons(frame, results, names, self.min_conf)
+                self.person_detected = self.persons > 0
+            if results is not None:
+                if self.person_detected and self.motion_gate:
+                    self.motion_gate.hold(captured_at)
+                self.stride.update(time.monotonic(), self.last_latency, self.person_detected,
+                                   input_fps=self.stats["capture"].fps())
+            person_detected = self.person_detected
+            if self.zones:
+                self.zones.draw(frame)
+
+            annotated = time.monotonic()
+            self.timings["annotate"].observe(annotated - started)
+
+            # Viewers encode it in their profiles, the recorder keeps its own pre-roll JPEGs
+            self.hub.publish(frame)
+            published = time.monotonic()
+            self.latency.observe(published - captured_at)
+            self.stats["publish"].tick(published - captured_at)
+
+            self.recorder.push(captured_at, frame, self.saving_enabled and person_detected, self.persons,
+                               track_ids)
+            self.timings["write"].observe(time.monotonic() - published)
+            self.stats["record"].tick()
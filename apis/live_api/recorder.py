@@ -0,0 +1,214 @@
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from writers import open_clip_writer
+
+CLIP_NAME_FORMAT = "%Y-%m-%d_%H-%M-%S"  # Clips are named after the wall clock time of their first frame
+
+
+class PreRollBuffer:
+    """JPEG frames of the last few seconds, bounded by age and by bytes."""
+
+    def __init__(self, seconds, max_bytes):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._frames = deque()
+
+    def append(self, timestamp, jpeg):
+        self._frames.append((timestamp, jpeg))
+        self.bytes += len(jpeg)
+        while self._frames and (
+            timestamp - self._frames[0][0] > self.seconds or self.bytes > self.max_bytes
+        ):
+            _, old = self._frames.popleft()
+            self.bytes -= len(old)
+
+    def frames_after(self, since):
+        return [(ts, jpeg) for ts, jpeg in self._frames if ts > since]
+
+    def snapshot(self):
+        span = self._frames[-1][0] - self._frames[0][0] if self._frames else 0.0
+        return {
+            "frames": len(self._frames),
+            "bytes": self.bytes,
+            "seconds": round(span, 2),
+            "max_bytes": self.max_bytes,
+        }
+
+
+class SegmentRecorder:
+    """Event based clip recorder for one camera.
+
+    Frames are kept in a memory-bounded pre-roll buffer of JPEGs, encoded
+    at ``jpeg_quality`` by the recorder itself and only while a frame may
+    still be needed (idle or waiting to merge), never while recording.
+    When an event starts the buffer is flushed into a new clip so the
+    seconds before the detection are kept. After the last detection the
+    clip keeps recording for ``post_roll`` seconds, then stays open for
+    another ``merge_gap`` seconds: an event inside that gap continues the
+    same clip (the buffered gap frames are flushed to keep it continuous),
+    otherwise the clip is closed. Clips are split at ``max_segment``.
+    Clips are written at ``fps`` whatever rate the frames arrive at, frames
+    are repeated or skipped by their timestamps to keep real time.
+
+    ``on_clip_closed(path, info)`` gets the clip's wall clock start/end,
+    frame count, peak person count and the JPEG of its busiest frame; with
+    track ids (a camera with tracking) also the number of distinct persons
+    and their longest and average dwell time in seconds, else None.
+    """
+
+    IDLE = "idle"
+    RECORDING = "recording"
+    MERGE_WAIT = "merge_wait"
+
+    def __init__(self, footage_dir, on_clip_closed, pre_roll=5.0, post_roll=3.0,
+                 merge_gap=5.0, max_segment=300.0, fps=10.0,
+                 max_pre_roll_bytes=16 * 1024 * 1024, open_writer=open_clip_writer, jpeg_quality=85):
+        self.footage_dir = footage_dir
+        self.on_clip_closed = on_clip_closed
+        self.open_writer = open_writer
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.merge_gap = merge_gap
+        self.max_segment = max_segment
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+
+        # The buffer also holds the gap frames while waiting to merge
+        self.buffer = PreRollBuffer(max(pre_roll, merge_gap), max_pre_roll_bytes)
+        self.state = self.IDLE
+        self.out = None
+        self.clip_started = 0.0
+        self.last_event = 0.0
+        self.gap_started = 0.0
+        self.last_written = 0.0
+        self.clips = 0
+        self._clip_info = None
+        self._clip_tracks = None  # {track id: [first, last] timestamp} in the open clip
+        self._slots = 0
+
+    @property
+    def recording(self):
+        return self.state != self.IDLE
+
+    def push(self, timestamp, frame, event_active, persons=0, track_ids=None):
+        """Feed one annotated frame in capture order, persons is its detection count."""
+        if event_active:
+            self.last_event = timestamp
+
+        if self.state == self.IDLE:
+            self.buffer.append(timestamp, self._encode(frame))
+            if event_active:
+                since = max(self.last_written, timestamp - self.pre_roll)
+                pre_roll = self._buffered(since, timestamp)
+                self._open_clip(pre_roll[0][0] if pre_roll else timestamp, frame)
+                self._write_jpegs(pre_roll)
+                self._write(timestamp, frame)
+                self.state = self.RECORDING
+
+        elif self.state == self.RECORDING:
+            if timestamp - self.clip_started >= self.max_segment:
+                self.close()
+                if timestamp - self.last_event >= self.post_roll:
+                    self.buffer.append(timestamp, self._encode(frame))
+                    return
+                # Long event, continue straight into the next segment
+                self._open_clip(timestamp, frame)
+                self.state = self.RECORDING
+            self._write(timestamp, frame)
+            if timestamp - self.last_event >= self.post_roll:
+                self.state = self.MERGE_WAIT
+                self.gap_started = timestamp
+
+        elif self.state == self.MERGE_WAIT:
+            self.buffer.append(timestamp, self._encode(frame))
+            if event_active:
+                self._write_jpegs(self._buffered(self.last_written, timestamp))
+                self._write(timestamp, frame)
+                self.state = self.RECORDING
+            elif timestamp - self.gap_started >= self.merge_gap:
+                self.close()
+
+        if self.state == self.RECORDING and persons > self._clip_info["peak_persons"]:
+            self._clip_info["peak_persons"] = persons
+            self._clip_info["thumbnail"] = self._encode(frame)
+        if self.state == self.RECORDING and track_ids is not None:
+            if self._clip_tracks is None:
+                self._clip_tracks = {}
+            for track_id in track_ids:
+                self._clip_tracks.setdefault(track_id, [timestamp, timestamp])[1] = timestamp
+
+    @property
+    def current_path(self):
+        """Path of the clip being written, None while idle"""
+        return self.out.path if self.out else None
+
+    def close(self):
+        self.state = self.IDLE
+        if self.out:
+            self.out.release()
+            print(f"[INFO] Stopped recording: {self.out.path}")
+            self.clips += 1
+            self._clip_info["ended_at"] = self._wall_time(self.last_written)
+            if self._clip_tracks is not None:
+                dwell = [last - first for first, last in self._clip_tracks.values()]
+                self._clip_info["unique_persons"] = len(dwell)
+                self._clip_info["max_dwell"] = max(dwell, default=0.0)
+                self._clip_info["avg_dwell"] = sum(dwell) / len(dwell) if dwell else 0.0
+            self.on_clip_closed(self.out.path, self._clip_info)
+            self.out = None
+            self._clip_info = None
+            self._clip_tracks = None
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "clips": self.clips,
+            "pre_roll": self.buffer.snapshot(),
+        }
+
+    def _open_clip(self, timestamp, frame):
+        # Name the clip after the wall clock time of its first frame
+        started_at = self._wall_time(timestamp)
+        name = datetime.fromtimestamp(started_at).strftime(CLIP_NAME_FORMAT)
+        frame_size = (frame.shape[1], frame.shape[0])
+        self.out = self.open_writer(f"{self.footage_dir}/{name}", self.fps, frame_size)
+        self.clip_started = timestamp
+        self._slots = 0  # Frames written to the clip, at self.fps from clip_started
+        self._clip_info = {"started_at": started_at, "ended_at": started_at, "frames": 0,
+                           "peak_persons": 0, "thumbnail": None,
+                           "unique_persons": None, "max_dwell": None, "avg_dwell": None}
+        print(f"[INFO] Started recording: {self.out.path}")
+
+    def _encode(self, frame):
+        _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buffer.tobytes()
+
+    def _buffered(self, since, until):
+        return [(ts, jpeg) for ts, jpeg in self.buffer.frames_after(since) if ts < until]
+
+    def _write_jpegs(self, frames):
+        for ts, jpeg in frames:
+            frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            self._write(ts, frame)
+
+    def _write(self, timestamp, frame):
+        if self.out:
+            # Frames come at the capture rate over a changing stride: repeat or skip
+            # them to fill the clip's fixed rate, so it plays in real time
+            due = int((timestamp - self.clip_started) * self.fps) + 1
+            while self._slots < due:
+                self.out.write(frame)
+                self._slots += 1
+                self._clip_info["frames"] += 1
+            self.last_written = timestamp
+
+    @staticmethod
+    def _wall_time(timestamp):
+        # Frame timestamps are time.monotonic()
+        return time.time() - (time.monotonic() - timestamp)
@@ -0,0 +1,200 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from common.metrics import FFMPEG_SECONDS
+from footage_index import thumbnail_path
+
+DAY = 24 * 3600
+
+
+def compress_clip(src, dst, crf, height=None, preexec_fn=None):
+    """Re-encode a clip at a higher CRF and optionally a lower height, True when ffmpeg succeeded"""
+    scale = ["-vf", f"scale=-2:'min({height},ih)'"] if height else []
+    with FFMPEG_SECONDS.labels("compact").time():
+        result = subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error", "-i", src, "-map", "0:v:0",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", str(crf), "-pix_fmt", "yuv420p", *scale,
+            "-movflags", "+faststart", "-f", "mp4", dst
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=preexec_fn)
+    return result.returncode == 0
+
+
+class RetentionJanitor:
+    """Keeps the footage within per-camera quotas and above a free-space floor.
+
+    One thread sweeps every ``interval`` seconds (or right after a clip
+    closes, see wake()). Per camera, clips older than ``max_age`` and the
+    oldest clips beyond ``max_bytes`` are deleted; then, while the disk has
+    less than ``min_free_bytes`` free, the oldest clips of any camera go.
+    The clip a recorder is writing is never touched. Clips older than
+    ``compact_after`` are re-encoded at ``compact_crf`` (and at most
+    ``compact_height`` lines) by the background jobs, replacing the
+    original only when the result is smaller.
+
+    ``policies`` is {camera: {"footage_dir", "max_bytes", "max_age", "compact_after"}},
+    ages in seconds, None disables a limit. Clips are listed through the
+    footage index, cameras the index has not scanned yet are skipped.
+    """
+
+    def __init__(self, index, policies, is_recording, interval=60.0, min_free_bytes=None,
+                 compact_crf=30, compact_height=None, compact_per_sweep=2, submit=None, preexec_fn=None):
+        self.index = index
+        self.policies = policies
+        self.is_recording = is_recording
+        self.interval = interval
+        self.min_free_bytes = min_free_bytes
+        self.compact_crf = compact_crf
+        self.compact_height = compact_height
+        self.compact_per_sweep = compact_per_sweep
+        self.submit = submit or (lambda fn, *args: fn(*args))
+        self.preexec_fn = preexec_fn
+        self.stats = {"sweeps": 0, "evicted": 0, "evicted_bytes": 0, "compacted": 0, "compacted_saved_bytes": 0,
+                      "last_sweep_ms": 0.0, "last_sweep_at": None}
+        self._compacting = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Sweep now instead of at the next interval, e.g. after a clip closed"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[ERROR] Retention: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        started = time.monotonic()
+        for camera, policy in self.policies.items():
+            if self.index.scanned(camera):
+                self._apply_quota(camera, policy, now)
+        self._keep_free_space()
+        for camera, policy in self.policies.items():
+            if policy.get("compact_after") and self.index.scanned(camera):
+                self._compact_old(camera, now - policy["compact_after"])
+        with self._lock:
+            self.stats["sweeps"] += 1
+            self.stats["last_sweep_ms"] = round((time.monotonic() - started) * 1000, 1)
+            self.stats["last_sweep_at"] = now
+
+    def _evictable(self, camera, clip):
+        path = os.path.join(self.policies[camera]["footage_dir"], clip["filename"])
+        return path, not self.is_recording(path) and (camera, clip["filename"]) not in self._compacting
+
+    def _apply_quota(self, camera, policy, now):
+        clips, _ = self.index.query(camera, sort="oldest", limit=None)
+        total = sum(clip["size"] for clip in clips)
+        for clip in clips:
+            too_old = policy.get("max_age") is not None and clip["ended_at"] < now - policy["max_age"]
+            too_big = policy.get("max_bytes") is not None and total > policy["max_bytes"]
+            if not (too_old or too_big):
+                break  # Oldest first: every later clip is newer and the camera is within its quota
+            path, evictable = self._evictable(camera, clip)
+            if evictable:
+                self._evict(camera, clip, path, "age" if too_old else "quota")
+                total -= clip["size"]
+
+    def _keep_free_space(self):
+        if self.min_free_bytes is None:
+            return
+        free = self.disk_usage()["free"]
+        if free >= self.min_free_bytes:
+            return
+        scanned = [camera for camera in self.policies if self.index.scanned(camera)]
+        clips = []
+        for camera in scanned:
+            clips += [(clip["started_at"], camera, clip) for clip in self.index.query(camera, sort="oldest",
+                                                                                       limit=None)[0]]
+        for _, camera, clip in sorted(clips, key=lambda item: item[0]):
+            if free >= self.min_free_bytes:
+                break
+            path, evictable = self._evictable(camera, clip)
+            if evictable:
+                self._evict(camera, clip, path, "disk space")
+                free += clip["size"]
+
+    def _evict(self, camera, clip, path, reason):
+        for file_path in (path, clip["thumbnail"] or thumbnail_path(path)):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+        self.index.remove(camera, clip["filename"])
+        with self._lock:
+            self.stats["evicted"] += 1
+            self.stats["evicted_bytes"] += clip["size"]
+        print(f"[INFO] Retention removed {camera}/{clip['filename']} ({reason})")
+
+    def _compact_old(self, camera, before):
+        for clip in self.index.uncompacted(camera, before, self.compact_per_sweep):
+            path, evictable = self._evictable(camera, clip)
+            if not evictable:
+                continue
+            self._compacting.add((camera, clip["filename"]))
+            try:
+                self.submit(self._compact, camera, clip, path)
+            except Exception as e:
+                self._compacting.discard((camera, clip["filename"]))
+                print(f"[ERROR] Retention could not queue {clip['filename']}: {e}")
+
+    def _compact(self, camera, clip, path):
+        tmp_path = f"{path}.compact.tmp"  # Not an .mp4, so listings and scans ignore it
+        try:
+            ok = compress_clip(path, tmp_path, self.compact_crf, self.compact_height, self.preexec_fn)
+            # Evicted meanwhile: leave it gone
+            if not os.path.exists(path) or self.index.get(camera, clip["filename"]) is None:
+                return
+            size = os.path.getsize(tmp_path) if ok else clip["size"]
+            if size < clip["size"]:
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self.stats["compacted"] += 1
+                    self.stats["compacted_saved_bytes"] += clip["size"] - size
+            # Also when nothing was gained or ffmpeg failed, so the clip is not tried again every sweep
+            self.index.mark_compacted(camera, clip["filename"], os.path.getsize(path), os.path.getmtime(path))
+        finally:
+            self._compacting.discard((camera, clip["filename"]))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def disk_usage(self):
+        # Every camera folder normally lives on the same disk, the first one is measured
+        directory = next(iter(self.policies.values()))["footage_dir"] if self.policies else "."
+        usage = shutil.disk_usage(directory)
+        return {"total": usage.total, "used": usage.used, "free": usage.free}
+
+    def snapshot(self):
+        usage = self.index.usage()
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "disk": self.disk_usage(),
+            "min_free_bytes": self.min_free_bytes,
+            "cameras": {
+                camera: {
+                    "clips": usage.get(camera, (0, 0))[0],
+                    "bytes": usage.get(camera, (0, 0))[1],
+                    "max_bytes": policy.get("max_bytes"),
+                    "max_age_days": policy["max_age"] / DAY if policy.get("max_age") else None,
+                    "compact_after_days": policy["compact_after"] / DAY if policy.get("compact_after") else None,
+                }
+                for camera, policy in self.policies.items()
+            },
+            "compacting": len(self._compacting),
+            **stats,
+        }
@@ -0,0 +1,170 @@
+import threading
+import time
+
+from common.metrics import REGISTRY
+from pipeline import STAGE_SECONDS, RateMeter
+
+STEPS = ("preprocess", "inference", "postprocess")  # Ultralytics' result.speed keys
+BATCH_SECONDS = REGISTRY.histogram("watchman_batch_seconds", "Wall time of one batched model.predict call",
+                                   ("size",))
+
+
+# Per-image [preprocess, inference, postprocess] seconds from the results' .speed (ms);
+# without one the image's share of the predict call counts as inference
+def result_speeds(results, latency):
+    speeds = []
+    for result in results:
+        speed = getattr(result, "speed", None) or {}
+        if "inference" in speed:
+            speeds.append([(speed.get(step) or 0.0) / 1000 for step in STEPS])
+        else:
+            speeds.append([0.0, latency / len(results), 0.0])
+    return speeds
+
+
+class BatchScheduler:
+    """Runs a single model for every camera by batching their pending frames.
+
+    Each camera has at most one pending frame; a newer frame replaces it.
+    The scheduler thread collects pending frames in round-robin order, waits
+    up to ``max_wait`` seconds after the oldest one arrived for the batch to
+    fill, and then stacks them into one ``model.predict`` call. A camera
+    registered with a ZoneMask contributes the crops of its zones instead
+    of the whole frame, and gets their results merged back into one.
+
+    Each camera's share of a batch (the speeds of its images, plus the zone
+    merge as postprocess) is recorded in its stage histograms. Its callback
+    gets ``on_result(item, result, latency)`` with latency the camera's share
+    of the batch's wall time (by its number of images), not the whole batch.
+    """
+
+    def __init__(self, model, max_batch=8, max_wait=0.03, **predict_kwargs):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.predict_kwargs = predict_kwargs
+
+        self._callbacks = {}
+        self._zones = {}
+        self._timings = {}
+        self._order = []
+        self._next = 0
+        self._pending = {}
+        self._cond = threading.Condition()
+
+        self.stats = RateMeter()
+        self.frames_inferred = 0
+        self.images_inferred = 0  # Frames, or zone crops and tiles
+        self.last_batch_size = 0
+        self.running = False
+        self._thread = None
+
+    def register(self, camera_id, on_result, zones=None):
+        with self._cond:
+            self._callbacks[camera_id] = on_result
+            self._zones[camera_id] = zones
+            self._order.append(camera_id)
+            self._timings[camera_id] = [STAGE_SECONDS.labels(camera_id, step) for step in STEPS]
+
+    def submit(self, camera_id, item):
+        """Queue the newest frame of a camera; True if it replaced a pending one."""
+        with self._cond:
+            replaced = camera_id in self._pending
+            self._pending[camera_id] = (time.monotonic(), item)
+            self._cond.notify()
+            return replaced
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def snapshot(self):
+        return {
+            "batches": self.stats.snapshot(),
+            "frames_inferred": self.frames_inferred,
+            "images_inferred": self.images_inferred,
+            "last_batch_size": self.last_batch_size,
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+    def _take_batch(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._pending or not self.running, timeout=1.0)
+            if not self._pending:
+                return []
+
+            # Give the other cameras until the oldest frame's deadline to join
+            target = min(self.max_batch, len(self._order))
+            deadline = min(queued_at for queued_at, _ in self._pending.values()) + self.max_wait
+            while self.running and len(self._pending) < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # Round-robin so no camera is starved when pending > max_batch
+            batch = []
+            count = len(self._order)
+            for offset in range(count):
+                camera_id = self._order[(self._next + offset) % count]
+                if camera_id in self._pending:
+                    batch.append((camera_id, self._pending.pop(camera_id)[1]))
+                    if len(batch) == self.max_batch:
+                        break
+            self._next = (self._next + offset + 1) % count
+            return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._take_batch()
+            if not batch:
+                continue
+
+            # Cameras with zones are inferred on their crops (and tiles)
+            images = []
+            for camera_id, (_, frame) in batch:
+                zones = self._zones[camera_id]
+                images.append(zones.crops(frame) if zones else [frame])
+
+            started = time.monotonic()
+            try:
+                results = self.model.predict(
+                    source=[image for crops in images for image in crops],
+                    **self.predict_kwargs
+                )
+            except Exception as e:
+                print(f"[ERROR] Batched inference failed: {e}")
+                continue
+            latency = time.monotonic() - started
+
+            self.frames_inferred += len(batch)
+            self.images_inferred += len(results)
+            self.last_batch_size = len(batch)
+            self.stats.tick(latency)
+            BATCH_SECONDS.labels(len(batch)).observe(latency)
+            speeds = result_speeds(results, latency)
+            position = 0
+            for (camera_id, item), crops in zip(batch, images):
+                zones = self._zones[camera_id]
+                merge_started = time.monotonic()
+                if zones:
+                    result = zones.merge(item[1], results[position:position + len(crops)], self.model.names)
+                else:
+                    result = results[position]
+                spent = [sum(step) for step in zip(*speeds[position:position + len(crops)])]
+                spent[2] += time.monotonic() - merge_started
+                for timing, seconds in zip(self._timings[camera_id], spent):
+                    timing.observe(seconds)
+                position += len(crops)
+                self._callbacks[camera_id](item, result, latency * len(crops) / len(results))
@@ -0,0 +1,191 @@
+import itertools
+import threading
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """IoU of every box in a (N, 4) with every box in b (M, 4), xyxy"""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def greedy_match(iou, threshold):
+    """Pairs (row, col) by descending IoU above threshold, each row and column used once"""
+    pairs = []
+    if iou.size == 0:
+        return pairs
+    rows, cols = np.nonzero(iou >= threshold)
+    used_rows, used_cols = set(), set()
+    for index in np.argsort(-iou[rows, cols]):
+        row, col = rows[index], cols[index]
+        if row not in used_rows and col not in used_cols:
+            pairs.append((row, col))
+            used_rows.add(row)
+            used_cols.add(col)
+    return pairs
+
+
+def to_xyah(box):
+    x1, y1, x2, y2 = box
+    w, h = x2 - x1, y2 - y1
+    return np.array([x1 + w / 2, y1 + h / 2, w, h], dtype=float)
+
+
+class Track:
+    """One person: constant-velocity Kalman filter over box centre and size.
+
+    The state is (cx, cy, w, h) and their velocities per second, so
+    prediction works with the uneven frame intervals of a strided and
+    motion-gated camera.
+    """
+
+    POSITION_NOISE = 1.0 / 20  # Scaled by box height, as in SORT/ByteTrack
+    VELOCITY_NOISE = 1.0 / 160
+
+    def __init__(self, track_id, box, score, now):
+        self.id = track_id
+        self.score = score
+        self.hits = 1
+        self.first_seen = now
+        self.last_seen = now
+        self.updated_at = now
+        self.mean = np.concatenate([to_xyah(box), np.zeros(4)])
+        h = max(self.mean[3], 1.0)
+        std = np.array([2 * self.POSITION_NOISE * h] * 4 + [10 * self.VELOCITY_NOISE * h] * 4)
+        self.covariance = np.diag(std ** 2)
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.mean[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+    def predict(self, now):
+        dt = now - self.updated_at
+        if dt <= 0:
+            return
+        motion = np.eye(8)
+        motion[:4, 4:] = np.eye(4) * dt
+        h = max(self.mean[3], 1.0)
+        noise = np.diag(np.array([self.POSITION_NOISE * h] * 4 + [self.VELOCITY_NOISE * h] * 4) ** 2 * dt)
+        self.mean = motion @ self.mean
+        self.mean[2:4] = np.maximum(self.mean[2:4], 1.0)
+        self.covariance = motion @ self.covariance @ motion.T + noise
+        self.updated_at = now
+
+    def update(self, box, score, now):
+        self.predict(now)
+        h = max(self.mean[3], 1.0)
+        measurement_noise = np.diag((np.array([self.POSITION_NOISE * h] * 4)) ** 2)
+        projection = np.eye(4, 8)
+        projected_cov = projection @ self.covariance @ projection.T + measurement_noise
+        gain = self.covariance @ projection.T @ np.linalg.inv(projected_cov)
+        self.mean = self.mean + gain @ (to_xyah(box) - projection @ self.mean)
+        self.covariance = (np.eye(8) - gain @ projection) @ self.covariance
+        self.score = score
+        self.hits += 1
+        self.last_seen = now
+
+    @property
+    def dwell(self):
+        return self.last_seen - self.first_seen
+
+
+class PersonTracker:
+    """IoU tracker in the style of ByteTrack, for one camera.
+
+    Detections at or above ``high_conf`` are matched to the predicted track
+    boxes first; the remaining tracks then get a chance at the low
+    confidence detections (down to the model's conf), which keeps a person
+    whose score dips for a frame. New tracks need ``min_hits`` detections
+    before they count, so a single false positive never starts a
+    recording, and a track survives ``max_age`` seconds without a match,
+    so a single missed detection never stops one.
+
+    Between detections predict() moves the boxes along their velocity;
+    needs_detection() tells the camera when the detector has to run again
+    (every ``detect_interval`` seconds while persons are tracked, every
+    frame otherwise).
+    """
+
+    def __init__(self, high_conf=0.5, match_iou=0.3, low_match_iou=0.5, min_hits=2, max_age=1.5,
+                 detect_interval=0.5):
+        self.high_conf = high_conf
+        self.match_iou = match_iou
+        self.low_match_iou = low_match_iou
+        self.min_hits = min_hits
+        self.max_age = max_age
+        self.detect_interval = detect_interval
+        self.tracks = []
+        self.last_detection = None
+        self.updates = 0
+        self.predictions = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def needs_detection(self, now):
+        with self._lock:
+            return (not any(self._confirmed(track) for track in self.tracks)
+                    or self.last_detection is None or now - self.last_detection >= self.detect_interval)
+
+    def update(self, boxes, scores, now):
+        """Match one frame's person detections (xyxy, conf), returns the confirmed tracks"""
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=float).reshape(-1)
+        with self._lock:
+            for track in self.tracks:
+                track.predict(now)
+            high = np.nonzero(scores >= self.high_conf)[0]
+            low = np.nonzero(scores < self.high_conf)[0]
+
+            unmatched = list(range(len(self.tracks)))
+            track_boxes = np.array([track.box for track in self.tracks]).reshape(-1, 4)
+            pairs = greedy_match(iou_matrix(track_boxes, boxes[high]), self.match_iou)
+            for row, col in pairs:
+                self.tracks[row].update(boxes[high[col]], scores[high[col]], now)
+                unmatched.remove(row)
+            matched_high = {col for _, col in pairs}
+
+            # Second chance for confirmed tracks on the low confidence detections
+            remaining = [i for i in unmatched if self._confirmed(self.tracks[i])]
+            remaining_boxes = track_boxes[remaining].reshape(-1, 4)
+            for row, col in greedy_match(iou_matrix(remaining_boxes, boxes[low]), self.low_match_iou):
+                self.tracks[remaining[row]].update(boxes[low[col]], scores[low[col]], now)
+
+            for col in range(len(high)):
+                if col not in matched_high:
+                    self.tracks.append(Track(next(self._ids), boxes[high[col]], scores[high[col]], now))
+            self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age]
+            self.last_detection = now
+            self.updates += 1
+            return [track for track in self.tracks if self._confirmed(track)]
+
+    def predict(self, now):
+        """Confirmed tracks with their boxes moved to ``now``, for frames without a detection"""
+        with self._lock:
+            self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age]
+            for track in self.tracks:
+                track.predict(now)
+            self.predictions += 1
+            return [track for track in self.tracks if self._confirmed(track)]
+
+    def _confirmed(self, track):
+        return track.hits >= self.min_hits
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "tracks": sum(self._confirmed(track) for track in self.tracks),
+                "tentative": sum(not self._confirmed(track) for track in self.tracks),
+                "detections": self.updates,
+                "predictions": self.predictions,
+                "detect_interval": self.detect_interval,
+            }
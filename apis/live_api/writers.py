@@ -0,0 +1,49 @@
+import os
+import subprocess
+
+import cv2
+
+from common.ffmpeg import FFmpegPipeWriter, ffmpeg_available
+from common.metrics import FFMPEG_SECONDS
+
+
+class AviWriter:
+    """MJPG AVI through cv2.VideoWriter, converted to MP4 after the clip closes."""
+
+    def __init__(self, path, fps, frame_size):
+        self.path = path
+        self.frame_size = frame_size
+        fourcc = cv2.VideoWriter_fourcc(*'MJPG')  # AVI format (fast)
+        self.out = cv2.VideoWriter(path, fourcc, fps, frame_size)
+
+    def write(self, frame):
+        self.out.write(frame)
+
+    def release(self):
+        self.out.release()
+
+
+# Convert .avi to .mp4 (fallback when clips are not written as MP4 directly)
+def convert_to_mp4(avi_file, mp4_file, preexec_fn=None):
+    try:
+        with FFMPEG_SECONDS.labels("convert").time():
+            subprocess.run([
+                "ffmpeg", "-y", "-i", avi_file,
+                "-vcodec", "libx264", "-crf", "23", mp4_file
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            preexec_fn=preexec_fn,
+            check=True)
+
+        os.remove(avi_file)
+        print(f"[INFO] Converted and saved: {mp4_file}")
+    except Exception as e:
+        print(f"[ERROR] FFmpeg conversion failed: {e}")
+
+
+# Direct H.264 when ffmpeg is installed, the old AVI path otherwise
+def open_clip_writer(base_path, fps, frame_size, use_ffmpeg=True, crf=23, preexec_fn=None):
+    if use_ffmpeg and ffmpeg_available():
+        return FFmpegPipeWriter(f"{base_path}.mp4", fps, frame_size, crf=crf, preexec_fn=preexec_fn)
+    return AviWriter(f"{base_path}.avi", fps, frame_size)
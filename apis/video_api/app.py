@@ -1,147 +1,173 @@
-from flask import Flask, request, jsonify, send_file
-from ultralytics import YOLO
+from flask import Blueprint, Flask, Response, request, jsonify, url_for
+import fcntl
+import hashlib
+import json
 import os
+import re
+import sys
 import uuid
-import threading
-import time
 from flask_cors import CORS
-import subprocess
+from werkzeug.exceptions import ClientDisconnected
 
-app = Flask(__name__)
-CORS(app)  # Enable Cross-Origin Resource Sharing (CORS) for the app
+# Modules shared with live_api live in apis/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from common.media import send_media
+from common.metrics import CONTENT_TYPE, REGISTRY, format_histograms, format_samples, merge_snapshots
+from common.profiler import SamplingProfiler
+from common.warmup import StartupClock
+from common.zones import parse_zones
+from jobstore import COMPLETE, DONE, FAILED, QUEUED, RECEIVING, JobStore
+from options import HIGHLIGHT_MERGE_GAP, HIGHLIGHT_PADDING, PROCESSING_MODES, PREDICT_SAVE_FOLDER
+from streaming import mp4_streamable
+from workers import JOB_DB, JOB_WORKERS, WORKER_STALE_AFTER, Janitor, WorkerPool
+
+# Flask front: stores uploads and job records, the worker processes
+# (workers.py) load the model and do the processing. Several fronts can
+# share one job database, e.g. gunicorn -w 4 with WATCHMAN_JOB_WORKERS=0
+# next to a standalone "python workers.py".
+
+# Startup milestones of the front, in seconds since process start
+startup = StartupClock()
+
+# Routes, registered on the app by create_app()
+api = Blueprint("api", __name__)
 
 # Define folders for file management
 UPLOAD_FOLDER = "uploads"
 PROCESSED_FOLDER = "processed"
-PREDICT_SAVE_FOLDER = "predict"
-MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB max file size
+MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB max file size, and max chunk size of a resumable upload
 
-# Create necessary directories if they don't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(PROCESSED_FOLDER, exist_ok=True)
-os.makedirs(PREDICT_SAVE_FOLDER, exist_ok=True)
-
-# Configure Flask app settings
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-app.config["PROCESSED_FOLDER"] = PROCESSED_FOLDER
-app.config["PREDICT_SAVE_FOLDER"] = PREDICT_SAVE_FOLDER
-app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_SIZE
+# Resumable uploads (/api/v1/uploads) for files above MAX_FILE_SIZE
+MAX_UPLOAD_SIZE = 8 * 1024 * 1024 * 1024  # 8GB
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Chunk size suggested to clients
+COPY_BLOCK_SIZE = 1024 * 1024  # Request bodies are copied to disk in blocks of this size
 
 # Define allowed file extensions
 ALLOWED_EXTENSIONS = {"mp4"}
 
-# Dictionary to keep track of processing jobs
-processing_jobs = {}
-lock = threading.Lock()  # Lock for thread safety
+RESULT_MAX_AGE = 60  # Seconds clients may cache a result, results only live for RESULT_TTL
+
+# Uploads waiting before new ones are rejected with 503 (JOB_WORKERS processes run at once)
+MAX_JOB_QUEUE = 16
+
+# Sampling profiler of this front process, off until POST /api/v1/profiler/start
+PROFILER_INTERVAL = 0.005  # Seconds between stack samples
+PROFILER_SECONDS = 30.0  # Default length of a profile, it stops by itself
+PROFILER_MAX_SECONDS = 300.0
 
-# Load YOLOv8 model
-model = YOLO('watchman_v3.pt')
+# Durable job records shared by every front and worker process
+store = JobStore(JOB_DB)
+pool = WorkerPool(JOB_DB, processes=JOB_WORKERS)
+janitor = Janitor(store)
+rejected_jobs = 0
+profiler = SamplingProfiler()
 
 def allowed_file(filename):
     """Check if the uploaded file has an allowed extension"""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Function to delete predicted and processed videos after a delay
-def delete_video(video_path):
-    time.sleep(30)  # Wait 30 seconds before deletion
+def read_options(values):
+    """Processing options of an upload form or JSON body, returns (options, error)"""
+    mode = values.get("mode", "full")
+    if mode not in PROCESSING_MODES:
+        return None, "Invalid mode"
     try:
-        if os.path.exists(video_path):
-            for file in os.listdir(video_path):
-                os.remove(os.path.join(video_path, file))
-            os.rmdir(video_path)  # Remove directory after files are deleted
-    except Exception as e:
-        print(f"Error deleting folder {video_path}: {e}")
-
-# Function to remove job ID after processing
-def delete_job_id(job_id):
-    time.sleep(30)  # Wait before deletion
-    with lock:
-        processing_jobs.pop(job_id, None)
-
-# Function to convert AVI video to MP4 format
-def convert_to_mp4(avi_path, mp4_path, job_id):
-    try:
-        cmd = [
-            "ffmpeg", "-i", avi_path, "-c:v", "libx264", "-preset", "fast", "-crf", "23",
-            "-c:a", "aac", "-b:a", "128k", mp4_path
-        ]
-        subprocess.run(cmd, check=True)  # Run ffmpeg command to convert video
-
-        with lock:
-            processing_jobs[job_id] = 1  # Mark job as completed
-    except subprocess.CalledProcessError as e:
-        print(f"Error converting {avi_path} to MP4: {e}")
-
-# Function to process the uploaded video
-def process_video(filepath, job_id):
-    """Handles YOLO object detection and video processing in a separate thread"""
-    try:
-        model(
-            source=filepath,     # Input video path
-            classes=[0],         # Detect only "person" class (class ID 0)
-            imgsz=320,           # Set image size for YOLO
-            conf=0.5,            # Confidence threshold
-            iou=0.45,            # Intersection over Union (IoU) threshold
-            device="cpu",        # Run on CPU
-            vid_stride=2,        # Process every second frame for efficiency
-            save=True,           # Save output video
-            project=app.config["PREDICT_SAVE_FOLDER"],  # Output directory
-            name=job_id,         # Output file name
-            verbose=False,
-            stream=False
-        )
-
-        # Locate the processed video output
-        predict_path = os.path.join(app.config["PREDICT_SAVE_FOLDER"], job_id)
-        processed_video = None
-
-        if os.path.exists(predict_path):
-            for file in os.listdir(predict_path):
-                if file.endswith(".avi"):  # Check for AVI output file
-                    processed_video = os.path.join(predict_path, file)
-                    break
-
-        # Remove uploaded file after processing
-        try:
-            os.remove(filepath)
-        except Exception as e:
-            print(f"Error deleting uploaded video: {e}")
+        padding = float(values.get("padding", HIGHLIGHT_PADDING))
+        merge_gap = float(values.get("merge_gap", HIGHLIGHT_MERGE_GAP))
+    except (TypeError, ValueError):
+        return None, "padding and merge_gap must be numbers"
+    annotate = str(values.get("annotate", "false")).lower() in ("1", "true", "yes")
+    options = {"mode": mode, "padding": padding, "merge_gap": merge_gap, "annotate": annotate}
 
-        if processed_video:
-            # Create a folder for processed MP4 videos
-            processed_mp4_path = os.path.join(app.config["PROCESSED_FOLDER"], job_id)
-            os.makedirs(processed_mp4_path, exist_ok=True)
+    # Polygons in fractions of the frame, a JSON string in upload forms
+    zones = values.get("zones")
+    if zones:
+        try:
+            options["zones"] = [polygon.tolist() for polygon in parse_zones(
+                json.loads(zones) if isinstance(zones, str) else zones)]
+        except (TypeError, ValueError) as e:
+            return None, f"Invalid zones: {e}"
+        options["zone_tiles"] = str(values.get("zone_tiles", "false")).lower() in ("1", "true", "yes")
+    return options, None
 
-            # Convert processed AVI file to MP4
-            convert_to_mp4(processed_video, os.path.join(processed_mp4_path, f"{job_id}.mp4"), job_id)
+def queue_full():
+    return store.count(QUEUED) >= MAX_JOB_QUEUE
 
-            # Mark job as completed
-            processing_jobs[job_id] = 1
+def busy_response():
+    global rejected_jobs
+    rejected_jobs += 1
+    response = jsonify({"error": "Server busy, try again later"})
+    response.headers["Retry-After"] = "30"
+    return response, 503
 
-            # Schedule deletion of temporary files
-            threading.Thread(target=delete_video, args=(predict_path,)).start()
-            threading.Thread(target=delete_video, args=(processed_mp4_path,)).start()
+def result_dir(job_id):
+    return os.path.abspath(os.path.join(PROCESSED_FOLDER, job_id))
 
-    except Exception as e:
-        print(f"Error processing video {job_id}: {e}")
+def processing_response(job):
+    return jsonify({"status": "processing", "progress": round(job["progress"] * 100, 1)}), 102
 
 # API endpoint to check the status of a job
-@app.route("/api/v1/status/<job_id>", methods=["GET"])
+@api.route("/api/v1/status/<job_id>", methods=["GET"])
 def check_status(job_id):
-    with lock:
-        if job_id in processing_jobs:
-            if processing_jobs[job_id] == 1:  # Job completed
-                threading.Thread(target=delete_job_id, args=(job_id,)).start()  # Schedule job ID deletion
-                processed_video_path = os.path.join(app.config["PROCESSED_FOLDER"], job_id, f"{job_id}.mp4")
-                return send_file(processed_video_path, as_attachment=True)  # Send processed file
-            return jsonify({"status": "processing"}), 102  # Job still processing
-    
-    return jsonify({"error": "Job not found"}), 404  # Job ID not found
+    job = store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404  # Job ID not found
+    if job["status"] == FAILED:
+        return jsonify({"error": job["error"] or "Processing failed"}), 500
+    if job["status"] != DONE:
+        return processing_response(job)  # Job still queued or processing
+
+    processed_video_path = result_path(job)
+    if not os.path.exists(processed_video_path):  # Highlights without any person
+        return jsonify(read_timeline(job) or {"segments": []}), 200
+    return send_media(processed_video_path, as_attachment=True, max_age=RESULT_MAX_AGE)  # Send processed file
 
-import threading
+def result_path(job):
+    return os.path.join(job["result_dir"], f"{job['id']}.mp4")
+
+# API endpoint with the processed video of a finished job, supports Range requests for seeking players
+@api.route("/api/v1/result/<job_id>", methods=["GET"])
+def job_result(job_id):
+    job = store.get(job_id)
+    if job is None or job["status"] != DONE or not os.path.exists(result_path(job)):
+        return jsonify({"error": "Result not found"}), 404
+    return send_media(result_path(job), max_age=RESULT_MAX_AGE)
+
+# API endpoint with the progress of a job as JSON, also while it is queued
+@api.route("/api/v1/progress/<job_id>", methods=["GET"])
+def job_progress(job_id):
+    job = store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    has_video = job["status"] == DONE and os.path.exists(result_path(job))
+    return jsonify({
+        "status": job["status"],
+        "progress": round(job["progress"] * 100, 1),
+        "error": job["error"],
+        "result": url_for("api.job_result", job_id=job_id) if has_video else None,
+    }), 200
+
+def read_timeline(job):
+    timeline_path = os.path.join(job["result_dir"], "timeline.json")
+    if not os.path.exists(timeline_path):
+        return None
+    with open(timeline_path) as f:
+        return json.load(f)
+
+# API endpoint with the person segments found by a "highlights" job
+@api.route("/api/v1/timeline/<job_id>", methods=["GET"])
+def get_timeline(job_id):
+    job = store.get(job_id)
+    if job is not None and job["status"] not in (DONE, FAILED):
+        return processing_response(job)
+    timeline = read_timeline(job) if job is not None and job["status"] == DONE else None
+    if timeline is None:
+        return jsonify({"error": "Timeline not found"}), 404
+    return jsonify(timeline), 200
 
 # API endpoint to upload a video for processing
-@app.route("/api/v1/upload", methods=["POST"])
+@api.route("/api/v1/upload", methods=["POST"])
 def upload_video():
     if "file" not in request.files:
         return jsonify({"error": "No file part"}), 400  # No file in request
@@ -154,21 +180,273 @@ def upload_video():
     if not allowed_file(file.filename):
         return jsonify({"error": "Invalid file type"}), 400  # Invalid file type
 
+    # Processing options
+    options, error = read_options(request.form)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Shed load before saving the upload when too many jobs are waiting
+    if queue_full():
+        return busy_response()
+
     # Generate a unique random filename
     hex_name = uuid.uuid4().hex[:64]
     new_filename = f"{hex_name}.mp4"
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], new_filename)
+    filepath = os.path.join(UPLOAD_FOLDER, new_filename)
     file.save(filepath)  # Save the uploaded file
 
-    # Mark job as started
-    processing_jobs[hex_name] = 0  
-
-    # Start video processing in a separate thread
-    threading.Thread(target=process_video, args=(filepath, hex_name)).start()
+    # Queue video processing, any worker process may pick it up
+    store.create(hex_name, os.path.abspath(filepath), result_dir(hex_name), options)
 
     # Return job ID to the client
     return jsonify({"job_id": hex_name}), 200
 
+def offset_response(upload, message=None, code=200):
+    body = {"upload_id": upload["id"], "status": upload["status"], "offset": upload["received"],
+            "size": upload["size"], "job_id": upload["job_id"]}
+    if message:
+        body["error"] = message
+    response = jsonify(body)
+    response.headers["Upload-Offset"] = str(upload["received"])
+    return response, code
+
+def copy_body(f, offset, length):
+    """Writes the request body to f at offset without holding it in memory, returns (bytes, sha256).
+    A dropped connection ends the copy early, the bytes received so far are kept."""
+    digest = hashlib.sha256()
+    f.seek(offset)
+    f.truncate()  # Bytes of a chunk that was never recorded
+    written = 0
+    while written < length:
+        try:
+            block = request.stream.read(min(COPY_BLOCK_SIZE, length - written))
+        except ClientDisconnected:
+            break
+        if not block:
+            break
+        f.write(block)
+        digest.update(block)
+        written += len(block)
+    return written, digest.hexdigest()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Queue the job of an "early" upload once its received prefix can be decoded on its own
+def start_early(upload):
+    if mp4_streamable(upload["path"]) and store.start_upload_job(
+            upload["id"], upload["id"], result_dir(upload["id"]), {**upload["options"], "growing": True}):
+        print(f"[INFO] Upload {upload['id']} queued for processing at {upload['received']} bytes")
+
+# API endpoint to start a resumable upload: JSON with filename, size, optional sha256 and processing options
+@api.route("/api/v1/uploads", methods=["POST"])
+def create_upload():
+    body = request.get_json(silent=True) or {}
+    if not allowed_file(str(body.get("filename", ""))):
+        return jsonify({"error": "Invalid file type"}), 400
+    try:
+        size = int(body.get("size"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "size must be the file size in bytes"}), 400
+    if size <= 0 or size > MAX_UPLOAD_SIZE:
+        return jsonify({"error": "File too large"}), 413
+    sha256 = body.get("sha256")
+    if sha256 is not None and not re.fullmatch(r"[0-9a-fA-F]{64}", str(sha256)):
+        return jsonify({"error": "sha256 must be 64 hex digits"}), 400
+
+    options, error = read_options(body)
+    if error:
+        return jsonify({"error": error}), 400
+    if queue_full():
+        return busy_response()
+
+    # The file grows in place as chunks arrive
+    upload_id = uuid.uuid4().hex
+    filepath = os.path.abspath(os.path.join(UPLOAD_FOLDER, f"{upload_id}.mp4"))
+    open(filepath, "wb").close()
+    store.create_upload(upload_id, filepath, size, sha256.lower() if sha256 else None, options,
+                        early=bool(body.get("early")))
+    return jsonify({"upload_id": upload_id, "offset": 0, "chunk_size": UPLOAD_CHUNK_SIZE}), 201
+
+# API endpoint with the offset to resume an upload from (HEAD works too)
+@api.route("/api/v1/uploads/<upload_id>", methods=["GET"])
+def upload_offset(upload_id):
+    upload = store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return offset_response(upload)
+
+# API endpoint to write one chunk at the Upload-Offset header, optionally checked against Upload-Checksum
+@api.route("/api/v1/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    upload = store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset header required"}), 400
+    length = request.content_length
+    if length is None:
+        return jsonify({"error": "Content-Length required"}), 411
+    if offset + length > upload["size"]:
+        return offset_response(upload, "Chunk ends past the declared size", 413)
+    checksum = request.headers.get("Upload-Checksum", "").lower()  # sha256 hex of this chunk
+
+    with open(upload["path"], "r+b") as f:
+        # One writer per upload, across threads and front processes
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return offset_response(upload, "Another chunk of this upload is being written", 409)
+        upload = store.get_upload(upload_id)
+        if upload is None or upload["status"] != RECEIVING:
+            return jsonify({"error": "Upload is not receiving data"}), 409
+        if offset != upload["received"]:
+            return offset_response(upload, "Offset does not match the received size", 409)
+
+        written, digest = copy_body(f, offset, length)
+        if checksum and (written < length or digest != checksum):
+            f.truncate(offset)
+            return offset_response(upload, "Checksum mismatch", 400)
+        f.flush()
+        os.fsync(f.fileno())
+        store.set_received(upload_id, offset + written)
+
+    upload = store.get_upload(upload_id)
+    if upload["early"] and upload["job_id"] is None:
+        start_early(upload)
+    return offset_response(upload)
+
+# API endpoint to finish a resumable upload, queues its job (or lets the early job run to the end)
+@api.route("/api/v1/uploads/<upload_id>/finalize", methods=["POST"])
+def finalize_upload(upload_id):
+    upload = store.get_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    if upload["status"] == COMPLETE:
+        return jsonify({"job_id": upload["job_id"]}), 200  # Retried finalize
+    if upload["status"] != RECEIVING:
+        return jsonify({"error": "Upload failed"}), 409
+    if upload["received"] != upload["size"]:
+        return offset_response(upload, "Upload is incomplete", 409)
+
+    # Reads the whole file once; per-chunk checksums catch corruption while uploading
+    if upload["sha256"] and file_sha256(upload["path"]) != upload["sha256"]:
+        store.set_upload_status(upload_id, FAILED)
+        if upload["job_id"] is None:
+            os.remove(upload["path"])
+        return jsonify({"error": "Checksum mismatch, upload the file again"}), 400
+
+    store.start_upload_job(upload_id, upload_id, result_dir(upload_id), upload["options"])
+    store.set_upload_status(upload_id, COMPLETE)
+    return jsonify({"job_id": upload_id}), 200
+
+# API endpoint with queue depth and wait time of the processing jobs
+@api.route("/api/v1/jobs", methods=["GET"])
+def job_stats():
+    return jsonify({
+        **store.snapshot(),
+        "max_queue": MAX_JOB_QUEUE,
+        "max_workers": JOB_WORKERS,
+        "rejected": rejected_jobs,
+        "pool": pool.snapshot(),
+        "workers": store.workers(alive_within=WORKER_STALE_AFTER),
+    }), 200
+
+# Gauges and counters for /metrics, read from the job store at scrape time
+@REGISTRY.collector
+def collect_metrics():
+    stats = store.snapshot()
+    workers = store.workers(alive_within=WORKER_STALE_AFTER)
+    return [
+        ("watchman_jobs_queue_depth", "gauge", "Jobs waiting for a worker", [({}, stats["queue_depth"])]),
+        ("watchman_jobs_running", "gauge", "Jobs being processed", [({}, stats["running"])]),
+        ("watchman_jobs", "gauge", "Finished jobs still in the store, by outcome",
+         [({"outcome": "completed"}, stats["completed"]), ({"outcome": "failed"}, stats["failed"])]),
+        ("watchman_jobs_rejected_total", "counter", "Uploads refused by this front with a full queue",
+         [({}, rejected_jobs)]),
+        ("watchman_job_wait_seconds_max", "gauge", "Longest wait of a job in the store before a worker took it",
+         [({}, stats["wait_ms"]["max"] / 1000)]),
+        ("watchman_worker_busy", "gauge", "1 while the worker processes a job",
+         [({"worker": worker["id"]}, worker["state"] == "busy") for worker in workers]),
+        ("watchman_worker_restarts_total", "counter", "Worker processes of this front restarted after dying",
+         [({}, pool.snapshot()["restarts"])]),
+    ]
+
+# Prometheus metrics: the stage, job and ffmpeg histograms of every live worker (from
+# their heartbeats, labelled worker="<id>") and the job queue. This process does no
+# processing, its own histograms stay empty and are left out.
+@api.route("/metrics", methods=["GET"])
+def metrics():
+    workers = store.workers(alive_within=WORKER_STALE_AFTER)
+    histograms = merge_snapshots({worker["id"]: worker["info"].get("metrics", {}) for worker in workers}, "worker")
+    return Response(format_histograms(histograms) + format_samples(REGISTRY.collect()), content_type=CONTENT_TYPE)
+
+# Start sampling the stacks of every thread of this front, e.g. {"interval_ms": 5, "seconds": 30}
+@api.route("/api/v1/profiler/start", methods=["POST"])
+def profiler_start():
+    data = request.get_json(silent=True) or {}
+    try:
+        interval = float(data.get("interval_ms", PROFILER_INTERVAL * 1000)) / 1000
+        seconds = float(data.get("seconds", PROFILER_SECONDS))
+    except (TypeError, ValueError):
+        return jsonify({"error": "interval_ms and seconds must be numbers"}), 400
+    if not 0.001 <= interval <= 1.0 or not 0 < seconds <= PROFILER_MAX_SECONDS:
+        return jsonify({"error": f"interval_ms must be 1 - 1000, seconds 0 - {PROFILER_MAX_SECONDS:g}"}), 400
+    if not profiler.start(interval, seconds):
+        return jsonify({"error": "A profile is already running"}), 409
+    return jsonify(profiler.snapshot()), 200
+
+@api.route("/api/v1/profiler/stop", methods=["POST"])
+def profiler_stop():
+    profiler.stop()
+    return jsonify(profiler.snapshot()), 200
+
+# The last profile as folded stacks, for speedscope or flamegraph.pl
+@api.route("/api/v1/profiler", methods=["GET"])
+def profiler_stacks():
+    if request.args.get("format") == "json":
+        return jsonify(profiler.snapshot()), 200
+    return Response(profiler.collapsed(), mimetype="text/plain")
+
+# Readiness: 200 once at least one worker has its model warm, 503 before
+@api.route("/api/v1/ready", methods=["GET"])
+def readiness():
+    workers = store.workers(alive_within=WORKER_STALE_AFTER)
+    ready = any(worker["info"].get("model", {}).get("ready") for worker in workers)
+    if ready:
+        startup.mark("worker_ready")
+    return jsonify({
+        "ready": ready,
+        "workers": workers,
+        "startup": startup.snapshot(),
+    }), 200 if ready else 503
+
+# Application factory, cheap: folders and routes only, worker processes load the model
+def create_app(start_workers=True):
+    app = Flask(__name__)
+    # Enable Cross-Origin Resource Sharing (CORS) for the app, with the headers of range and resumable uploads
+    CORS(app, expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "ETag", "Upload-Offset"])
+
+    # Create necessary directories if they don't exist
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(PROCESSED_FOLDER, exist_ok=True)
+    os.makedirs(PREDICT_SAVE_FOLDER, exist_ok=True)
+    app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_SIZE
+
+    app.register_blueprint(api)
+    startup.mark("app_created")
+    if start_workers:
+        pool.start()
+        janitor.start()
+    return app
+
 # Run the Flask application
 if __name__ == "__main__":
+    app = create_app()
     app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,101 @@
+# Scaling of chunk-parallel processing: wall time of one long upload against
+# the number of chunk processes (1 = the whole video in one process).
+#
+# Every run is its own process, so model loads and peak RSS are not shared.
+# The frame count of the annotated output is checked against the source, so
+# duplicated or missing frames at chunk boundaries show up as "frames ok: False".
+# python benchmarks/bench_chunks.py sample_30min.mp4 --workers 1 2 4 8 [--mode highlights]
+# python benchmarks/bench_chunks.py --synthetic 1800 sample_30min.mp4   # make a 30 minute test clip first
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def make_synthetic(path, seconds):
+    subprocess.run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=640x480:rate=25:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-g", "50", "-pix_fmt", "yuv420p", path
+    ], check=True)
+
+
+def run_child(video, mode, workers):
+    os.chdir(API_DIR)
+    sys.path.insert(0, API_DIR)
+    import processing
+    from chunks import count_frames
+
+    processing.CHUNK_WORKERS = workers
+    out_dir = tempfile.mkdtemp(prefix="watchman_bench_")
+    mp4_path = os.path.join(out_dir, "out.mp4")
+
+    started = time.monotonic()
+    if mode == "full":
+        ok = processing.render_detections(video, mp4_path)
+        frames_ok = ok and count_frames(mp4_path) == math.ceil(count_frames(video) / processing.VID_STRIDE)
+        extra = {}
+    else:
+        times, duration, stride = processing.detect_person_times(video)
+        ok, frames_ok = True, None
+        extra = {"detections": len(times), "chunks": stride.get("chunks", 1)}
+    wall = time.monotonic() - started
+
+    print(json.dumps({"workers": workers, "ok": ok, "frames_ok": frames_ok, "wall": wall, **extra}))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def run_parent(video, mode, workers):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), video, "--mode", mode,
+         "--workers", str(workers), "--child"],
+        stdout=subprocess.PIPE,
+    )
+    output = proc.stdout.read()
+    _, _, usage = os.wait4(proc.pid, 0)
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    # Children of the run (chunk processes, ffmpeg) are counted in ru_*
+    result["cpu"] = usage.ru_utime + usage.ru_stime
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--mode", choices=["full", "highlights"], default="full")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--synthetic", type=float, help="Create the video first, this many seconds long")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    video = os.path.abspath(args.video)
+
+    if args.child:
+        run_child(video, args.mode, args.workers[0])
+        return 0
+    if args.synthetic:
+        make_synthetic(video, args.synthetic)
+
+    print(f"cores: {os.cpu_count()}")
+    print(f"{'workers':>8}{'ok':>6}{'frames ok':>11}{'wall s':>10}{'cpu s':>10}{'speedup':>9}{'efficiency':>12}")
+    baseline = None
+    for workers in args.workers:
+        result = run_parent(video, args.mode, workers)
+        # Speedup and efficiency relative to the first (smallest) worker count
+        if baseline is None:
+            baseline = result["wall"]
+        speedup = baseline / result["wall"]
+        efficiency = speedup / (workers / args.workers[0])
+        print(f"{workers:>8}{str(result['ok']):>6}{str(result['frames_ok']):>11}"
+              f"{result['wall']:>10.1f}{result['cpu']:>10.1f}{speedup:>9.2f}{efficiency:>12.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+# Compare wall time and peak RSS of the two upload processing paths:
+#   streaming - model.predict(stream=True) piped into one H.264 encode
+#   legacy    - model(save=True) into an AVI, then ffmpeg re-encode to MP4
+#
+# Each path runs in its own process so the peak RSS is not shared.
+# python benchmarks/bench_process.py sample.mp4 [--mode both|streaming|legacy]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def run_child(video, mode):
+    # Runs inside the child process, from the API directory (model + folders)
+    os.chdir(API_DIR)
+    sys.path.insert(0, API_DIR)
+    import processing
+
+    mp4_path = os.path.join(tempfile.mkdtemp(prefix="watchman_bench_"), "out.mp4")
+    started = time.monotonic()
+    if mode == "streaming":
+        rendered = processing.render_detections(video, mp4_path)
+    else:
+        rendered = processing.render_detections_legacy(video, mp4_path, f"bench_{os.getpid()}")
+    wall = time.monotonic() - started
+
+    size = os.path.getsize(mp4_path) if os.path.exists(mp4_path) else 0
+    print(json.dumps({"mode": mode, "ok": rendered, "wall": wall, "bytes": size}))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def run_parent(video, mode):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), video, "--mode", mode, "--child"],
+        stdout=subprocess.PIPE,
+    )
+    output = proc.stdout.read()
+    _, _, usage = os.wait4(proc.pid, 0)
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_mb"] = usage.ru_maxrss / 1024
+    result["cpu"] = usage.ru_utime + usage.ru_stime
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video")
+    parser.add_argument("--mode", choices=["both", "streaming", "legacy"], default="both")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    video = os.path.abspath(args.video)
+
+    if args.child:
+        run_child(video, args.mode)
+        return 0
+
+    modes = ["streaming", "legacy"] if args.mode == "both" else [args.mode]
+    print(f"{'mode':<11}{'ok':>5}{'wall s':>10}{'cpu s':>10}{'peak MB':>10}{'out MB':>10}")
+    for mode in modes:
+        result = run_parent(video, mode)
+        print(f"{mode:<11}{str(result['ok']):>5}"
+              f"{result['wall']:>10.1f}{result['cpu']:>10.1f}"
+              f"{result['peak_rss_mb']:>10.0f}{result['bytes'] / 1e6:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
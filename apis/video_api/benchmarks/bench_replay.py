@@ -0,0 +1,118 @@
+# Run a video file through the upload job path (processing.process_video, as
+# a worker runs it) with no server, queue or network, and report frames per
+# second of video, p50/p99 time per sampled frame (decode to encode), peak
+# RSS, CPU seconds (ffmpeg and chunk processes included), bytes written and,
+# for highlights with --labels ([{"start": s, "end": s}, ...] person events
+# in seconds), event recall of the timeline's segments.
+#
+# The per-frame times come from the job's progress callback, which long
+# uploads split into chunks only call per chunk: they are left out then
+# (--chunk-workers 1 processes in one piece). --baseline compares with the
+# results stored by --save-baseline and exits with 1 on a regression.
+#
+# python benchmarks/bench_replay.py sample.mp4 --mode highlights --labels sample.json --baseline baselines.json
+# python benchmarks/bench_replay.py --synthetic 600 --chunk-workers 4
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.join(API_DIR, ".."))
+from common.backends import default_weights  # noqa: E402
+from common.replay import (Usage, check_baseline, event_recall, latency_stats, load_events,  # noqa: E402
+                           print_result, synthetic_video)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video", nargs="?")
+    parser.add_argument("--synthetic", type=float, help="Seconds of a generated test pattern instead of a file")
+    parser.add_argument("--mode", choices=["full", "highlights"], default="full")
+    parser.add_argument("--annotate", action="store_true", help="Draw boxes on the highlights")
+    parser.add_argument("--zones", help="JSON polygons in fractions of the frame")
+    parser.add_argument("--zone-tiles", action="store_true")
+    parser.add_argument("--chunk-workers", type=int, help="Override CHUNK_WORKERS, 1 disables splitting")
+    parser.add_argument("--labels", help="JSON list of {start, end} person events in seconds")
+    parser.add_argument("--baseline", help="JSON file with baseline results")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--name", help="Baseline entry, default video:<mode>:<video name>")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+    if not args.video and not args.synthetic:
+        parser.error("a video or --synthetic is needed")
+
+    workdir = tempfile.mkdtemp(prefix="watchman_replay_")
+    video = os.path.abspath(args.video) if args.video else synthetic_video(
+        os.path.join(workdir, "synthetic.mp4"), args.synthetic)
+    # The job deletes its upload, it gets a link (or copy) made before the measurement
+    upload = os.path.join(workdir, "upload.mp4")
+    try:
+        os.link(video, upload)
+    except OSError:
+        shutil.copyfile(video, upload)
+
+    backend = os.environ.get("WATCHMAN_BACKEND", "pytorch")
+    os.environ.setdefault("WATCHMAN_WEIGHTS", os.path.join(API_DIR, default_weights(backend)))
+    import processing
+    if args.chunk_workers:
+        processing.CHUNK_WORKERS = args.chunk_workers
+
+    cap = cv2.VideoCapture(upload)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    cap.release()
+    chunked = processing.use_chunks(total / fps)
+    processing.model.warm_up()
+
+    # One progress call per sampled frame; the time between two is that frame's
+    calls = []
+
+    def progress(fraction):
+        calls.append(time.monotonic())
+
+    usage = Usage().start()
+    calls.append(usage.started)
+    options = {"mode": args.mode, "annotate": args.annotate,
+               "zones": json.loads(args.zones) if args.zones else None, "zone_tiles": args.zone_tiles}
+    ok = processing.process_video(upload, os.path.join(workdir, "result"), "replay", progress=progress, **options)
+    measured = usage.stop()
+
+    result_dir = os.path.join(workdir, "result")
+    latencies = [] if chunked else [b - a for a, b in zip(calls, calls[1:-1])]  # The last call is the 100%
+    result = {
+        "video": os.path.basename(video),
+        "mode": args.mode,
+        "ok": ok,
+        "frames": total,
+        "chunked": chunked,
+        "fps": total / measured["wall_s"] if measured["wall_s"] > 0 else None,
+        "sampled": len(latencies) or None,
+        **latency_stats(latencies),
+        **measured,
+        "result_mb": sum(os.path.getsize(os.path.join(result_dir, name)) for name in os.listdir(result_dir)) / 1e6,
+        "recall": None,
+    }
+    if args.labels and args.mode == "highlights":
+        with open(os.path.join(result_dir, "timeline.json")) as f:
+            segments = [(s["start"], s["end"]) for s in json.load(f)["segments"]]
+        result["recall"], missed, false = event_recall(load_events(args.labels), segments)
+        result["missed_events"] = len(missed)
+        result["false_segments"] = len(false)
+    print_result(result)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.baseline:
+        name = args.name or f"video:{args.mode}:{result['video']}"
+        return 1 if check_baseline(name, result, args.baseline, args.tolerance, args.save_baseline) else 0
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
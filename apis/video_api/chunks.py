@@ -0,0 +1,50 @@
+import glob
+import os
+import subprocess
+
+from common.metrics import FFMPEG_SECONDS
+
+
+def split_at_keyframes(src, chunk_seconds, workdir, preexec_fn=None):
+    """Split the video stream of src into pieces of about chunk_seconds.
+
+    The segment muxer copies packets and only cuts on a keyframe at or after
+    each multiple of chunk_seconds, so every frame ends up in exactly one
+    piece and each piece decodes on its own.
+    """
+    pattern = os.path.join(workdir, "chunk_%05d.mp4")
+    with FFMPEG_SECONDS.labels("split").time():
+        subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error", "-i", src,
+            "-map", "0:v:0", "-c", "copy",
+            "-f", "segment", "-segment_time", f"{chunk_seconds:.3f}", "-reset_timestamps", "1",
+            pattern
+        ], check=True, preexec_fn=preexec_fn)
+    return sorted(glob.glob(os.path.join(workdir, "chunk_*.mp4")))
+
+
+def count_frames(path):
+    """Number of video frames, counted from the packets without decoding"""
+    with FFMPEG_SECONDS.labels("probe").time():
+        out = subprocess.run([
+            "ffprobe", "-v", "error", "-select_streams", "v:0", "-count_packets",
+            "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0", path
+        ], check=True, capture_output=True, text=True).stdout
+    return int(out.strip().split(",")[0])
+
+
+def concat_pieces(pieces, out_path, preexec_fn=None):
+    """Join MP4 pieces with identical encoding settings without re-encoding"""
+    list_path = f"{out_path}.pieces.txt"
+    with open(list_path, "w") as f:
+        for piece in pieces:
+            f.write(f"file '{os.path.abspath(piece)}'\n")
+    try:
+        with FFMPEG_SECONDS.labels("concat").time():
+            subprocess.run([
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-c", "copy", "-movflags", "+faststart", out_path
+            ], check=True, preexec_fn=preexec_fn)
+    finally:
+        os.remove(list_path)
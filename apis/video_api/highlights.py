@@ -0,0 +1,47 @@
+import os
+import subprocess
+import tempfile
+
+from chunks import concat_pieces
+from common.metrics import FFMPEG_SECONDS
+
+
+def merge_segments(detection_times, padding, merge_gap, duration):
+    """Turn person timestamps into padded (start, end) ranges, merging close ones"""
+    segments = []
+    for t in sorted(detection_times):
+        start = max(0.0, t - padding)
+        end = min(duration, t + padding) if duration else t + padding
+        if segments and start - segments[-1][1] <= merge_gap:
+            segments[-1][1] = max(segments[-1][1], end)
+        else:
+            segments.append([start, end])
+    return [(round(float(start), 3), round(float(end), 3)) for start, end in segments]
+
+
+def cut_segments(src, segments, out_path, preexec_fn=None):
+    """Copy the given time ranges of src into out_path without re-encoding.
+
+    Each range is cut with ``-c copy``; because ffmpeg can only start a
+    copied stream on a keyframe, a range begins at the keyframe at or before
+    its start. The pieces are then joined with the concat demuxer.
+    """
+    workdir = tempfile.mkdtemp(prefix="highlights_", dir=os.path.dirname(out_path) or None)
+    pieces = []
+    try:
+        for i, (start, end) in enumerate(segments):
+            piece = os.path.join(workdir, f"{i:05d}.mp4")
+            with FFMPEG_SECONDS.labels("cut").time():
+                subprocess.run([
+                    "ffmpeg", "-y", "-loglevel", "error",
+                    "-ss", f"{start:.3f}", "-i", src, "-t", f"{end - start:.3f}",
+                    "-map", "0:v", "-map", "0:a?", "-c", "copy",
+                    "-avoid_negative_ts", "make_zero", piece
+                ], check=True, preexec_fn=preexec_fn)
+            pieces.append(piece)
+
+        concat_pieces(pieces, out_path, preexec_fn=preexec_fn)
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
@@ -0,0 +1,309 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    options TEXT NOT NULL,
+    upload_path TEXT NOT NULL,
+    result_dir TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    error TEXT,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    info TEXT,
+    started_at REAL NOT NULL,
+    heartbeat REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    received INTEGER NOT NULL DEFAULT 0,
+    sha256 TEXT,
+    options TEXT NOT NULL,
+    early INTEGER NOT NULL DEFAULT 0,
+    job_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Job states: queued -> running -> done / failed
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Upload states: receiving -> complete / failed
+RECEIVING = "receiving"
+COMPLETE = "complete"
+
+
+class JobStore:
+    """Upload jobs in a SQLite file shared by every front and worker process.
+
+    Each thread opens its own connection on first use, so importing or
+    creating a store does not touch the disk. The database runs in WAL mode
+    so status polls never block the workers' writes, and a job is claimed in
+    one IMMEDIATE transaction so two workers never get the same one.
+    Timestamps are wall clock (time.time()) because they are compared
+    across processes.
+    """
+
+    def __init__(self, path, busy_timeout=10.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def create(self, job_id, upload_path, result_dir, options):
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, options, upload_path, result_dir, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(options), upload_path, result_dir, time.time()),
+        )
+
+    def get(self, job_id):
+        return self._job(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def claim(self, worker_id):
+        """Oldest queued job, marked running for this worker; None when the queue is empty"""
+        def claim(conn):
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, started_at = ?, progress = 0, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, worker_id, time.time(), row["id"]),
+            )
+            return row["id"]
+
+        job_id = self._transaction(claim)
+        return self.get(job_id) if job_id else None
+
+    def set_progress(self, job_id, fraction):
+        self._conn().execute("UPDATE jobs SET progress = ? WHERE id = ?", (fraction, job_id))
+
+    def finish(self, job_id, ok, ttl, error=None):
+        now = time.time()
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, error = ?, progress = CASE WHEN ? THEN 1 ELSE progress END, "
+            "finished_at = ?, expires_at = ? WHERE id = ?",
+            (DONE if ok else FAILED, error, ok, now, now + ttl, job_id),
+        )
+
+    def delete(self, job_id):
+        self._conn().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def count(self, status):
+        return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def expired(self, now=None):
+        now = time.time() if now is None else now
+        rows = self._conn().execute(
+            "SELECT * FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def requeue_stale(self, stale_after, max_attempts, ttl):
+        """Put running jobs of dead workers back in the queue, fail them after max_attempts.
+
+        Returns (requeued, failed) job ids.
+        """
+        now = time.time()
+
+        def requeue(conn):
+            rows = conn.execute(
+                "SELECT j.id, j.attempts FROM jobs j LEFT JOIN workers w ON w.id = j.worker "
+                "WHERE j.status = ? AND (w.heartbeat IS NULL OR w.heartbeat < ?)",
+                (RUNNING, now - stale_after),
+            ).fetchall()
+            requeued, failed = [], []
+            for row in rows:
+                if row["attempts"] >= max_attempts:
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? WHERE id = ?",
+                        (FAILED, "Worker died while processing", now, now + ttl, row["id"]),
+                    )
+                    failed.append(row["id"])
+                else:
+                    conn.execute("UPDATE jobs SET status = ?, worker = NULL WHERE id = ?", (QUEUED, row["id"]))
+                    requeued.append(row["id"])
+            return requeued, failed
+
+        return self._transaction(requeue)
+
+    # Worker processes report their state here, read by /api/v1/ready
+    def heartbeat(self, worker_id, pid, state, info=None):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO workers (id, pid, state, info, started_at, heartbeat) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET state = excluded.state, info = excluded.info, "
+            "heartbeat = excluded.heartbeat",
+            (worker_id, pid, state, json.dumps(info or {}), now, now),
+        )
+
+    def remove_worker(self, worker_id):
+        self._conn().execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def workers(self, alive_within=None):
+        query, args = "SELECT * FROM workers", ()
+        if alive_within is not None:
+            query, args = query + " WHERE heartbeat >= ?", (time.time() - alive_within,)
+        workers = []
+        for row in self._conn().execute(query + " ORDER BY id", args).fetchall():
+            worker = dict(row)
+            worker["info"] = json.loads(worker["info"] or "{}")
+            workers.append(worker)
+        return workers
+
+    def prune_workers(self, stale_after):
+        self._conn().execute("DELETE FROM workers WHERE heartbeat < ?", (time.time() - stale_after,))
+
+    def acquire_lease(self, name, owner, ttl):
+        """True while ``owner`` holds the named lease, renewing it; used to elect one janitor"""
+        now = time.time()
+
+        def acquire(conn):
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row["owner"] != owner and row["expires_at"] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, owner, now + ttl),
+            )
+            return True
+
+        return self._transaction(acquire)
+
+    # Resumable uploads: the file is written by the fronts, the row tracks how much of it is on disk
+    def create_upload(self, upload_id, path, size, sha256, options, early=False):
+        now = time.time()
+        self._conn().execute(
+            "INSERT INTO uploads (id, status, path, size, sha256, options, early, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (upload_id, RECEIVING, path, size, sha256, json.dumps(options), int(early), now, now),
+        )
+
+    def get_upload(self, upload_id):
+        return self._job(self._conn().execute("SELECT * FROM uploads WHERE id = ?", (upload_id,)).fetchone())
+
+    def upload_progress(self, upload_id):
+        """(status, bytes received), (None, 0) once the upload has been removed"""
+        row = self._conn().execute("SELECT status, received FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+        return (row["status"], row["received"]) if row else (None, 0)
+
+    def set_received(self, upload_id, received):
+        self._conn().execute(
+            "UPDATE uploads SET received = ?, updated_at = ? WHERE id = ?", (received, time.time(), upload_id)
+        )
+
+    def set_upload_status(self, upload_id, status):
+        self._conn().execute(
+            "UPDATE uploads SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), upload_id)
+        )
+
+    def start_upload_job(self, upload_id, job_id, result_dir, options):
+        """Create the upload's job once; False when it already has one (another front got there first)"""
+        def start(conn):
+            row = conn.execute("SELECT path, job_id FROM uploads WHERE id = ?", (upload_id,)).fetchone()
+            if row is None or row["job_id"] is not None:
+                return False
+            conn.execute(
+                "INSERT INTO jobs (id, status, options, upload_path, result_dir, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(options), row["path"], result_dir, time.time()),
+            )
+            conn.execute("UPDATE uploads SET job_id = ? WHERE id = ?", (job_id, upload_id))
+            return True
+
+        return self._transaction(start)
+
+    def stale_uploads(self, idle_after):
+        """Uploads that stopped receiving data idle_after seconds ago"""
+        rows = self._conn().execute(
+            "SELECT * FROM uploads WHERE status = ? AND updated_at < ?", (RECEIVING, time.time() - idle_after)
+        ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def delete_upload(self, upload_id):
+        self._conn().execute("DELETE FROM uploads WHERE id = ?", (upload_id,))
+
+    def prune_uploads(self):
+        """Forget finished uploads whose job has been removed"""
+        self._conn().execute(
+            "DELETE FROM uploads WHERE status != ? AND (job_id IS NULL OR job_id NOT IN (SELECT id FROM jobs))",
+            (RECEIVING,),
+        )
+
+    def snapshot(self):
+        conn = self._conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        waits = [row[0] for row in conn.execute(
+            "SELECT started_at - created_at FROM jobs WHERE started_at IS NOT NULL ORDER BY started_at"
+        ).fetchall()]
+        return {
+            "queue_depth": counts.get(QUEUED, 0),
+            "running": counts.get(RUNNING, 0),
+            "completed": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "submitted": sum(counts.values()),
+            "wait_ms": {
+                "last": round(waits[-1] * 1000, 1) if waits else 0.0,
+                "avg": round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+                "max": round(max(waits) * 1000, 1) if waits else 0.0,
+            },
+        }
@@ -0,0 +1,12 @@
+# Job options shared by the Flask front and the workers. Kept apart from
+# processing.py so the front validates uploads without importing cv2 or the
+# model code.
+
+# Ultralytics predict output of the save=True path, created by the front
+PREDICT_SAVE_FOLDER = "predict"
+
+# Processing modes: "full" returns the whole video with boxes drawn,
+# "highlights" only the time ranges that contain persons
+PROCESSING_MODES = {"full", "highlights"}
+HIGHLIGHT_PADDING = 2.0  # Seconds kept before and after each detection
+HIGHLIGHT_MERGE_GAP = 3.0  # Ranges closer than this are joined
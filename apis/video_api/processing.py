@@ -0,0 +1,478 @@
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+# Modules shared with live_api live in apis/common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from common.backends import load_model
+from common.ffmpeg import FFmpegPipeWriter, ffmpeg_available
+from common.jobs import child_limits
+from common.metrics import FFMPEG_BUCKETS, FFMPEG_SECONDS, REGISTRY
+from common.stride import StrideController
+from common.warmup import LazyModel, StartupClock
+from common.zones import ZoneMask
+from chunks import concat_pieces, count_frames, split_at_keyframes
+from highlights import cut_segments, merge_segments
+from options import HIGHLIGHT_MERGE_GAP, HIGHLIGHT_PADDING, PREDICT_SAVE_FOLDER
+from streaming import GrowingFileCapture, probe_video
+
+# Video processing, run inside the worker processes (workers.py). Importing
+# this module is cheap, the model is only loaded by the first job or warm-up.
+
+# Startup milestones of this process (model loaded/ready), reported with the worker heartbeat
+startup = StartupClock()
+
+# Inference backend: "pytorch" (watchman_v3.pt), "onnx", "openvino",
+# "openvino-int8" or "onnxruntime" (ONNX without torch)
+MODEL_BACKEND = os.environ.get("WATCHMAN_BACKEND", "pytorch")
+MODEL_WEIGHTS = os.environ.get("WATCHMAN_WEIGHTS")  # Default name of the backend when unset
+
+# Detection settings
+VID_STRIDE = 2  # Process every second frame for efficiency
+
+# Adaptive stride for the highlights detection pass: every frame around
+# persons, up to every MAX_STRIDE-th frame on empty footage
+ADAPTIVE_STRIDE = True
+MIN_STRIDE = 1
+MAX_STRIDE = 8
+INFERENCE_LATENCY_BUDGET = None  # Seconds per frame, e.g. 0.3 on a Pi to back off under load
+STRIDE_IDLE_AFTER = 2.0  # Seconds of video without persons before skipping more frames
+STREAMING_PIPELINE = True  # Stream frames into one H.264 encode, False uses save=True + AVI re-encode (Ultralytics backends only)
+
+# Zones (the "zones" option): polygons in fractions of the frame, only their crop is inferred
+ZONE_PADDING = 0.02  # Share of the frame added around the zones' crop
+ZONE_TILE_SIZE = 640  # Source pixels per tile with the "zone_tiles" option
+
+# Long uploads are split at keyframes and the chunks processed in parallel processes
+CHUNK_WORKERS = int(os.environ.get("WATCHMAN_CHUNK_WORKERS", max(1, (os.cpu_count() or 1) // 2)))  # 1 disables splitting
+CHUNK_SECONDS = 120.0  # Target chunk length, each cut lands on the next keyframe
+CHUNK_MIN_SECONDS = 300.0  # Shorter uploads are processed in one piece
+CHUNK_THREADS = None  # Inference threads per chunk process, cores / CHUNK_WORKERS when unset
+
+# ffmpeg child limits
+FFMPEG_NICE = 10  # Below live_api's ffmpeg children when both run on one box
+FFMPEG_CPUS = None  # e.g. {2, 3} to pin ffmpeg to some cores
+
+# The person model, loaded once per worker process
+model = LazyModel(lambda: load_model(MODEL_BACKEND, MODEL_WEIGHTS), warmup=True, clock=startup,
+                  imgsz=320, device="cpu")
+
+ffmpeg_limits = child_limits(nice=FFMPEG_NICE, cpus=FFMPEG_CPUS)
+
+# Metrics of this process, sent to the fronts with the worker heartbeat. Stages
+# are timed per sampled frame: decode, inference (with pre/postprocessing),
+# annotate (drawing the boxes) and encode (handing the frame to ffmpeg).
+# Chunk processes keep their own registry, their frames are not counted here.
+STAGE_SECONDS = REGISTRY.histogram("watchman_stage_seconds", "Wall time of a processing stage for one frame",
+                                   ("stage",))
+STAGES = {stage: STAGE_SECONDS.labels(stage) for stage in ("decode", "inference", "annotate", "encode")}
+JOB_SECONDS = REGISTRY.histogram("watchman_job_seconds", "Wall time of a processing job", ("mode", "result"),
+                                 FFMPEG_BUCKETS)
+
+def new_stride_controller():
+    if not ADAPTIVE_STRIDE:
+        return StrideController.fixed(VID_STRIDE)
+    return StrideController(
+        initial=VID_STRIDE,
+        min_stride=MIN_STRIDE,
+        max_stride=MAX_STRIDE,
+        latency_budget=INFERENCE_LATENCY_BUDGET,
+        idle_after=STRIDE_IDLE_AFTER,
+        step_interval=0.5,
+    )
+
+# Progress callbacks take the done share of a step, 0.0 - 1.0
+def report(progress, fraction):
+    if progress is not None:
+        progress(min(1.0, fraction))
+
+# Map the progress of one step onto [start, end] of the whole job
+def scaled(progress, start, end):
+    if progress is None:
+        return None
+    return lambda fraction: progress(start + (end - start) * fraction)
+
+# Function to convert AVI video to MP4 format
+def convert_to_mp4(avi_path, mp4_path):
+    try:
+        cmd = [
+            "ffmpeg", "-i", avi_path, "-c:v", "libx264", "-preset", "fast", "-crf", "23",
+            "-c:a", "aac", "-b:a", "128k", mp4_path
+        ]
+        with FFMPEG_SECONDS.labels("convert").time():
+            subprocess.run(cmd, check=True, preexec_fn=ffmpeg_limits)  # Run ffmpeg command to convert video
+        return True
+    except subprocess.CalledProcessError as e:
+        print(f"Error converting {avi_path} to MP4: {e}")
+        return False
+
+# Function to render detections with Ultralytics' save=True and an AVI re-encode (previous path)
+def render_detections_legacy(filepath, mp4_path, job_id):
+    """Collects all results in memory, saves an annotated AVI and converts it to MP4"""
+    model(
+        source=filepath,     # Input video path
+        classes=[0],         # Detect only "person" class (class ID 0)
+        imgsz=320,           # Set image size for YOLO
+        conf=0.5,            # Confidence threshold
+        iou=0.45,            # Intersection over Union (IoU) threshold
+        device="cpu",        # Run on CPU
+        vid_stride=VID_STRIDE,  # Process every second frame for efficiency
+        save=True,           # Save output video
+        project=PREDICT_SAVE_FOLDER,  # Output directory
+        name=job_id,         # Output file name
+        verbose=False,
+        stream=False
+    )
+
+    # Locate the processed video output
+    predict_path = os.path.join(PREDICT_SAVE_FOLDER, job_id)
+    processed_video = None
+
+    if os.path.exists(predict_path):
+        for file in os.listdir(predict_path):
+            if file.endswith(".avi"):  # Check for AVI output file
+                processed_video = os.path.join(predict_path, file)
+                break
+
+    converted = processed_video is not None and convert_to_mp4(processed_video, mp4_path)
+    shutil.rmtree(predict_path, ignore_errors=True)
+    return converted
+
+# Seconds Ultralytics spent on a result (preprocess + inference + postprocess), None without .speed
+def result_seconds(result):
+    speed = getattr(result, "speed", None)
+    return sum(value or 0.0 for value in speed.values()) / 1000 if speed else None
+
+def detect_persons(frame, zones=None):
+    if zones is not None:
+        # Only the zones' crop (and tiles) is inferred, persons outside are dropped
+        return zones.predict(model, frame, classes=[0], imgsz=320, conf=0.5, iou=0.45, device="cpu", verbose=False)
+    return model.predict(
+        source=frame,
+        classes=[0],
+        imgsz=320,
+        conf=0.5,
+        iou=0.45,
+        device="cpu",
+        verbose=False
+    )[0]
+
+def use_chunks(duration):
+    return CHUNK_WORKERS > 1 and duration >= CHUNK_MIN_SECONDS and ffmpeg_available()
+
+# Runs first in every chunk process, before the model (and torch) is imported
+def init_chunk_process(threads):
+    for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    model.warm_up()
+
+# Function to run task(chunk_path, offset, *args) on every keyframe chunk of filepath in parallel
+def run_chunks(filepath, workdir, task, args, progress=None):
+    """Returns the task results in chunk order, or None when the chunks do not add
+    up to the frames of the source (the caller then processes it in one piece).
+    offset is the index of the chunk's first frame in the whole video, so
+    strides and timestamps continue across chunk boundaries."""
+    pieces = split_at_keyframes(filepath, CHUNK_SECONDS, workdir, preexec_fn=ffmpeg_limits)
+    counts = [count_frames(piece) for piece in pieces]
+    if not pieces or sum(counts) != count_frames(filepath):
+        print(f"[ERROR] Chunks of {filepath} do not add up to its frames, processing in one piece")
+        return None
+    offsets = [0] + list(itertools.accumulate(counts))[:-1]
+
+    workers = min(CHUNK_WORKERS, len(pieces))
+    threads = CHUNK_THREADS or max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_chunk_process, initargs=(threads,)) as pool:
+        futures = [pool.submit(task, piece, offset, *args) for piece, offset in zip(pieces, offsets)]
+        for done, _ in enumerate(as_completed(futures), 1):
+            report(progress, done / len(futures))
+        return [future.result() for future in futures]
+
+# Function to annotate every VID_STRIDE-th frame of a stream into one H.264 encode
+def render_frames(cap, out_path, fps, offset=0, total=0, progress=None, zones=None):
+    """Returns (ok, out_path or None when no frame was sampled).
+    offset is the index of the stream's first frame in the whole video, so the stride keeps its phase."""
+    writer = None
+    index = offset
+    try:
+        while True:
+            if index % VID_STRIDE:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            with STAGES["decode"].time():
+                success, frame = cap.read()
+            if not success:
+                break
+            index += 1
+
+            with STAGES["inference"].time():
+                results = detect_persons(frame, zones)
+            with STAGES["annotate"].time():
+                annotated = results.plot()
+            if writer is None:
+                writer = FFmpegPipeWriter(
+                    out_path, fps, (annotated.shape[1], annotated.shape[0]),
+                    preset="fast", movflags="+faststart", preexec_fn=ffmpeg_limits
+                )
+            with STAGES["encode"].time():
+                writer.write(annotated)
+            if total:
+                report(progress, (index - offset) / total)
+    finally:
+        cap.release()
+    if writer is None:
+        return True, None
+    return writer.release() == 0, out_path
+
+# Chunk task: annotate every VID_STRIDE-th frame, counted from the start of the whole video
+def render_chunk(chunk_path, offset, fps, zones=None):
+    """Returns (ok, path of the annotated piece or None when no frame of the chunk is sampled)"""
+    return render_frames(cv2.VideoCapture(chunk_path), f"{chunk_path[:-len('.mp4')]}_out.mp4", fps, offset,
+                         zones=zones)
+
+# Chunk task: person timestamps of one chunk, on the whole video's timeline
+def detect_chunk(chunk_path, offset, fps, zones=None):
+    cap = cv2.VideoCapture(chunk_path)
+    try:
+        return scan_person_times(cap, fps, offset, zones=zones)
+    finally:
+        cap.release()
+
+# Function to render detections frame by frame into a single H.264 encode
+def render_detections(filepath, mp4_path, progress=None, zones=None):
+    """Streams decoded frames through YOLO and ffmpeg, memory stays flat for any video length"""
+    cap = cv2.VideoCapture(filepath)
+    source_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    fps = source_fps / VID_STRIDE
+    total = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+    cap.release()
+
+    if use_chunks(total / source_fps):
+        with tempfile.TemporaryDirectory(prefix="chunks_", dir=os.path.dirname(mp4_path)) as workdir:
+            outputs = run_chunks(filepath, workdir, render_chunk, (fps, zones), progress)
+            if outputs is not None:
+                if not all(ok for ok, _ in outputs):
+                    return False
+                concat_pieces([path for _, path in outputs if path], mp4_path, preexec_fn=ffmpeg_limits)
+                return True
+
+    if zones is not None:
+        # Crops are cut from decoded frames, Ultralytics' own video reader is not used
+        ok, path = render_frames(cv2.VideoCapture(filepath), mp4_path, fps, total=total, progress=progress,
+                                 zones=zones)
+        return ok and path is not None
+
+    writer = None
+    exit_code = None
+    try:
+        waited = time.monotonic()
+        for i, result in enumerate(model.predict(
+            source=filepath,
+            classes=[0],
+            imgsz=320,
+            conf=0.5,
+            iou=0.45,
+            device="cpu",
+            vid_stride=VID_STRIDE,
+            verbose=False,
+            stream=True          # Yield one result at a time instead of collecting them
+        )):
+            # Decoding happens inside the generator, it is the wait not spent on the model
+            gap = time.monotonic() - waited
+            inference = result_seconds(result)
+            inference = gap if inference is None else min(gap, inference)
+            STAGES["inference"].observe(inference)
+            STAGES["decode"].observe(gap - inference)
+            with STAGES["annotate"].time():
+                frame = result.plot()
+            if writer is None:
+                writer = FFmpegPipeWriter(
+                    mp4_path, fps, (frame.shape[1], frame.shape[0]),
+                    preset="fast", movflags="+faststart", preexec_fn=ffmpeg_limits
+                )
+            with STAGES["encode"].time():
+                writer.write(frame)
+            if total:
+                report(progress, (i + 1) * VID_STRIDE / total)
+            waited = time.monotonic()
+    finally:
+        if writer is not None:
+            exit_code = writer.release()
+    return exit_code == 0
+
+# Function to find the timestamps (seconds) of the frames of one stream that contain a person
+def scan_person_times(cap, fps, offset=0, total=0, progress=None, zones=None):
+    """Decodes the stream itself so the stride can adapt: dense around persons, sparse elsewhere.
+    offset is the index of the stream's first frame in the whole video."""
+    stride = new_stride_controller()
+
+    times = []
+    index = offset
+    skipped = 0
+    while True:
+        # Skipped frames are only grabbed, not decoded
+        if skipped + 1 < stride.stride:
+            if not cap.grab():
+                break
+            index += 1
+            skipped += 1
+            continue
+
+        with STAGES["decode"].time():
+            success, frame = cap.read()
+        if not success:
+            break
+        timestamp = index / fps
+        index += 1
+        skipped = 0
+
+        started = time.monotonic()
+        found = len(detect_persons(frame, zones).boxes) > 0
+        if found:
+            times.append(timestamp)
+        latency = time.monotonic() - started
+        STAGES["inference"].observe(latency)
+        # Offline the video's own timeline is the clock
+        stride.update(timestamp, latency, found)
+        if total:
+            report(progress, (index - offset) / total)
+
+    return times, stride.snapshot()
+
+# Function to find the timestamps (seconds) of the processed frames that contain a person
+def detect_person_times(filepath, progress=None, zones=None):
+    cap = cv2.VideoCapture(filepath)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    duration = total / fps
+
+    if use_chunks(duration):
+        cap.release()
+        with tempfile.TemporaryDirectory(prefix="chunks_", dir=os.path.dirname(os.path.abspath(filepath))) as workdir:
+            results = run_chunks(filepath, workdir, detect_chunk, (fps, zones), progress)
+        if results is not None:
+            times = [t for chunk_times, _ in results for t in chunk_times]
+            strides = [stride for _, stride in results]
+            return times, duration, {
+                **strides[-1],
+                "changes": sum(stride["changes"] for stride in strides),
+                "chunks": len(strides),
+            }
+        cap = cv2.VideoCapture(filepath)
+
+    times, stride = scan_person_times(cap, fps, total=total, progress=progress, zones=zones)
+    cap.release()
+    return times, duration, stride
+
+# Function to keep only the parts of the video that contain persons
+def render_highlights(filepath, mp4_path, timeline_path, padding, merge_gap, annotate, progress=None, zones=None):
+    """Cuts the person time ranges with stream copy, boxes are only drawn when annotate is set"""
+    times, duration, stride = detect_person_times(filepath, scaled(progress, 0.0, 0.5 if annotate else 0.9),
+                                                  zones)
+    return write_highlights(filepath, mp4_path, timeline_path, times, duration, stride,
+                            padding, merge_gap, annotate, scaled(progress, 0.5, 1.0), zones)
+
+# Function to write the timeline and the highlights video from the person timestamps
+def write_highlights(filepath, mp4_path, timeline_path, times, duration, stride, padding, merge_gap, annotate,
+                     progress=None, zones=None):
+    segments = merge_segments(times, padding, merge_gap, duration)
+
+    with open(timeline_path, "w") as f:
+        json.dump({
+            "duration": round(duration, 3),
+            "kept": round(sum(end - start for start, end in segments), 3),
+            "segments": [{"start": start, "end": end} for start, end in segments],
+            "stride": stride,
+        }, f)
+
+    if not segments:
+        return True  # Nothing to keep, the timeline is the result
+
+    if not annotate:
+        cut_segments(filepath, segments, mp4_path, preexec_fn=ffmpeg_limits)
+        return True
+
+    # Only the kept ranges are annotated, so inference runs on the short cut
+    cut_path = os.path.join(os.path.dirname(mp4_path), "highlights_raw.mp4")
+    cut_segments(filepath, segments, cut_path, preexec_fn=ffmpeg_limits)
+    try:
+        return render_detections(cut_path, mp4_path, progress, zones)
+    finally:
+        os.remove(cut_path)
+
+# Function to process an upload while it is still arriving (early start of a resumable upload)
+def render_growing(filepath, mp4_path, timeline_path, mode, padding, merge_gap, annotate, upload_state,
+                   progress=None, zones=None):
+    """Decodes the received prefix and waits for more bytes until the upload completes.
+    Only used for faststart/fragmented MP4s, whose header comes before the media data."""
+    width, height, fps, frames = probe_video(filepath)
+    cap = GrowingFileCapture(filepath, upload_state, width, height, preexec_fn=ffmpeg_limits)
+    try:
+        if mode == "highlights":
+            times, stride = scan_person_times(cap, fps, total=frames,
+                                              progress=scaled(progress, 0.0, 0.5 if annotate else 0.9), zones=zones)
+        else:
+            ok, path = render_frames(cap, mp4_path, fps / VID_STRIDE, total=frames, progress=progress, zones=zones)
+    finally:
+        cap.release()
+    if cap.aborted:
+        print(f"[ERROR] Upload of {os.path.basename(filepath)} stopped before it completed")
+        return False
+
+    if mode != "highlights":
+        return ok and path is not None
+    duration = (frames or count_frames(filepath)) / fps
+    return write_highlights(filepath, mp4_path, timeline_path, times, duration, stride,
+                            padding, merge_gap, annotate, scaled(progress, 0.5, 1.0), zones)
+
+# Function to process the uploaded video
+def process_video(filepath, result_dir, job_id, mode="full", padding=HIGHLIGHT_PADDING,
+                  merge_gap=HIGHLIGHT_MERGE_GAP, annotate=False, growing=False, upload_state=None,
+                  zones=None, zone_tiles=False, progress=None):
+    """Handles YOLO object detection and video processing inside a worker process.
+    growing jobs start before their upload completes, upload_state() reports its status.
+    zones are polygons in fractions of the frame, persons outside them are ignored."""
+    os.makedirs(result_dir, exist_ok=True)
+    mp4_file = os.path.join(result_dir, f"{job_id}.mp4")
+    timeline_file = os.path.join(result_dir, "timeline.json")
+
+    started = time.monotonic()
+    try:
+        if zones:
+            zones = ZoneMask(zones, padding=ZONE_PADDING, tile_size=ZONE_TILE_SIZE if zone_tiles else None)
+        if growing:
+            rendered = render_growing(filepath, mp4_file, timeline_file, mode, padding, merge_gap, annotate,
+                                      upload_state, progress, zones)
+        elif mode == "highlights":
+            rendered = render_highlights(filepath, mp4_file, timeline_file, padding, merge_gap, annotate,
+                                         progress, zones)
+        elif STREAMING_PIPELINE or zones:
+            rendered = render_detections(filepath, mp4_file, progress, zones)
+        else:
+            rendered = render_detections_legacy(filepath, mp4_file, job_id)
+    except Exception as e:
+        print(f"Error processing video {job_id}: {e}")
+        rendered = False
+    JOB_SECONDS.labels(mode, "done" if rendered else "failed").observe(time.monotonic() - started)
+
+    # Remove uploaded file after processing
+    try:
+        os.remove(filepath)
+    except Exception as e:
+        print(f"Error deleting uploaded video: {e}")
+
+    if rendered:
+        report(progress, 1.0)
+    return rendered
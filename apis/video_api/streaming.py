@@ -0,0 +1,123 @@
+import json
+import os
+import struct
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from common.metrics import FFMPEG_SECONDS
+
+
+def mp4_streamable(path):
+    """Whether an MP4 can be decoded from the start while the rest is still arriving.
+
+    True once the moov box (sample tables) is complete and comes before the
+    media data, as in faststart or fragmented files; False when mdat comes
+    first (ffmpeg needs the end of the file); None while the received
+    prefix is too short to tell.
+    """
+    with open(path, "rb") as f:
+        available = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + 8 <= available:
+            f.seek(offset)
+            header = f.read(16)
+            size, kind = struct.unpack(">I4s", header[:8])
+            if size == 1:
+                if len(header) < 16:
+                    return None
+                size = struct.unpack(">Q", header[8:16])[0]
+            elif size == 0:
+                return False  # Box runs to the end of the file
+            if size < 8:
+                return False
+            if kind == b"mdat":
+                return False
+            if kind == b"moov":
+                return True if offset + size <= available else None
+            offset += size
+    return None
+
+
+def probe_video(path):
+    """(width, height, fps, frame count) from the container header; frames is 0 when unknown"""
+    with FFMPEG_SECONDS.labels("probe").time():
+        out = subprocess.run([
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height,avg_frame_rate,nb_frames", "-of", "json", path
+        ], check=True, capture_output=True, text=True).stdout
+    stream = json.loads(out)["streams"][0]
+    num, den = (int(x) for x in stream.get("avg_frame_rate", "0/0").split("/"))
+    fps = num / den if num and den else 25.0
+    frames = int(stream.get("nb_frames") or 0)
+    return int(stream["width"]), int(stream["height"]), fps, frames
+
+
+class GrowingFileCapture:
+    """Decodes a file that is still being uploaded, like a cv2.VideoCapture.
+
+    A pump thread tails the file into ffmpeg's stdin until ``upload_state()``,
+    which returns (status, bytes received), reports "complete"; ffmpeg
+    writes raw BGR frames to stdout. read(),
+    grab() and release() behave like the VideoCapture calls the processing
+    loops use. If the upload fails or disappears, ``aborted`` is set and
+    reading stops at the data received so far.
+    """
+
+    def __init__(self, path, upload_state, width, height, poll_interval=0.5, block_size=1 << 20,
+                 preexec_fn=None):
+        self.shape = (height, width, 3)
+        self.frame_bytes = width * height * 3
+        self.aborted = False
+        self.proc = subprocess.Popen([
+            "ffmpeg", "-loglevel", "error", "-i", "pipe:0",
+            "-map", "0:v:0", "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"
+        ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, preexec_fn=preexec_fn)
+        self._pump = threading.Thread(target=self._feed, args=(path, upload_state, poll_interval, block_size),
+                                      name="upload-tail", daemon=True)
+        self._pump.start()
+
+    def _feed(self, path, upload_state, poll_interval, block_size):
+        # Only bytes the front has recorded are passed on, a chunk that is
+        # being written or failed its checksum is never decoded
+        position = 0
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    state, received = upload_state()
+                    while position < received:
+                        data = f.read(min(block_size, received - position))
+                        if not data:
+                            break
+                        self.proc.stdin.write(data)
+                        position += len(data)
+                    if state == "complete" and position >= received:
+                        break
+                    if state not in ("receiving", "complete"):
+                        self.aborted = True
+                        break
+                    time.sleep(poll_interval)
+        except OSError:
+            pass  # ffmpeg exited early, read() reports the end
+        finally:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+    def read(self):
+        data = self.proc.stdout.read(self.frame_bytes)
+        if len(data) < self.frame_bytes:
+            return False, None
+        return True, np.frombuffer(bytearray(data), dtype=np.uint8).reshape(self.shape)
+
+    def grab(self):
+        return self.read()[0]
+
+    def release(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self._pump.join(timeout=5)
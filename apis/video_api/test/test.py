@@ -1,10 +1,16 @@
 import requests
 import unittest
+import hashlib
 import os
 import time
 
 API_URL = "http://127.0.0.1:5001/api/v1/upload"
 STATUS_URL = "http://127.0.0.1:5001/api/v1/status"
+JOBS_URL = "http://127.0.0.1:5001/api/v1/jobs"
+PROGRESS_URL = "http://127.0.0.1:5001/api/v1/progress"
+TIMELINE_URL = "http://127.0.0.1:5001/api/v1/timeline"
+UPLOADS_URL = "http://127.0.0.1:5001/api/v1/uploads"
+METRICS_URL = "http://127.0.0.1:5001/metrics"
 TEST_VIDEO_PATH = "sample.mp4"  # Replace with a real test video under 100MB
 
 
@@ -70,6 +76,114 @@ class TestVideoUploadAPI(unittest.TestCase):
         self.print_result("Empty Filename", 400, response.status_code)
         self.assertEqual(response.status_code, 400)
 
+    def test_invalid_mode(self):
+        """Test uploading with an unknown processing mode."""
+        with open(TEST_VIDEO_PATH, "rb") as file:
+            response = requests.post(API_URL, files={"file": file}, data={"mode": "unknown"})
+        self.print_result("Invalid Mode", 400, response.status_code)
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_zones(self):
+        """Test uploading with a zone outside the frame."""
+        with open(TEST_VIDEO_PATH, "rb") as file:
+            response = requests.post(API_URL, files={"file": file},
+                                     data={"zones": "[[[0, 0], [1.5, 0], [1, 1]]]"})
+        self.print_result("Invalid Zones", 400, response.status_code)
+        self.assertEqual(response.status_code, 400)
+
+    def test_highlights_timeline(self):
+        """Test that a highlights job returns a timeline of person segments."""
+        with open(TEST_VIDEO_PATH, "rb") as file:
+            response = requests.post(API_URL, files={"file": file}, data={"mode": "highlights"})
+        self.assertEqual(response.status_code, 200)
+        job_id = response.json().get("job_id")
+        self.assertIsNotNone(self.wait_for_processing(job_id), "Processing did not complete in time.")
+
+        response = requests.get(f"{TIMELINE_URL}/{job_id}")
+        self.print_result("Highlights Timeline", 200, response.status_code)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("segments", response.json())
+
+    def test_job_stats(self):
+        """Test that the job queue reports its depth and wait time."""
+        response = requests.get(JOBS_URL)
+        self.print_result("Job Stats", 200, response.status_code)
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertIn("queue_depth", stats)
+        self.assertIn("wait_ms", stats)
+
+    def test_metrics(self):
+        """Test that the Prometheus metrics include the job queue."""
+        response = requests.get(METRICS_URL)
+        self.print_result("Metrics", 200, response.status_code)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("watchman_jobs_queue_depth", response.text)
+
+    def test_job_progress(self):
+        """Test that a queued job reports its state and progress percentage."""
+        with open(TEST_VIDEO_PATH, "rb") as file:
+            response = requests.post(API_URL, files={"file": file})
+        self.assertEqual(response.status_code, 200)
+        job_id = response.json().get("job_id")
+
+        response = requests.get(f"{PROGRESS_URL}/{job_id}")
+        self.print_result("Job Progress", 200, response.status_code)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.json()["status"], ("queued", "running", "done"))
+        self.assertTrue(0 <= response.json()["progress"] <= 100)
+
+    def test_unknown_job_progress(self):
+        """Test progress of a job that does not exist."""
+        response = requests.get(f"{PROGRESS_URL}/missing")
+        self.print_result("Unknown Job Progress", 404, response.status_code)
+        self.assertEqual(response.status_code, 404)
+
+    def test_resumable_upload(self):
+        """Test a chunked upload that resumes from the offset reported by the server."""
+        with open(TEST_VIDEO_PATH, "rb") as file:
+            data = file.read()
+        response = requests.post(UPLOADS_URL, json={
+            "filename": "sample.mp4", "size": len(data), "sha256": hashlib.sha256(data).hexdigest()
+        })
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()["upload_id"]
+        half = len(data) // 2
+
+        # First half, then ask where to resume as a client would after a dropped connection
+        chunk = data[:half]
+        response = requests.put(f"{UPLOADS_URL}/{upload_id}", data=chunk, headers={
+            "Upload-Offset": "0", "Upload-Checksum": hashlib.sha256(chunk).hexdigest()
+        })
+        self.assertEqual(response.status_code, 200)
+        response = requests.head(f"{UPLOADS_URL}/{upload_id}")
+        self.assertEqual(int(response.headers["Upload-Offset"]), half)
+
+        response = requests.put(f"{UPLOADS_URL}/{upload_id}", data=data[half:], headers={"Upload-Offset": str(half)})
+        self.assertEqual(response.status_code, 200)
+        response = requests.post(f"{UPLOADS_URL}/{upload_id}/finalize")
+        self.print_result("Resumable Upload", 200, response.status_code)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(self.wait_for_processing(response.json()["job_id"]), "Processing did not complete in time.")
+
+    def test_resumable_upload_rejects_bad_chunks(self):
+        """Test that a chunk at the wrong offset or with a wrong checksum is not written."""
+        response = requests.post(UPLOADS_URL, json={"filename": "sample.mp4", "size": 1024})
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.json()["upload_id"]
+
+        response = requests.put(f"{UPLOADS_URL}/{upload_id}", data=b"\0" * 512, headers={"Upload-Offset": "512"})
+        self.assertEqual(response.status_code, 409)
+        response = requests.put(f"{UPLOADS_URL}/{upload_id}", data=b"\0" * 512, headers={
+            "Upload-Offset": "0", "Upload-Checksum": "0" * 64
+        })
+        self.print_result("Bad Chunk Checksum", 400, response.status_code)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["offset"], 0)
+
+        response = requests.post(f"{UPLOADS_URL}/{upload_id}/finalize")
+        self.assertEqual(response.status_code, 409)
+
     # Uncomment to simulate large file rejection (manually test with a real >100MB file)
     # def test_large_file_rejection(self):
     #     """Test uploading a file larger than 100MB."""
@@ -0,0 +1,231 @@
+import argparse
+import atexit
+import itertools
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+
+from jobstore import FAILED, JobStore
+
+# Job queue settings, shared by the Flask fronts (app.py) and standalone workers
+JOB_DB = os.environ.get("WATCHMAN_JOB_DB", "jobs.db")
+JOB_WORKERS = int(os.environ.get("WATCHMAN_JOB_WORKERS", "1"))  # Worker processes, 0 for a front without workers
+RESULT_TTL = 30.0  # Seconds a finished job and its result stay available
+POLL_INTERVAL = 1.0  # Seconds an idle worker waits before looking for a new job
+HEARTBEAT_INTERVAL = 5.0
+WORKER_STALE_AFTER = 30.0  # Without a heartbeat for this long a worker counts as dead
+MAX_JOB_ATTEMPTS = 2  # A job whose worker died this often is failed instead of requeued
+JANITOR_INTERVAL = 10.0
+PROGRESS_INTERVAL = 1.0  # Seconds between progress writes of a running job
+UPLOAD_IDLE_TTL = 24 * 3600.0  # Unfinished resumable uploads without a new chunk for this long are removed
+
+
+# Job of one worker process, progress is written at most once per PROGRESS_INTERVAL
+def run_job(store, job, processing, result_ttl):
+    last_write = [0.0]
+
+    def progress(fraction):
+        now = time.monotonic()
+        if fraction >= 1.0 or now - last_write[0] >= PROGRESS_INTERVAL:
+            last_write[0] = now
+            store.set_progress(job["id"], round(fraction, 4))
+
+    options = dict(job["options"])
+    if options.get("growing"):
+        # Early-started upload (same id as the job), still being written by a front
+        options["upload_state"] = lambda: store.upload_progress(job["id"])
+
+    error = None
+    try:
+        rendered = processing.process_video(job["upload_path"], job["result_dir"], job["id"],
+                                            progress=progress, **options)
+    except Exception as e:
+        rendered = False
+        error = str(e)
+    store.finish(job["id"], rendered, result_ttl, None if rendered else error or "Processing failed")
+
+
+# Entry point of a worker process: load the model once, then take jobs until terminated
+def run_worker(db_path, worker_id, result_ttl=RESULT_TTL):
+    import processing  # Only the workers import the model
+
+    store = JobStore(db_path)
+    state = {"state": "starting"}
+
+    def beat():
+        beats = JobStore(db_path)
+        while True:
+            beats.heartbeat(worker_id, os.getpid(), state["state"], {
+                "model": processing.model.snapshot(),
+                "startup": processing.startup.snapshot(),
+                "metrics": processing.REGISTRY.snapshot(),  # Merged into the fronts' /metrics
+            })
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=beat, name="heartbeat", daemon=True).start()
+    try:
+        processing.model.warm_up()
+    except Exception as e:
+        print(f"[ERROR] Worker {worker_id} could not load the model: {e}")
+        state["state"] = "failed"
+        time.sleep(HEARTBEAT_INTERVAL)  # Let the failure reach the store
+        return
+
+    state["state"] = "idle"
+    print(f"[INFO] Worker {worker_id} ready")
+    while True:
+        job = store.claim(worker_id)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        state["state"] = "busy"
+        run_job(store, job, processing, result_ttl)
+        state["state"] = "idle"
+
+
+class WorkerPool:
+    """Fixed number of worker processes taking jobs from the JobStore.
+
+    Each process loads the model once and handles one job at a time, so the
+    number of processes is the concurrency limit. Processes are started with
+    "spawn" (no Flask or thread state is inherited) and restarted when they
+    die; their running job is requeued by the janitor.
+    """
+
+    def __init__(self, db_path, processes=1, result_ttl=RESULT_TTL):
+        self.db_path = db_path
+        self.processes = processes
+        self.result_ttl = result_ttl
+        self.restarts = 0
+        self._procs = {}
+        self._generation = itertools.count()
+        self._context = multiprocessing.get_context("spawn")
+        self._running = False
+        self._lock = threading.Lock()
+
+    def _spawn(self, slot):
+        # A restarted worker gets a new id, so the janitor sees the old one's job as orphaned
+        worker_id = f"{socket.gethostname()}-{os.getpid()}-{slot}.{next(self._generation)}"
+        proc = self._context.Process(target=run_worker, args=(self.db_path, worker_id, self.result_ttl),
+                                     name=f"video-worker-{slot}")
+        proc.start()
+        self._procs[slot] = proc
+
+    def start(self):
+        with self._lock:
+            if self._running or self.processes <= 0:
+                return self
+            self._running = True
+            for slot in range(self.processes):
+                self._spawn(slot)
+        atexit.register(self.stop)
+        threading.Thread(target=self._supervise, name="worker-pool", daemon=True).start()
+        return self
+
+    def _supervise(self):
+        while self._running:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                for slot, proc in list(self._procs.items()):
+                    if self._running and not proc.is_alive():
+                        print(f"[ERROR] Worker {proc.name} exited ({proc.exitcode}), restarting")
+                        self.restarts += 1
+                        self._spawn(slot)
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+            procs = list(self._procs.values())
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join(timeout=5)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "alive": sum(proc.is_alive() for proc in self._procs.values()),
+                "restarts": self.restarts,
+            }
+
+
+class Janitor:
+    """TTL cleanup and dead-worker recovery, active in one process at a time.
+
+    Every front and worker host runs one; they compete for a lease in the
+    JobStore and only the holder works, so expired results are removed once
+    and jobs of dead workers are requeued once.
+    """
+
+    def __init__(self, store, interval=JANITOR_INTERVAL, stale_after=WORKER_STALE_AFTER,
+                 max_attempts=MAX_JOB_ATTEMPTS, result_ttl=RESULT_TTL, upload_idle_ttl=UPLOAD_IDLE_TTL):
+        self.store = store
+        self.interval = interval
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        self.result_ttl = result_ttl
+        self.upload_idle_ttl = upload_idle_ttl
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self.removed = 0
+        self.requeued = 0
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="janitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                if self.store.acquire_lease("janitor", self.owner, self.interval * 3):
+                    self.sweep()
+            except Exception as e:
+                print(f"[ERROR] Janitor: {e}")
+            time.sleep(self.interval)
+
+    def sweep(self):
+        for job in self.store.expired():
+            shutil.rmtree(job["result_dir"], ignore_errors=True)
+            if os.path.exists(job["upload_path"]):
+                os.remove(job["upload_path"])
+            self.store.delete(job["id"])
+            self.removed += 1
+
+        requeued, failed = self.store.requeue_stale(self.stale_after, self.max_attempts, self.result_ttl)
+        for job_id in requeued:
+            print(f"[INFO] Requeued job {job_id}, its worker stopped responding")
+        for job_id in failed:
+            print(f"[ERROR] Job {job_id} failed, its worker died {self.max_attempts} times")
+        self.requeued += len(requeued)
+        self.store.prune_workers(self.stale_after * 10)
+
+        # Abandoned resumable uploads; an early-started job stops at the data it has
+        for upload in self.store.stale_uploads(self.upload_idle_ttl):
+            self.store.set_upload_status(upload["id"], FAILED)
+            if upload["job_id"] is None and os.path.exists(upload["path"]):
+                os.remove(upload["path"])
+            print(f"[INFO] Removed upload {upload['id']}, no data for {self.upload_idle_ttl:.0f}s")
+        self.store.prune_uploads()
+
+
+# Standalone workers, for fronts started with WATCHMAN_JOB_WORKERS=0:
+#   python workers.py --processes 2
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=JOB_DB)
+    parser.add_argument("--processes", type=int, default=max(1, JOB_WORKERS))
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.db, args.processes).start()
+    Janitor(JobStore(args.db)).start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.stop()
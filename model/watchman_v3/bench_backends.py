@@ -0,0 +1,123 @@
+# Compare the inference backends on the same frames: load time, per-frame
+# latency (p50/p95), throughput, mAP on the dataset and how often the
+# person count matches the PyTorch model.
+#
+# Each backend runs in its own process so load time includes the runtime
+# import (torch vs onnxruntime) and caches do not carry over.
+# python bench_backends.py sample.mp4 --data /content/dataset/set_2/data.yaml
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "apis"))
+
+BACKENDS = ("pytorch", "onnx", "onnxruntime", "openvino", "openvino-int8")
+PREDICT_ARGS = dict(classes=[0], imgsz=320, conf=0.5, iou=0.45, device="cpu", verbose=False)
+
+
+def read_frames(video, limit):
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < limit:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_child(backend, args):
+    from common.backends import default_weights, load_model
+
+    weights = os.path.join(args.weights_dir, default_weights(backend))
+    started = time.monotonic()
+    model = load_model(backend, weights)
+    load_time = time.monotonic() - started
+
+    frames = read_frames(args.video, args.frames)
+    for frame in frames[:args.warmup]:
+        model.predict(source=frame, **PREDICT_ARGS)
+
+    latencies, counts = [], []
+    started = time.monotonic()
+    for frame in frames:
+        t = time.monotonic()
+        results = model.predict(source=frame, **PREDICT_ARGS)
+        latencies.append(time.monotonic() - t)
+        counts.append(sum(len(r.boxes) for r in results))
+    wall = time.monotonic() - started
+    latencies.sort()
+
+    report = {
+        "backend": backend,
+        "load_s": round(load_time, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "fps": round(len(frames) / wall, 1),
+        "counts": counts,
+    }
+
+    # onnxruntime shares watchman_v3.onnx with "onnx", whose mAP comes from
+    # Ultralytics' validator; the count agreement covers its postprocessing
+    if args.data and backend != "onnxruntime":
+        metrics = model.val(data=args.data, imgsz=320, split=args.split, device="cpu", verbose=False)
+        report["mAP50"] = round(metrics.box.map50, 4)
+        report["mAP50_95"] = round(metrics.box.map, 4)
+
+    print(json.dumps(report))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def run_parent(backend, args):
+    cmd = [sys.executable, os.path.abspath(__file__), args.video, "--child", backend,
+           "--weights-dir", args.weights_dir, "--frames", str(args.frames),
+           "--warmup", str(args.warmup), "--split", args.split]
+    if args.data:
+        cmd += ["--data", args.data]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        print(f"[ERROR] {backend} failed (exit {proc.returncode})")
+        return None
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("video", help="Clip the latency and agreement are measured on")
+    parser.add_argument("--data", help="Dataset yaml for mAP, skipped when omitted")
+    parser.add_argument("--split", default="test")
+    parser.add_argument("--weights-dir", default=".")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args)
+        return
+
+    reports = [r for r in (run_parent(backend, args) for backend in args.backends) if r]
+    baseline = next((r["counts"] for r in reports if r["backend"] == "pytorch"), None)
+
+    print(f"{'backend':<15}{'load s':>8}{'p50 ms':>9}{'p95 ms':>9}{'fps':>8}{'mAP50':>8}{'mAP50-95':>10}{'agree':>8}")
+    for r in reports:
+        agree = "-"
+        if baseline:
+            same = sum(a == b for a, b in zip(baseline, r["counts"]))
+            agree = f"{same / max(1, len(baseline)):.1%}"
+        print(f"{r['backend']:<15}{r['load_s']:>8}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['fps']:>8}"
+              f"{r.get('mAP50', '-'):>8}{r.get('mAP50_95', '-'):>10}{agree:>8}")
+
+
+if __name__ == "__main__":
+    main()
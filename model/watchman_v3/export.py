@@ -0,0 +1,60 @@
+# Export watchman_v3.pt to the artifacts the inference backends load
+# (apis/common/backends.py):
+#   watchman_v3.onnx                 - "onnx" and "onnxruntime"
+#   watchman_v3_openvino_model/      - "openvino" (FP32)
+#   watchman_v3_int8_openvino_model/ - "openvino-int8", post-training quantized
+#                                      on images of the dataset (--data)
+#
+# The APIs run the model at imgsz=320, so that is the export size.
+# python export.py --weights watchman_v3.pt --data /content/dataset/set_2/data.yaml
+import argparse
+import os
+import shutil
+
+from ultralytics import YOLO
+
+FORMATS = ("onnx", "openvino", "openvino-int8")
+
+
+def export(weights, fmt, imgsz, data, out_dir):
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    model = YOLO(weights)
+    if fmt == "onnx":
+        path = model.export(format="onnx", imgsz=imgsz, opset=12, simplify=True, dynamic=False)
+        target = os.path.join(out_dir, f"{stem}.onnx")
+    elif fmt == "openvino":
+        path = model.export(format="openvino", imgsz=imgsz, half=False)
+        target = os.path.join(out_dir, f"{stem}_openvino_model")
+    else:
+        if not data:
+            raise SystemExit("--data is required for INT8 calibration")
+        path = model.export(format="openvino", imgsz=imgsz, int8=True, data=data)
+        target = os.path.join(out_dir, f"{stem}_int8_openvino_model")
+
+    # Ultralytics writes next to the weights, move to the names the backends expect
+    if os.path.abspath(str(path)) != os.path.abspath(target):
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        shutil.move(str(path), target)
+    print(f"[INFO] {fmt}: {target}")
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--weights", default="watchman_v3.pt")
+    parser.add_argument("--data", help="Dataset yaml, images used to calibrate INT8")
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("--out", default=".", help="Directory for the artifacts, e.g. ../../apis/live_api")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for fmt in args.formats:
+        export(args.weights, fmt, args.imgsz, args.data, args.out)
+
+
+if __name__ == "__main__":
+    main()